@@ -6,29 +6,22 @@
 """
 
 import logging
-from fastapi import APIRouter, Depends, Header, HTTPException, BackgroundTasks, status
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, Depends, Header, HTTPException, status
 
 from core.config import settings
-from core.database import get_db
 
 # Модели для валидации
 from api.schemas import (
     WebhookRankRequest,
+    WebhookAppendResumesRequest,
     WebhookInterviewRequest,
     WebhookBuildVacancyRequest,
     WebhookAddVacancyRequest,
     WebhookGenerateTagsRequest
 )
 
-# Фоновые задачи
-from services.api_webhook_service import (
-    process_ranking_request_v1,
-    process_interview_simulation_request,
-    process_vacancy_build_request,
-    process_add_vacancy_request,
-    process_tag_generation_request
-)
+# Персистентная очередь фоновых задач
+from services.job_queue import job_queue
 
 # Создаем роутер для API v1
 router = APIRouter(prefix="/api/v1/webhook")
@@ -47,53 +40,43 @@ async def verify_webhook_token(x_webhook_token: str = Header(...)):
 # --- Эндпоинты --- #
 
 @router.post("/rank-resumes", status_code=status.HTTP_202_ACCEPTED, dependencies=[Depends(verify_webhook_token)])
-async def rank_resumes_webhook(
-    request: WebhookRankRequest,
-    background_tasks: BackgroundTasks,
-    db: AsyncSession = Depends(get_db)
-):
-    """Принимает запрос на ранжирование резюме и запускает фоновую задачу."""
+async def rank_resumes_webhook(request: WebhookRankRequest):
+    """Принимает запрос на ранжирование резюме и ставит задачу в очередь."""
     logging.info(f"[API] Принят запрос на ранжирование для {request.webhook_url}")
-    background_tasks.add_task(process_ranking_request_v1, request, db)
-    return {"message": "Ranking task accepted and is being processed in the background."}
+    job_id = await job_queue.submit("rank_resumes_v1", request)
+    return {"message": "Ranking task accepted and is being processed in the background.", "job_id": job_id}
+
+@router.post("/append-resumes", status_code=status.HTTP_202_ACCEPTED, dependencies=[Depends(verify_webhook_token)])
+async def append_resumes_webhook(request: WebhookAppendResumesRequest):
+    """Принимает новые резюме для сохраненной вакансии и ставит задачу инкрементального ранжирования в очередь."""
+    logging.info(f"[API] Принят запрос на добавление резюме к вакансии {request.vacancy_id} для {request.webhook_url}")
+    job_id = await job_queue.submit("append_resumes", request)
+    return {"message": "Append resumes task accepted.", "job_id": job_id}
 
 @router.post("/start-interview", status_code=status.HTTP_202_ACCEPTED, dependencies=[Depends(verify_webhook_token)])
-async def start_interview_webhook(
-    request: WebhookInterviewRequest,
-    background_tasks: BackgroundTasks
-):
-    """Принимает запрос на симуляцию интервью и запускает фоновую задачу."""
+async def start_interview_webhook(request: WebhookInterviewRequest):
+    """Принимает запрос на симуляцию интервью и ставит задачу в очередь."""
     logging.info(f"[API] Принят запрос на симуляцию интервью для {request.webhook_url}")
-    background_tasks.add_task(process_interview_simulation_request, request)
-    return {"message": "Interview simulation task accepted."}
+    job_id = await job_queue.submit("interview_simulation", request)
+    return {"message": "Interview simulation task accepted.", "job_id": job_id}
 
 @router.post("/build-vacancy", status_code=status.HTTP_202_ACCEPTED, dependencies=[Depends(verify_webhook_token)])
-async def build_vacancy_webhook(
-    request: WebhookBuildVacancyRequest,
-    background_tasks: BackgroundTasks
-):
-    """Принимает запрос на сборку вакансии и запускает фоновую задачу."""
+async def build_vacancy_webhook(request: WebhookBuildVacancyRequest):
+    """Принимает запрос на сборку вакансии и ставит задачу в очередь."""
     logging.info(f"[API] Принят запрос на сборку вакансии для {request.webhook_url}")
-    background_tasks.add_task(process_vacancy_build_request, request)
-    return {"message": "Vacancy build task accepted."}
+    job_id = await job_queue.submit("build_vacancy", request)
+    return {"message": "Vacancy build task accepted.", "job_id": job_id}
 
 @router.post("/add-vacancy-with-candidates", status_code=status.HTTP_202_ACCEPTED, dependencies=[Depends(verify_webhook_token)])
-async def add_vacancy_with_candidates_webhook(
-    request: WebhookAddVacancyRequest,
-    background_tasks: BackgroundTasks,
-    db: AsyncSession = Depends(get_db)
-):
+async def add_vacancy_with_candidates_webhook(request: WebhookAddVacancyRequest):
     """Принимает запрос на добавление вакансии и кандидатов в БД."""
     logging.info(f"[API] Принят запрос на добавление вакансии и кандидатов для {request.webhook_url}")
-    background_tasks.add_task(process_add_vacancy_request, request, db)
-    return {"message": "Add vacancy and candidates task accepted."}
+    job_id = await job_queue.submit("add_vacancy", request)
+    return {"message": "Add vacancy and candidates task accepted.", "job_id": job_id}
 
 @router.post("/generate-tags", status_code=status.HTTP_202_ACCEPTED, dependencies=[Depends(verify_webhook_token)])
-async def generate_tags_webhook(
-    request: WebhookGenerateTagsRequest,
-    background_tasks: BackgroundTasks
-):
-    """Принимает запрос на генерацию тегов и запускает фоновую задачу."""
+async def generate_tags_webhook(request: WebhookGenerateTagsRequest):
+    """Принимает запрос на генерацию тегов и ставит задачу в очередь."""
     logging.info(f"[API] Принят запрос на генерацию тегов для {request.webhook_url}")
-    background_tasks.add_task(process_tag_generation_request, request)
-    return {"message": "Tag generation task accepted."}
+    job_id = await job_queue.submit("generate_tags", request)
+    return {"message": "Tag generation task accepted.", "job_id": job_id}
@@ -14,6 +14,8 @@ from sqlalchemy.exc import OperationalError
 
 from core.database import get_db
 from core.schemas import Vacancy, Candidate, Interview
+from services.vector_index import vacancy_index, candidate_index
+from services.dedup import stored_resume_index
 
 router = APIRouter()
 
@@ -66,6 +68,9 @@ async def delete_all_data(db: AsyncSession = Depends(get_db)):
             except OperationalError:
                 logging.warning("Таблица sqlite_sequence не найдена (вероятно, база данных была пуста). Пропускаю сброс счетчиков.")
         
+        vacancy_index.reset()
+        candidate_index.reset()
+        stored_resume_index.reset()
         logging.info("Все данные из таблиц были успешно удалены.")
         return {"message": "Все данные успешно удалены."}
     except Exception as e:
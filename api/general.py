@@ -4,9 +4,12 @@ from pathlib import Path
 import logging
 import json
 
-from services.file_processing import extract_text_from_file, save_upload_file_tmp, cleanup_file
-from services.ai_services import question_gen_chain, build_vacancy_description, scoring_chain
-from core.models import AnalysisRequest, VacancyBuildRequest, CriterionData
+from services.file_processing import extract_text_from_upload
+from services.ai_services import question_gen_chain, build_vacancy_description, scoring_chain, apredict_json
+from services.llm_response_cache import llm_response_cache
+from services.llm_limits import LLMOverloadedError
+from services.structured_output import StructuredOutputError
+from core.models import AnalysisRequest, VacancyBuildRequest, CriterionData, ChartScoresOutput
 from prompts.interview_prompts import DEFAULT_JOB_DESCRIPTION
 
 router = APIRouter()
@@ -51,22 +54,22 @@ async def api_build_vacancy_description(request: VacancyBuildRequest):
             weights=request.weights
         )
         return {"description": description_text}
+    except LLMOverloadedError:
+        raise
     except Exception as e:
         logging.error(f"API call to build vacancy description failed: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Ошибка при генерации описания вакансии: {e}")
 
 @router.post("/upload-vacancy")
 async def upload_vacancy_description(file: UploadFile = File(...)):
-    tmp_path = await save_upload_file_tmp(file)
-    text = await extract_text_from_file(tmp_path)
-    cleanup_file(tmp_path)
+    text = await extract_text_from_upload(file)
     if not text:
         raise HTTPException(status_code=400, detail=f"Не удалось извлечь текст из файла {file.filename}.")
     
     generated_questions = ""
     try:
         logging.info("Начинаю генерацию вопросов по вакансии...")
-        generated_questions = await question_gen_chain.apredict(vacancy_text=text)
+        generated_questions = await llm_response_cache.apredict("question_gen", question_gen_chain, vacancy_text=text)
         logging.info("Рекомендуемые вопросы по вакансии успешно сгенерированы.")
     except Exception as e:
         logging.error(f"Не удалось сгенерировать вопросы по вакансии: {e}")
@@ -75,9 +78,7 @@ async def upload_vacancy_description(file: UploadFile = File(...)):
 
 @router.post("/upload-resume")
 async def upload_resume(file: UploadFile = File(...)):
-    tmp_path = await save_upload_file_tmp(file)
-    text = await extract_text_from_file(tmp_path)
-    cleanup_file(tmp_path)
+    text = await extract_text_from_upload(file)
     if not text:
         raise HTTPException(status_code=400, detail=f"Не удалось извлечь текст из файла {file.filename}.")
     return {"filename": file.filename, "resume_text": text}
@@ -98,17 +99,17 @@ async def analyze_scores(data: AnalysisRequest):
             "weights_json": json.dumps(data.weights, ensure_ascii=False, indent=2) if data.weights else "{}"
         }
 
-        scores_str = await scoring_chain.apredict(**prompt_variables)
-        logging.info(f"Числовой анализ завершен. Сырой ответ от LLM: {scores_str}")
-
         try:
-            scores_json = json.loads(scores_str)
-        except json.JSONDecodeError as json_e:
-            logging.error(f"Ошибка парсинга JSON от LLM: {json_e}. Сырой ответ: '{scores_str}'", exc_info=True)
+            scores_json = await apredict_json("chart_scores", scoring_chain, ChartScoresOutput, **prompt_variables)
+        except StructuredOutputError as json_e:
+            logging.error(f"Ошибка парсинга JSON от LLM: {json_e}. Сырой ответ: '{json_e.raw}'")
             raise HTTPException(status_code=500, detail={"error": "Ошибка парсинга ответа от AI."})
-        
+        logging.info(f"Числовой анализ завершен: {scores_json}")
+
         return scores_json
 
+    except (LLMOverloadedError, HTTPException):
+        raise
     except Exception as e:
         logging.error(f"Ошибка при числовом анализе для графиков: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail={"error": "Ошибка на сервере при расчете оценок."})
@@ -2,20 +2,23 @@ import json
 import logging
 import asyncio
 from typing import List, Optional
-import re
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException, Depends
 from vosk import KaldiRecognizer
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from core.models import InterviewLog, AnalysisRequest
+from core.models import InterviewLog, AnalysisRequest, InterviewAnalysisOutput
 from core.database import get_db
-from services.ai_services import analyst_chain, create_llm_chain, interviewer_llm, candidate_llm, summarize_vacancy_tech_requirements
+from services.ai_services import analyst_chain, apredict_json, create_llm_chain, interviewer_llm, candidate_llm
 from services.candidate_service import save_interview_result
+from services.llm_limits import LLMOverloadedError
+from services.resume_sections import fit_resume_to_budget
 # Обновленный импорт
-from services.voice_processing import get_vosk_model, silero_tts_instance, SAMPLE_RATE, text_to_speech
-from prompts.interview_prompts import DEFAULT_JOB_DESCRIPTION, INTERVIEW_PLAN, CANDIDATE_SYSTEM_PROMPT, STRESS_CANDIDATE_SYSTEM_PROMPT, CANDIDATE_INFO_BLOCK, RECOMMENDED_QUESTIONS_BLOCK, INTERVIEWER_SYSTEM_PROMPT
+from services.voice_processing import get_vosk_model, silero_tts_instance, SAMPLE_RATE
+from services.speech_streaming import speak_interviewer_reply, speak_text
+from services.vacancy_compiler import vacancy_compiler, build_interviewer_template
+from prompts.interview_prompts import DEFAULT_JOB_DESCRIPTION, CANDIDATE_SYSTEM_PROMPT, STRESS_CANDIDATE_SYSTEM_PROMPT, OPENING_HUMAN_INPUT
 
 router = APIRouter()
 
@@ -25,31 +28,17 @@ async def analyze_interview_endpoint(data: AnalysisRequest, db: AsyncSession = D
         history_str = "\n".join([f"{log.sender}: {log.text}" for log in data.conversation_history])
         logging.info("Начинаю единый комплексный анализ...")
 
+        vacancy_text = data.vacancy_text or DEFAULT_JOB_DESCRIPTION
         prompt_variables = {
-            "vacancy_text": (data.vacancy_text or DEFAULT_JOB_DESCRIPTION),
-            "resume_text": (data.resume_text or "Резюме не предоставлено."),
+            "vacancy_text": vacancy_text,
+            "resume_text": fit_resume_to_budget(data.resume_text or "Резюме не предоставлено.", vacancy_text, "analyst"),
             "dialogue_log": history_str,
             "weights_json": json.dumps(data.weights, ensure_ascii=False, indent=2) if data.weights else "{}"
         }
 
-        analysis_str = await analyst_chain.apredict(**prompt_variables)
-        logging.info("Анализ завершен. Парсинг JSON...")
-        
-        clean_json_str = analysis_str.strip()
-        # Попытка найти JSON-блок, если LLM добавил лишний текст или маркеры
-        json_match = re.search(r'```json\n(.*)```', clean_json_str, re.DOTALL)
-        if json_match:
-            clean_json_str = json_match.group(1).strip()
-        else:
-            # Если маркеры не найдены, попробуем найти первый и последний { }
-            json_match = re.search(r'\{.*\}', clean_json_str, re.DOTALL)
-            if json_match:
-                clean_json_str = json_match.group(0).strip()
-            else:
-                logging.warning("Не удалось найти валидный JSON-блок в ответе LLM.")
-                raise ValueError("Ответ LLM не содержит валидного JSON.")
-        
-        analysis_json = json.loads(clean_json_str)
+        # Ответ разбирается нестрого (блоки ```json, лишний текст, обрыв) и проверяется по схеме
+        analysis_json = await apredict_json("analyst", analyst_chain, InterviewAnalysisOutput, **prompt_variables)
+        logging.info("Анализ завершен.")
 
         # Сохраняем результат в БД
         await save_interview_result(
@@ -63,38 +52,12 @@ async def analyze_interview_endpoint(data: AnalysisRequest, db: AsyncSession = D
         return analysis_json
 
 
+    except LLMOverloadedError:
+        raise
     except Exception as e:
         logging.error(f"Ошибка при полном анализе собеседования: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail={"error": "Ошибка на сервере при выполнении анализа."})
 
-def _escape_braces(text: str) -> str:
-    if not text:
-        return ""
-    return text.replace("{", "{{").replace("}", "}}")
-
-def _create_interviewer_template(vacancy_text: str, resume_text: Optional[str], generated_questions: Optional[str]) -> str:
-    logging.info(f"vacancy_text: {vacancy_text!r}")
-    logging.info(f"resume_text: {resume_text!r}")
-    logging.info(f"generated_questions: {generated_questions!r}")
-
-    # Экранируем фигурные скобки в пользовательских данных
-    safe_resume_text = _escape_braces(resume_text)
-    safe_vacancy_text = _escape_braces(vacancy_text)
-    safe_generated_questions = _escape_braces(generated_questions)
-
-    final_candidate_block = CANDIDATE_INFO_BLOCK.format(candidate_profile=safe_resume_text) if resume_text else ""
-    final_questions_block = RECOMMENDED_QUESTIONS_BLOCK.format(generated_questions=safe_generated_questions) if generated_questions else ""
-
-    template = (
-        f"{INTERVIEWER_SYSTEM_PROMPT}\n"
-        f"{final_candidate_block}\n"
-        f"{final_questions_block}\n\n"
-        f"Вот описание вакансии, на которую претендует кандидат:\n{safe_vacancy_text}\n\n"
-        f"Ты должен провести собеседование строго по следующему плану:\n{INTERVIEW_PLAN}\n\n"
-        "Текущий диалог:\n{chat_history}\nКандидат: {human_input}\nТвой следующий вопрос:"
-    )
-    return template
-
 @router.websocket("/ws/test")
 async def websocket_test_endpoint(websocket: WebSocket):
     await websocket.accept()
@@ -114,8 +77,10 @@ async def websocket_test_endpoint(websocket: WebSocket):
 
         vacancy_text = initial_data.get("vacancy_text") or DEFAULT_JOB_DESCRIPTION
         generated_questions = initial_data.get("generated_questions", "")
+        # В промпты симуляции попадают только самые релевантные вакансии разделы резюме
+        resume_text = fit_resume_to_budget(resume_text, vacancy_text, "simulation")
 
-        interviewer_template = _create_interviewer_template(vacancy_text, resume_text, generated_questions)
+        interviewer_template = build_interviewer_template(vacancy_text, resume_text, generated_questions)
         interviewer_chain = create_llm_chain(interviewer_llm, interviewer_template)
 
         candidate_template = f'''{CANDIDATE_SYSTEM_PROMPT.format(resume_text=resume_text)}
@@ -193,23 +158,21 @@ async def websocket_live_endpoint(websocket: WebSocket):
         resume_text = initial_data.get("resume_text")
         generated_questions = initial_data.get("generated_questions", "")
 
-        # Извлекаем только технические требования из вакансии для интервьюера
-        summarized_vacancy_tech = await summarize_vacancy_tech_requirements(vacancy_text)
-
-        interviewer_template = _create_interviewer_template(summarized_vacancy_tech, None, generated_questions)
+        # Для сохраненной вакансии промпт и первая реплика подготовлены заранее (services/vacancy_compiler.py)
+        interviewer_template, opening_question = await vacancy_compiler.prepare_interview(
+            vacancy_text, generated_questions, initial_data.get("vacancy_id")
+        )
         session_chain = create_llm_chain(interviewer_llm, interviewer_template)
         chat_history = []
 
         await websocket.send_json({"type": "status", "data": "Контекст загружен. ИИ-интервьюер готовит первый вопрос..."})
-        question = await session_chain.apredict(human_input="Начни собеседование, представившись и обозначив вакансию и ключевые темы для обсуждения.", chat_history="")
+        if opening_question:
+            question = await speak_text(websocket, opening_question)
+        else:
+            # Первый вопрос озвучивается по предложениям по мере генерации
+            question = await speak_interviewer_reply(websocket, session_chain, human_input=OPENING_HUMAN_INPUT, chat_history="")
         chat_history.append(f"Interviewer: {question}")
-        
-        await websocket.send_json({"type": "status", "data": "Вопрос сформирован. Преобразую текст в голос..."})
         logging.info(f"Интервьюер (LLM): {question}")
-        await websocket.send_json({"type": "text", "sender": "Interviewer", "data": question})
-        
-        audio_b64 = await text_to_speech(question, silero_tts_instance)
-        await websocket.send_json({"type": "audio", "data": audio_b64 or ""})
 
         while True:
             data = await websocket.receive_bytes()
@@ -225,15 +188,9 @@ async def websocket_live_endpoint(websocket: WebSocket):
                     
                     await websocket.send_json({"type": "status", "data": "Ответ получен. Анализирую полноту информации..."})
                     history_str = "\n".join(chat_history)
-                    question = await session_chain.apredict(human_input=final_text, chat_history=history_str)
+                    question = await speak_interviewer_reply(websocket, session_chain, human_input=final_text, chat_history=history_str)
                     chat_history.append(f"Interviewer: {question}")
-                    
-                    await websocket.send_json({"type": "status", "data": "Вопрос сформирован. Преобразую текст в голос..."})
-                    audio_b64 = await text_to_speech(question, silero_tts_instance)
-
                     logging.info(f"Интервьюер (LLM): {question}")
-                    await websocket.send_json({"type": "text", "sender": "Interviewer", "data": question})
-                    await websocket.send_json({"type": "audio", "data": audio_b64 or ""})
                 else:
                     logging.info("Ничего не распознано в финальном результате.")
                     await websocket.send_json({"type": "audio", "data": ""}) 
@@ -247,6 +204,10 @@ async def websocket_live_endpoint(websocket: WebSocket):
 
     except WebSocketDisconnect:
         logging.info("Клиент для голосового чата отключен.")
+    except LLMOverloadedError as e:
+        logging.warning(f"Собеседование (live) прервано: {e}")
+        if not websocket.client_state.value == 3: # 3 is DISCONNECTED state
+            await websocket.send_json({"type": "error", "message": str(e), "retry_after": e.retry_after})
     except Exception as e:
         logging.error(f"Ошибка в WebSocket (live): {e}", exc_info=True)
         # Попытка отправить сообщение об ошибке клиенту, если соединение еще открыто
@@ -272,8 +233,10 @@ async def websocket_stress_test_endpoint(websocket: WebSocket):
 
         vacancy_text = initial_data.get("vacancy_text") or DEFAULT_JOB_DESCRIPTION
         generated_questions = initial_data.get("generated_questions", "")
+        # В промпты симуляции попадают только самые релевантные вакансии разделы резюме
+        resume_text = fit_resume_to_budget(resume_text, vacancy_text, "simulation")
 
-        interviewer_template = _create_interviewer_template(vacancy_text, resume_text, generated_questions)
+        interviewer_template = build_interviewer_template(vacancy_text, resume_text, generated_questions)
         interviewer_chain = create_llm_chain(interviewer_llm, interviewer_template)
 
         candidate_template = f'''{STRESS_CANDIDATE_SYSTEM_PROMPT.format(resume_text=resume_text)}
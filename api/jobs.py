@@ -0,0 +1,36 @@
+"""
+API для получения статуса и результатов фоновых задач Webhook API.
+"""
+
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+
+from api.api_v1 import verify_webhook_token
+from services.job_queue import job_queue, serialize_job, JOB_COMPLETED, JOB_FAILED
+
+router = APIRouter(prefix="/api/v1/jobs", tags=["Jobs"], dependencies=[Depends(verify_webhook_token)])
+
+@router.get("")
+async def list_jobs(status_filter: Optional[str] = Query(None, alias="status"), limit: int = 50):
+    """Возвращает последние задачи (опционально с фильтром по статусу)."""
+    jobs = await job_queue.list_jobs(status=status_filter, limit=min(limit, 500))
+    return [serialize_job(job) for job in jobs]
+
+@router.get("/{job_id}")
+async def get_job_status(job_id: str):
+    """Возвращает статус задачи."""
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    return serialize_job(job)
+
+@router.get("/{job_id}/result")
+async def get_job_result(job_id: str):
+    """Возвращает результат завершенной задачи."""
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    if job.status not in (JOB_COMPLETED, JOB_FAILED):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Задача еще не завершена (статус: {job.status})")
+    return serialize_job(job, include_result=True)
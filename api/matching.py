@@ -0,0 +1,101 @@
+"""
+API для быстрого подбора вакансий и кандидатов по локальному векторному индексу.
+
+В отличие от скоринга через LLM, поиск выполняется без обращения к модели:
+близость считается по хешированным TF-IDF векторам, поэтому подходит для
+предварительного отбора среди тысяч записей.
+"""
+
+import logging
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel, Field
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.database import get_db
+from core.schemas import Vacancy, Candidate
+from services.vector_index import find_similar_vacancies, find_similar_candidates, rebuild_vector_indexes
+
+router = APIRouter(prefix="/api/v1/match", tags=["Matching"])
+
+class MatchTextRequest(BaseModel):
+    """Модель запроса для поиска по произвольному тексту."""
+    text: str = Field(..., description="Текст резюме или вакансии.")
+    top_k: int = Field(10, ge=1, le=100, description="Сколько результатов вернуть.")
+
+async def _vacancy_matches(db: AsyncSession, matches: list) -> list:
+    """Обогащает найденные ID вакансий данными из БД, пропуская удаленные записи."""
+    if not matches:
+        return []
+    result = await db.execute(select(Vacancy.id, Vacancy.title).where(Vacancy.id.in_([m[0] for m in matches])))
+    titles = {row.id: row.title for row in result}
+    return [
+        {"vacancy_id": vacancy_id, "title": titles[vacancy_id], "similarity": round(similarity, 4)}
+        for vacancy_id, similarity in matches if vacancy_id in titles
+    ]
+
+async def _candidate_matches(db: AsyncSession, matches: list) -> list:
+    """Обогащает найденные ID кандидатов данными из БД, пропуская удаленные записи."""
+    if not matches:
+        return []
+    result = await db.execute(
+        select(Candidate.id, Candidate.filename, Candidate.vacancy_id).where(Candidate.id.in_([m[0] for m in matches]))
+    )
+    rows = {row.id: row for row in result}
+    return [
+        {
+            "candidate_id": candidate_id,
+            "filename": rows[candidate_id].filename,
+            "vacancy_id": rows[candidate_id].vacancy_id,
+            "similarity": round(similarity, 4)
+        }
+        for candidate_id, similarity in matches if candidate_id in rows
+    ]
+
+@router.get("/candidate/{candidate_id}/vacancies")
+async def match_vacancies_for_candidate(
+    candidate_id: int,
+    top_k: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_db)
+):
+    """Находит вакансии, которые лучше всего подходят резюме кандидата."""
+    candidate = await db.get(Candidate, candidate_id)
+    if not candidate:
+        raise HTTPException(status_code=404, detail="Кандидат не найден")
+    matches = await find_similar_vacancies(candidate.resume_text or "", top_k)
+    return {"candidate_id": candidate_id, "matches": await _vacancy_matches(db, matches)}
+
+@router.get("/vacancy/{vacancy_id}/candidates")
+async def match_candidates_for_vacancy(
+    vacancy_id: int,
+    top_k: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_db)
+):
+    """Находит кандидатов, резюме которых ближе всего к тексту вакансии."""
+    vacancy = await db.get(Vacancy, vacancy_id)
+    if not vacancy:
+        raise HTTPException(status_code=404, detail="Вакансия не найдена")
+    matches = await find_similar_candidates(vacancy.text or "", top_k)
+    return {"vacancy_id": vacancy_id, "matches": await _candidate_matches(db, matches)}
+
+@router.post("/vacancies")
+async def match_vacancies_for_text(request: MatchTextRequest, db: AsyncSession = Depends(get_db)):
+    """Находит вакансии, близкие к переданному тексту резюме."""
+    matches = await find_similar_vacancies(request.text, request.top_k)
+    return {"matches": await _vacancy_matches(db, matches)}
+
+@router.post("/candidates")
+async def match_candidates_for_text(request: MatchTextRequest, db: AsyncSession = Depends(get_db)):
+    """Находит кандидатов, близких к переданному тексту вакансии."""
+    matches = await find_similar_candidates(request.text, request.top_k)
+    return {"matches": await _candidate_matches(db, matches)}
+
+@router.post("/rebuild")
+async def rebuild_indexes():
+    """Полностью перестраивает векторные индексы по данным из БД."""
+    try:
+        return await rebuild_vector_indexes()
+    except Exception as e:
+        logging.error(f"Ошибка при перестроении векторных индексов: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Ошибка сервера при перестроении индексов")
@@ -0,0 +1,56 @@
+"""
+API для получения внутренних метрик сервиса (кэши, очереди, пулы соединений).
+"""
+
+from fastapi import APIRouter
+
+from services.score_cache import score_cache
+from services.job_queue import job_queue
+from services.parsing_pool import parsing_pool
+from services.http_clients import http_clients
+from services.ollama_backends import ollama_backends
+from services.llm_limits import limiter_stats
+from services.speech_streaming import speech_stream_stats
+from services.vacancy_compiler import vacancy_compiler
+from services.text_cache import text_cache
+from services.llm_response_cache import llm_response_cache
+from services.structured_output import structured_output_stats
+from services.text_normalization import text_normalizer
+
+router = APIRouter(prefix="/api/v1/metrics", tags=["Metrics"])
+
+@router.get("")
+async def get_metrics():
+    """Возвращает текущие значения всех счетчиков сервиса."""
+    return {
+        "score_cache": score_cache.stats(),
+        "jobs": await job_queue.stats(),
+        "parsing": parsing_pool.stats(),
+        "text_cache": text_cache.stats(),
+        "llm_cache": llm_response_cache.stats(),
+        "structured_output": structured_output_stats.stats(),
+        "text_normalization": text_normalizer.stats(),
+        "http_clients": http_clients.stats(),
+        "ollama_backends": ollama_backends.stats(),
+        "llm_limits": limiter_stats(),
+        "voice_streaming": speech_stream_stats.stats(),
+        "vacancy_compiler": vacancy_compiler.stats(),
+    }
+
+@router.post("/score-cache/evict")
+async def evict_score_cache():
+    """Принудительно очищает кэш оценок от устаревших и лишних записей."""
+    removed = await score_cache.evict()
+    return {"removed": removed}
+
+@router.post("/text-cache/evict")
+async def evict_text_cache():
+    """Принудительно очищает кэш извлеченного текста от записей старых версий парсеров и лишних записей."""
+    removed = await text_cache.evict()
+    return {"removed": removed}
+
+@router.post("/llm-cache/evict")
+async def evict_llm_cache():
+    """Принудительно очищает кэш ответов LLM от устаревших и лишних записей."""
+    removed = await llm_response_cache.evict()
+    return {"removed": removed}
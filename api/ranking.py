@@ -1,16 +1,21 @@
 import json
 import logging
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from pathlib import Path
 
 from fastapi import APIRouter, UploadFile, File, HTTPException, Form, Depends
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from services.file_processing import extract_text_from_file, save_upload_file_tmp, cleanup_file
-from services.ai_services import resume_scorer_chain
-from services.candidate_service import save_ranking_results # Обновленный импорт
-from core.database import get_db
+from services.file_processing import extract_text_from_upload, extract_texts_from_uploads
+from services.scoring_service import score_resumes, sort_scored_resumes, build_error_result, stream_ranking_events
+from services.candidate_service import save_ranking_results, rerank_vacancy_candidates
+from services.dedup import collect_duplicate_groups
+from services.incremental_ranking import rank_new_resumes
+from services.archive_ingestion import ArchiveTooLargeError, copy_archive_upload, stream_archive_ranking_events
+from core.config import settings
+from core.database import get_db, AsyncSessionFactory
+from core.models import RerankRequest
 
 router = APIRouter()
 
@@ -38,13 +43,62 @@ async def get_rank_stress_simulation_page():
 async def get_rank_interview_result_page():
     return HTMLResponse(content=Path("ranking/interview_result.html").read_text(encoding="utf-8"))
 
+async def _extract_vacancy_text(vacancy: UploadFile) -> str:
+    """Извлекает текст вакансии из загруженного файла."""
+    try:
+        vacancy_text = await extract_text_from_upload(vacancy)
+        if not vacancy_text:
+            raise HTTPException(status_code=400, detail="Не удалось обработать файл вакансии.")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка на сервере при обработке вакансии: {e}")
+    return vacancy_text
+
+async def _extract_resumes(resumes: List[UploadFile]) -> List[Tuple[str, Optional[str], Optional[str]]]:
+    """
+    Извлекает тексты резюме прямо из буферов загрузки, без временных файлов.
+    Файлы парсятся параллельно в пуле процессов. Возвращает тройки (имя файла, текст, ошибка).
+    """
+    logging.info(f"Прием и парсинг {len(resumes)} файлов резюме...")
+    parsed = await extract_texts_from_uploads(resumes)
+
+    extracted = []
+    for i, (resume_file, result) in enumerate(zip(resumes, parsed), 1):
+        filename = resume_file.filename
+        if result.error:
+            error = f"Ошибка обработки файла: {result.error}"
+        elif not result.text:
+            error = "Ошибка обработки файла: Текст из файла не был извлечен."
+        else:
+            logging.info(f"==> Текст извлечен из {filename}. Объем: {len(result.text)} символов.")
+            extracted.append((filename, result.text, None))
+            continue
+        logging.error(f"[Резюме {i}/{len(resumes)}] Сбой: {filename}. Причина: {error}")
+        extracted.append((filename, None, error))
+    return extracted
+
+def _build_extraction_error(filename: str, resume_text: Optional[str], error: str) -> dict:
+    """Формирует результат для резюме, текст которого не удалось извлечь."""
+    score_data = build_error_result(error)
+    score_data["filename"] = filename
+    score_data["resume_text"] = resume_text or "Текст не был извлечен."
+    return score_data
+
+def _format_stream_event(event: dict, stream_format: str) -> str:
+    """Сериализует событие ранжирования в формат NDJSON или SSE."""
+    payload = json.dumps(event, ensure_ascii=False)
+    if stream_format == "sse":
+        return f"event: {event['event']}\ndata: {payload}\n\n"
+    return payload + "\n"
+
 @router.post("/rank-resumes")
 async def rank_resumes(
     db: AsyncSession = Depends(get_db), 
     vacancy: UploadFile = File(...), 
     resumes: List[UploadFile] = File(...), 
     weights: str = Form(...),
-    generated_questions: Optional[str] = Form(None) # Добавлено
+    generated_questions: Optional[str] = Form(None), # Добавлено
+    prefilter: Optional[bool] = Form(None),
+    batch: Optional[bool] = Form(None)
 ):
     logging.info(f"Получен запрос на ранжирование. Вакансия: {vacancy.filename}, резюме: {len(resumes)} шт.")
     
@@ -53,56 +107,26 @@ async def rank_resumes(
     except json.JSONDecodeError:
         raise HTTPException(status_code=400, detail="Некорректный формат данных весов.")
     
-    try:
-        vacancy_path = await save_upload_file_tmp(vacancy)
-        vacancy_text = await extract_text_from_file(vacancy_path)
-        cleanup_file(vacancy_path)
-        if not vacancy_text:
-            raise HTTPException(status_code=400, detail="Не удалось обработать файл вакансии.")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Ошибка на сервере при обработке вакансии: {e}")
+    vacancy_text = await _extract_vacancy_text(vacancy)
+    extracted = await _extract_resumes(resumes)
 
-    scored_resumes = []
-    for i, resume_file in enumerate(resumes, 1):
-        logging.info(f"[Резюме {i}/{len(resumes)}] Обработка: {resume_file.filename}")
-        resume_text = None
-        try:
-            logging.info(f"==> Шаг 1: Сохранение временного файла для {resume_file.filename}")
-            resume_path = await save_upload_file_tmp(resume_file)
-
-            logging.info(f"==> Шаг 2: Извлечение текста из {resume_file.filename}")
-            resume_text = await extract_text_from_file(resume_path)
-            cleanup_file(resume_path)
-            if not resume_text:
-                raise ValueError("Текст из файла не был извлечен.")
-            logging.info(f"==> Шаг 2 ЗАВЕРШЕН. Объем текста: {len(resume_text)} символов. Сниппет: {resume_text[:500]}...")
-
-            logging.info(f"==> Шаг 3: Отправка текста в LLM для анализа...")
-            score_str = await resume_scorer_chain.apredict(
-                vacancy_text=vacancy_text,
-                resume_text=resume_text,
-                weights_json=json.dumps(weights_data, ensure_ascii=False, indent=2)
-            )
-            logging.info(f"==> Шаг 3 ЗАВЕРШЕН. Ответ от LLM получен.")
-            logging.info(f"==> Сырой ответ от LLM: {score_str}")
-
-            score_data = json.loads(score_str)
-            
-            score_data["filename"] = resume_file.filename
-            score_data["resume_text"] = resume_text
-            scored_resumes.append(score_data)
+    # Конкурентно оцениваем все успешно извлеченные резюме
+    to_score = [
+        {"id": filename, "text": text}
+        for filename, text, error in extracted if error is None
+    ]
+    logging.info(f"==> Отправка {len(to_score)} резюме в LLM для анализа...")
+    scored_iter = iter(await score_resumes(vacancy_text, to_score, weights=weights_data, prefilter=prefilter, batch=batch))
 
-        except Exception as e:
-            error_summary = f"Ошибка обработки файла: {e}"
-            logging.error(f"[Резюме {i}/{len(resumes)}] Сбой: {resume_file.filename}. Причина: {error_summary}", exc_info=True)
-            scored_resumes.append({
-                "filename": resume_file.filename,
-                "score": -1,
-                "summary": error_summary,
-                "keywords": ["ОШИБКА"],
-                "resume_text": resume_text or "Текст не был извлечен."
-            })
+    scored_resumes = []
+    for filename, resume_text, error in extracted:
+        if error:
+            scored_resumes.append(_build_extraction_error(filename, resume_text, error))
             continue
+        score_data = next(scored_iter)
+        score_data["filename"] = filename
+        score_data["resume_text"] = resume_text
+        scored_resumes.append(score_data)
     
     # Сохраняем все в одной транзакции и обогащаем ID
     enriched_resumes = await save_ranking_results(
@@ -113,5 +137,180 @@ async def rank_resumes(
         scored_resumes
     )
 
-    sorted_resumes = sorted(enriched_resumes, key=lambda x: x.get('score', 0), reverse=True)
-    return {"ranking": sorted_resumes}
\ No newline at end of file
+    sorted_resumes = sort_scored_resumes(enriched_resumes)
+    return {"ranking": sorted_resumes, "duplicate_groups": collect_duplicate_groups(sorted_resumes, "filename")}
+
+@router.post("/rank-resumes/stream")
+async def rank_resumes_stream(
+    vacancy: UploadFile = File(...),
+    resumes: List[UploadFile] = File(...),
+    weights: str = Form(...),
+    generated_questions: Optional[str] = Form(None),
+    stream_format: str = Form("ndjson"),
+    top_k: Optional[int] = Form(None),
+    prefilter: Optional[bool] = Form(None),
+    batch: Optional[bool] = Form(None)
+):
+    """
+    Потоковый вариант /rank-resumes: отдает каждое оцененное резюме сразу по готовности
+    и периодически обновляемый топ-K в формате NDJSON (по умолчанию) или SSE.
+
+    Последним событием приходит {"event": "done", "ranking": [...]} — итоговый рейтинг
+    с ID кандидатов из БД, идентичный ответу /rank-resumes.
+    """
+    logging.info(f"Получен запрос на потоковое ранжирование. Вакансия: {vacancy.filename}, резюме: {len(resumes)} шт.")
+
+    if stream_format not in ("ndjson", "sse"):
+        raise HTTPException(status_code=400, detail="Поддерживаемые форматы потока: ndjson, sse.")
+    try:
+        weights_data = json.loads(weights)
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Некорректный формат данных весов.")
+
+    vacancy_text = await _extract_vacancy_text(vacancy)
+    extracted = await _extract_resumes(resumes)
+
+    async def event_source():
+        scored_resumes = []
+        failed = [
+            _build_extraction_error(filename, resume_text, error)
+            for filename, resume_text, error in extracted if error
+        ]
+        to_score = [
+            {"filename": filename, "text": text}
+            for filename, text, error in extracted if error is None
+        ]
+
+        for score_data in failed:
+            scored_resumes.append(score_data)
+            event = {"event": "result", "result": {k: v for k, v in score_data.items() if k != "resume_text"}}
+            yield _format_stream_event(event, stream_format)
+
+        async for event in stream_ranking_events(vacancy_text, to_score, weights_data, top_k=top_k, prefilter=prefilter, batch=batch):
+            if event["event"] == "result":
+                scored_resumes.append({**event["result"], "resume_text": to_score[event["index"]]["text"]})
+            yield _format_stream_event(event, stream_format)
+
+        # Поток живет дольше запроса, поэтому открываем собственную сессию БД
+        async with AsyncSessionFactory() as db:
+            enriched_resumes = await save_ranking_results(
+                db,
+                vacancy_text,
+                generated_questions,
+                weights_data,
+                scored_resumes
+            )
+        ranking = sort_scored_resumes(enriched_resumes)
+        yield _format_stream_event(
+            {"event": "done", "ranking": ranking, "duplicate_groups": collect_duplicate_groups(ranking, "filename")},
+            stream_format
+        )
+
+    media_type = "text/event-stream" if stream_format == "sse" else "application/x-ndjson"
+    return StreamingResponse(event_source(), media_type=media_type)
+
+
+@router.post("/rank-resumes/archive")
+async def rank_resumes_archive(
+    vacancy: UploadFile = File(...),
+    archive: UploadFile = File(...),
+    weights: str = Form(...),
+    generated_questions: Optional[str] = Form(None),
+    stream_format: str = Form("ndjson"),
+    top_k: Optional[int] = Form(None),
+    prefilter: Optional[bool] = Form(None),
+    batch: Optional[bool] = Form(None)
+):
+    """
+    Ранжирует резюме из ZIP-архива. Записи распаковываются в память по одной,
+    парсятся параллельно и оцениваются по мере извлечения.
+
+    Поток событий (NDJSON или SSE): "extracted" для каждой записи архива, "result",
+    "top_k", "error" (архив прерван по лимитам) и последним — "done" с итоговым рейтингом.
+    """
+    logging.info(f"Получен запрос на ранжирование архива. Вакансия: {vacancy.filename}, архив: {archive.filename}.")
+
+    if stream_format not in ("ndjson", "sse"):
+        raise HTTPException(status_code=400, detail="Поддерживаемые форматы потока: ndjson, sse.")
+    try:
+        weights_data = json.loads(weights)
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Некорректный формат данных весов.")
+
+    vacancy_text = await _extract_vacancy_text(vacancy)
+    # Загрузки формы закрываются вместе с запросом, раньше, чем поток дочитает архив,
+    # поэтому поток работает с собственной копией
+    try:
+        archive_file = await copy_archive_upload(archive)
+    except ArchiveTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    async def event_source():
+        scored_resumes = []
+        try:
+            async for event in stream_archive_ranking_events(
+                vacancy_text, archive_file, weights_data, top_k=top_k, prefilter=prefilter, batch=batch
+            ):
+                if event["event"] == "result":
+                    scored_resumes.append(event["result"])
+                    event = {**event, "result": {k: v for k, v in event["result"].items() if k != "resume_text"}}
+                yield _format_stream_event(event, stream_format)
+        finally:
+            archive_file.close()
+
+        # Поток живет дольше запроса, поэтому открываем собственную сессию БД
+        async with AsyncSessionFactory() as db:
+            enriched_resumes = await save_ranking_results(
+                db,
+                vacancy_text,
+                generated_questions,
+                weights_data,
+                scored_resumes
+            )
+        ranking = sort_scored_resumes(enriched_resumes)
+        yield _format_stream_event(
+            {"event": "done", "ranking": ranking, "duplicate_groups": collect_duplicate_groups(ranking, "filename")},
+            stream_format
+        )
+
+    media_type = "text/event-stream" if stream_format == "sse" else "application/x-ndjson"
+    return StreamingResponse(event_source(), media_type=media_type)
+
+
+@router.post("/api/v1/vacancies/{vacancy_id}/rank-resumes")
+async def rank_new_resumes_for_vacancy(
+    vacancy_id: int,
+    db: AsyncSession = Depends(get_db),
+    resumes: List[UploadFile] = File(...),
+    prefilter: Optional[bool] = Form(None),
+    batch: Optional[bool] = Form(None)
+):
+    """
+    Добавляет новые резюме к сохраненной вакансии: оцениваются только они,
+    а рейтинг всех кандидатов пересчитывается по сохраненным весам без вызова LLM.
+    """
+    logging.info(f"Получен запрос на добавление {len(resumes)} резюме к вакансии ID {vacancy_id}.")
+    extracted = await _extract_resumes(resumes)
+    to_score = [
+        {"filename": filename, "text": text}
+        for filename, text, error in extracted if error is None
+    ]
+    result = await rank_new_resumes(db, vacancy_id, to_score, prefilter=prefilter, batch=batch)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Вакансия не найдена")
+
+    failed = [
+        {k: v for k, v in _build_extraction_error(filename, text, error).items() if k != "resume_text"}
+        for filename, text, error in extracted if error
+    ]
+    result["added"].extend(failed)
+    return result
+
+
+@router.post("/api/v1/vacancies/{vacancy_id}/rerank")
+async def rerank_vacancy(vacancy_id: int, request: RerankRequest, db: AsyncSession = Depends(get_db)):
+    """Мгновенно переранжирует кандидатов сохраненной вакансии по новым весам без вызова LLM."""
+    result = await rerank_vacancy_candidates(db, vacancy_id, request.weights, save=request.save)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Вакансия не найдена")
+    return result
@@ -22,6 +22,17 @@ class WebhookRankRequest(WebhookBase):
     vacancy_text: str = Field(..., description="Полный текст вакансии.")
     resumes: List[ResumeItem] = Field(..., description="Список объектов резюме для ранжирования.")
     weights: Optional[Dict[str, Any]] = Field(None, description="Словарь с весами критериев для оценки.")
+    stream_results: bool = Field(False, description="Отправлять на webhook_url каждую оценку и обновления топа по мере готовности.")
+    top_k: Optional[int] = Field(None, description="Размер топа для потоковых обновлений (по умолчанию из настроек).")
+    prefilter: Optional[bool] = Field(None, description="Включить лексический предфильтр BM25 перед скорингом LLM (по умолчанию из настроек).")
+    batch_scoring: Optional[bool] = Field(None, description="Оценивать несколько резюме одним запросом к LLM (по умолчанию из настроек).")
+
+class WebhookAppendResumesRequest(WebhookBase):
+    """Модель запроса для добавления новых резюме к сохраненной вакансии."""
+    vacancy_id: int = Field(..., description="ID вакансии, сохраненной в БД.")
+    resumes: List[ResumeItem] = Field(..., description="Список новых резюме для оценки.")
+    prefilter: Optional[bool] = Field(None, description="Включить лексический предфильтр BM25 перед скорингом LLM (по умолчанию из настроек).")
+    batch_scoring: Optional[bool] = Field(None, description="Оценивать несколько резюме одним запросом к LLM (по умолчанию из настроек).")
 
 class WebhookInterviewRequest(WebhookBase):
     """Модель запроса для полной симуляции интервью."""
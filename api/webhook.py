@@ -4,12 +4,12 @@ API-маршрутизатор для обработки входящих веб
 Обеспечивает асинхронный запуск задач и аутентификацию по токену.
 """
 
-from fastapi import APIRouter, Depends, HTTPException, Header, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Header
 from typing import Annotated
 
 from core.config import settings
 from core.models import WebhookRankRequest, WebhookAnalysisRequest
-from services.webhook_service import process_ranking_request, process_analysis_request
+from services.job_queue import job_queue
 
 # --- Зависимость для проверки безопасности ---
 
@@ -35,26 +35,20 @@ router = APIRouter(
 # --- Эндпоинты ---
 
 @router.post("/webhook/rank-resumes", status_code=202)
-async def webhook_rank_resumes(
-    request: WebhookRankRequest,
-    background_tasks: BackgroundTasks
-):
+async def webhook_rank_resumes(request: WebhookRankRequest):
     """
-    Принимает запрос на ранжирование резюме, запускает фоновую задачу
+    Принимает запрос на ранжирование резюме, ставит задачу в очередь
     и немедленно возвращает ответ.
     """
-    background_tasks.add_task(process_ranking_request, request)
-    return {"status": "accepted", "message": "Задача по ранжированию резюме принята в обработку."}
+    job_id = await job_queue.submit("rank_resumes", request)
+    return {"status": "accepted", "message": "Задача по ранжированию резюме принята в обработку.", "job_id": job_id}
 
 
 @router.post("/webhook/analyze-interview", status_code=202)
-async def webhook_analyze_interview(
-    request: WebhookAnalysisRequest,
-    background_tasks: BackgroundTasks
-):
+async def webhook_analyze_interview(request: WebhookAnalysisRequest):
     """
-    Принимает запрос на анализ интервью, запускает фоновую задачу
+    Принимает запрос на анализ интервью, ставит задачу в очередь
     и немедленно возвращает ответ.
     """
-    background_tasks.add_task(process_analysis_request, request)
-    return {"status": "accepted", "message": "Задача по анализу интервью принята в обработку."}
+    job_id = await job_queue.submit("analyze_interview", request)
+    return {"status": "accepted", "message": "Задача по анализу интервью принята в обработку.", "job_id": job_id}
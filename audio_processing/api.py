@@ -9,9 +9,11 @@ from pydantic import BaseModel
 from pathlib import Path
 
 from services.stt_service import get_current_stt_provider, recognize_audio_stream
-from services.voice_processing import silero_tts_instance, text_to_speech
-from services.ai_services import create_llm_chain, interviewer_llm, summarize_vacancy_tech_requirements
-from prompts.interview_prompts import DEFAULT_JOB_DESCRIPTION, INTERVIEW_PLAN, CANDIDATE_INFO_BLOCK, RECOMMENDED_QUESTIONS_BLOCK, INTERVIEWER_SYSTEM_PROMPT
+from services.speech_streaming import speak_interviewer_reply, speak_text
+from services.vacancy_compiler import vacancy_compiler
+from services.llm_limits import LLMOverloadedError
+from services.ai_services import create_llm_chain, interviewer_llm
+from prompts.interview_prompts import DEFAULT_JOB_DESCRIPTION, OPENING_HUMAN_INPUT
 
 from audio_processing.config import audio_processing_settings_manager
 from audio_processing.processor import process_audio_for_noise_reduction
@@ -48,34 +50,6 @@ async def update_audio_processing_config(config_update: AudioProcessingConfigUpd
 
 # --- New WebSocket Endpoint with Audio Processing ---
 
-def _escape_braces(text: str) -> str:
-    if not text:
-        return ""
-    return text.replace("{", "{{").replace("}", "}}")
-
-def _create_interviewer_template(vacancy_text: str, resume_text: Optional[str], generated_questions: Optional[str]) -> str:
-    logging.info(f"vacancy_text: {vacancy_text!r}")
-    logging.info(f"resume_text: {resume_text!r}")
-    logging.info(f"generated_questions: {generated_questions!r}")
-
-    # Экранируем фигурные скобки в пользовательских данных
-    safe_resume_text = _escape_braces(resume_text)
-    safe_vacancy_text = _escape_braces(vacancy_text)
-    safe_generated_questions = _escape_braces(generated_questions)
-
-    final_candidate_block = CANDIDATE_INFO_BLOCK.format(candidate_profile=safe_resume_text) if resume_text else ""
-    final_questions_block = RECOMMENDED_QUESTIONS_BLOCK.format(generated_questions=safe_generated_questions) if generated_questions else ""
-
-    template = (
-        f"{INTERVIEWER_SYSTEM_PROMPT}\n"
-        f"{final_candidate_block}\n"
-        f"{final_questions_block}\n\n"
-        f"Вот описание вакансии, на которую претендует кандидат:\n{safe_vacancy_text}\n\n"
-        f"Ты должен провести собеседование строго по следующему плану:\n{INTERVIEW_PLAN}\n\n"
-        "Текущий диалог:\n{chat_history}\nКандидат: {human_input}\nТвой следующий вопрос:"
-    )
-    return template
-
 @router.websocket("/ws/live_processed")
 async def websocket_live_processed_endpoint(websocket: WebSocket):
     await websocket.accept()
@@ -99,22 +73,21 @@ async def websocket_live_processed_endpoint(websocket: WebSocket):
         resume_text = initial_data.get("resume_text")
         generated_questions = initial_data.get("generated_questions", "")
 
-        summarized_vacancy_tech = await summarize_vacancy_tech_requirements(vacancy_text)
-
-        interviewer_template = _create_interviewer_template(summarized_vacancy_tech, None, generated_questions)
+        # Для сохраненной вакансии промпт и первая реплика подготовлены заранее (services/vacancy_compiler.py)
+        interviewer_template, opening_question = await vacancy_compiler.prepare_interview(
+            vacancy_text, generated_questions, initial_data.get("vacancy_id")
+        )
         session_chain = create_llm_chain(interviewer_llm, interviewer_template)
         chat_history = []
 
         await websocket.send_json({"type": "status", "data": "Контекст загружен. ИИ-интервьюер готовит первый вопрос..."})
-        question = await session_chain.apredict(human_input="Начни собеседование, представившись и обозначив вакансию и ключевые темы для обсуждения.", chat_history="")
+        if opening_question:
+            question = await speak_text(websocket, opening_question)
+        else:
+            # Первый вопрос озвучивается по предложениям по мере генерации
+            question = await speak_interviewer_reply(websocket, session_chain, human_input=OPENING_HUMAN_INPUT, chat_history="")
         chat_history.append(f"Interviewer: {question}")
-        
-        await websocket.send_json({"type": "status", "data": "Вопрос сформирован. Преобразую текст в голос..."})
         logging.info(f"Интервьюер (LLM): {question}")
-        await websocket.send_json({"type": "text", "sender": "Interviewer", "data": question})
-        
-        audio_b64 = await text_to_speech(question, silero_tts_instance)
-        await websocket.send_json({"type": "audio", "data": audio_b64 or ""})
 
         while True:
             # Receive audio chunks from client
@@ -144,15 +117,9 @@ async def websocket_live_processed_endpoint(websocket: WebSocket):
                     
                     await websocket.send_json({"type": "status", "data": "Ответ получен. Анализирую полноту информации..."})
                     history_str = "\n".join(chat_history)
-                    question = await session_chain.apredict(human_input=final_text, chat_history=history_str)
+                    question = await speak_interviewer_reply(websocket, session_chain, human_input=final_text, chat_history=history_str)
                     chat_history.append(f"Interviewer: {question}")
-                    
-                    await websocket.send_json({"type": "status", "data": "Вопрос сформирован. Преобразую текст в голос..."})
-                    audio_b64 = await text_to_speech(question, silero_tts_instance)
-
                     logging.info(f"Интервьюер (LLM): {question}")
-                    await websocket.send_json({"type": "text", "sender": "Interviewer", "data": question})
-                    await websocket.send_json({"type": "audio", "data": audio_b64 or ""})
                 else:
                     logging.info("Ничего не распознано в финальном результате.")
                     await websocket.send_json({"type": "audio", "data": ""}) 
@@ -164,6 +131,10 @@ async def websocket_live_processed_endpoint(websocket: WebSocket):
 
     except WebSocketDisconnect:
         logging.info("Клиент для голосового чата (с обработкой аудио) отключен.")
+    except LLMOverloadedError as e:
+        logging.warning(f"Собеседование (live_processed) прервано: {e}")
+        if not websocket.client_state.value == 3: # 3 is DISCONNECTED state
+            await websocket.send_json({"type": "error", "message": str(e), "retry_after": e.retry_after})
     except Exception as e:
         logging.error(f"Ошибка в WebSocket (live_processed): {e}", exc_info=True)
         if not websocket.client_state.value == 3: # 3 is DISCONNECTED state
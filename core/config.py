@@ -5,6 +5,8 @@
 (включая файл .env). Это позволяет гибко настраивать приложение
 без изменения исходного кода.
 """
+from typing import Dict, List, Optional
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -17,6 +19,140 @@ class Settings(BaseSettings):
     # Настройки моделей обработки голоса
     VOSK_MODEL_PATH: str = "vosk-model-ru"
     SILERO_MODEL_PATH: str = "v3_1_ru.pt"
+    # Потоковая озвучка ответов интервьюера: ответ LLM режется на предложения, каждое озвучивается сразу.
+    # Фрагменты короче минимума объединяются со следующими, длиннее максимума — режутся по запятым
+    VOICE_STREAMING_ENABLED: bool = True
+    VOICE_SENTENCE_MIN_CHARS: int = 20
+    VOICE_SENTENCE_MAX_CHARS: int = 250
+
+    # Адаптивный лимит одновременных запросов к LLM для каждого провайдера (см. services/llm_limits.py).
+    # Начальный лимит; пока задержка близка к базовой, лимит растет (до LLM_LIMIT_MAX_MULTIPLIER x начального),
+    # при росте задержки в LLM_LATENCY_TOLERANCE раз или ошибке — умножается на LLM_LIMIT_BACKOFF
+    LLM_CONCURRENCY_LIMITS: Dict[str, int] = {"ollama": 8, "openai": 16, "yandexgpt": 8, "sber_gigachat": 8}
+    LLM_ADAPTIVE_LIMITS_ENABLED: bool = True
+    LLM_LIMIT_MIN: int = 1
+    LLM_LIMIT_MAX_MULTIPLIER: float = 4.0
+    LLM_LATENCY_TOLERANCE: float = 2.0
+    LLM_LIMIT_BACKOFF: float = 0.7
+    # Окно (в секундах), за которое берется минимальная (базовая) задержка
+    LLM_LATENCY_WINDOW_SECONDS: float = 300.0
+    # Очередь интерактивных запросов сверх лимита: максимальная длина и срок ожидания (в секундах).
+    # При переполнении или истечении срока API отвечает 429. Скоринг и фоновые задачи ждут без срока
+    LLM_QUEUE_MAX_DEPTH: int = 50
+    LLM_QUEUE_TIMEOUT: float = 30.0
+
+    # Настройки конкурентного скоринга резюме
+    # Таймаут (в секундах) на оценку одного резюме
+    RESUME_SCORING_TIMEOUT: float = 120.0
+    # Размер топа и минимальный интервал (в секундах) между его обновлениями при потоковом ранжировании
+    RANKING_STREAM_TOP_K: int = 10
+    RANKING_STREAM_TOPK_INTERVAL: float = 2.0
+
+    # Несколько серверов Ollama: общий список адресов и (необязательно) свои адреса для отдельных моделей.
+    # Пусто — все запросы идут на адрес по умолчанию
+    OLLAMA_BACKENDS: List[str] = []
+    OLLAMA_MODEL_BACKENDS: Dict[str, List[str]] = {}
+    # Лимит одновременных запросов к одному серверу, период проверки серверов (в секундах)
+    # и число ошибок подряд, после которого сервер исключается из балансировки
+    OLLAMA_BACKEND_MAX_CONCURRENCY: int = 4
+    OLLAMA_HEALTH_CHECK_INTERVAL: float = 15.0
+    OLLAMA_EJECT_AFTER_FAILURES: int = 3
+
+    # Общие HTTP-клиенты LLM-провайдеров и вебхуков: размер пула, число keep-alive соединений
+    # и время (в секундах), через которое простаивающее соединение закрывается
+    HTTP_POOL_MAX_CONNECTIONS: int = 100
+    HTTP_POOL_MAX_KEEPALIVE: int = 20
+    HTTP_POOL_KEEPALIVE_EXPIRY: float = 30.0
+    # Использовать HTTP/2, если установлен пакет h2
+    HTTP_CLIENT_HTTP2: bool = True
+    # Бюджет токенов на текст резюме в промптах цепочек (0 — без ограничения): длинные резюме
+    # сокращаются до самых релевантных вакансии разделов
+    RESUME_TOKEN_BUDGETS: Dict[str, int] = {"resume_scorer": 1500, "analyst": 2000, "simulation": 1200}
+
+    # Пакетный скоринг: несколько резюме в одном запросе к LLM в пределах бюджета токенов
+    RESUME_BATCH_SCORING_ENABLED: bool = False
+    RESUME_BATCH_TOKEN_BUDGET: int = 6000
+    RESUME_BATCH_MAX_SIZE: int = 8
+
+    # Поиск почти дубликатов резюме (SimHash): дубликаты оцениваются один раз
+    DEDUP_ENABLED: bool = True
+    # Максимальное расстояние Хэмминга между 64-битными сигнатурами (чем больше, тем медленнее поиск)
+    DEDUP_MAX_HAMMING: int = 3
+
+    # Кэш оценок резюме в БД: срок жизни записи (в секундах) и максимальное число записей
+    SCORE_CACHE_ENABLED: bool = True
+    SCORE_CACHE_TTL_SECONDS: int = 30 * 24 * 3600
+    SCORE_CACHE_MAX_ENTRIES: int = 50000
+
+    # Кэш ответов детерминированных цепочек LLM (память + БД): какие цепочки кэшировать,
+    # срок жизни записи (в секундах), число записей в памяти и в БД
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_CHAINS: List[str] = ["question_gen", "vacancy_tech_summary", "tag_gen", "vacancy_builder"]
+    LLM_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    LLM_CACHE_MEMORY_ENTRIES: int = 512
+    LLM_CACHE_MAX_ENTRIES: int = 10000
+    # Объединять одинаковые одновременные вызовы цепочек в один запрос к LLM
+    LLM_COALESCING_ENABLED: bool = True
+    # Разбор JSON-ответов LLM: прерывать потоковую генерацию, как только JSON закрыт, и сколько раз
+    # просить модель исправить неразобранный ответ коротким промптом (0 — без исправления)
+    STRUCTURED_OUTPUT_STREAMING: bool = True
+    STRUCTURED_OUTPUT_REPAIR_ATTEMPTS: int = 1
+
+    # Подготовка артефактов вакансии при ее создании (выжимка требований, вопросы, теги, промпт и первая
+    # реплика интервьюера) и сколько последних неподготовленных вакансий догонять при старте приложения
+    VACANCY_PRECOMPILE_ENABLED: bool = True
+    VACANCY_PRECOMPILE_BACKFILL_LIMIT: int = 50
+
+    # Лексический предфильтр (BM25) перед скорингом через LLM
+    PREFILTER_ENABLED: bool = False
+    # Предфильтр применяется только к пакетам крупнее этого размера
+    PREFILTER_MIN_BATCH: int = 30
+    # Сколько лучших по BM25 резюме отправлять в LLM
+    PREFILTER_TOP_N: int = 20
+    # Дополнительно отправлять в LLM резюме с BM25 не ниже этой доли от максимума (None — отключено)
+    PREFILTER_MIN_SCORE_RATIO: Optional[float] = None
+    # Потолок лексической оценки отсеянных резюме, чтобы они не обгоняли оцененные LLM
+    PREFILTER_LEXICAL_SCORE_CAP: int = 30
+
+    # Векторный индекс вакансий и резюме (файлы хранятся рядом с interview_ai.db)
+    VECTOR_INDEX_DIR: str = "."
+    VECTOR_INDEX_DIM: int = 1024
+
+    # Очередь фоновых задач Webhook API: число воркеров и максимум попыток выполнения задачи
+    JOB_WORKERS: int = 4
+    JOB_MAX_ATTEMPTS: int = 3
+
+    # Пул процессов для парсинга документов (PDF/DOCX/RTF)
+    PARSER_WORKERS: int = 4
+    # Перезапуск процесса после указанного числа файлов (защита от утечек памяти)
+    PARSER_MAX_TASKS_PER_CHILD: int = 50
+    # Жесткий таймаут (в секундах) на парсинг одного файла
+    PARSER_FILE_TIMEOUT: float = 30.0
+    # Лимит памяти процесса парсинга (в МБ, 0 — без ограничения) и максимальный размер файла (в МБ)
+    PARSER_MEMORY_LIMIT_MB: int = 1024
+    PARSER_MAX_FILE_MB: int = 20
+    # Бюджет разбора PDF: сколько первых страниц и символов извлекать (0 — без ограничения)
+    PDF_MAX_PAGES: int = 0
+    PDF_MAX_CHARS: int = 0
+    # Сколько страниц PDF разбирает один процесс пула (страницы длинных PDF делятся между процессами)
+    PDF_PAGES_PER_TASK: int = 4
+    # PDF меньше этого размера (в КБ) разбираются одним процессом: каждой части передается весь файл
+    PDF_SPLIT_MIN_KB: int = 512
+    # Очистка извлеченного текста перед промптами: колонтитулы, переносы, повторы строк, лишние пробелы
+    TEXT_NORMALIZATION_ENABLED: bool = True
+
+    # Загрузка резюме ZIP-архивом: размер архива (МБ), число файлов, суммарный распакованный объем (МБ)
+    # и максимальная степень сжатия файла (защита от zip-бомб)
+    ARCHIVE_MAX_UPLOAD_MB: int = 200
+    ARCHIVE_MAX_ENTRIES: int = 1000
+    ARCHIVE_MAX_UNCOMPRESSED_MB: int = 1000
+    ARCHIVE_MAX_COMPRESSION_RATIO: int = 100
+
+    # Кэш извлеченного текста по SHA-256 содержимого файла: число записей в памяти и в БД, уровень сжатия zstd
+    TEXT_CACHE_ENABLED: bool = True
+    TEXT_CACHE_MEMORY_ENTRIES: int = 256
+    TEXT_CACHE_MAX_ENTRIES: int = 20000
+    TEXT_CACHE_ZSTD_LEVEL: int = 9
 
     # Секретный токен для аутентификации вебхуков
     WEBHOOK_SECRET_TOKEN: str = "change-me-in-dot-env-file"
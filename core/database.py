@@ -2,6 +2,9 @@
 Модуль для настройки подключения к базе данных и управления сессиями.
 """
 
+import logging
+
+from sqlalchemy import inspect, text
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import declarative_base
 
@@ -24,6 +27,24 @@ AsyncSessionFactory = async_sessionmaker(
 # Базовый класс для всех наших моделей данных (таблиц)
 Base = declarative_base()
 
+def add_missing_columns(sync_conn) -> None:
+    """
+    Добавляет в существующие таблицы новые nullable-колонки моделей.
+    `create_all` создает только отсутствующие таблицы, поэтому без этого шага
+    база, созданная предыдущей версией приложения, не получит новые поля.
+    """
+    inspector = inspect(sync_conn)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable:
+                continue
+            column_type = column.type.compile(dialect=sync_conn.dialect)
+            sync_conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+            logging.info(f"В таблицу '{table.name}' добавлена колонка '{column.name}'.")
+
 # Зависимость для FastAPI: предоставляет сессию базы данных в эндпоинты
 async def get_db() -> AsyncSession:
     """Создает и отдает асинхронную сессию БД, закрывая ее после использования."""
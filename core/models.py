@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field, HttpUrl
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, ConfigDict, Field, HttpUrl
+from typing import List, Optional, Dict, Any, Union
 
 # --- Модели для существующего веб-интерфейса ---
 
@@ -45,3 +45,42 @@ class VacancyBuildRequest(BaseModel):
     """Модель запроса для конструктора вакансий."""
     vacancy_text: str = Field(..., description="Исходный текст вакансии.")
     weights: Dict[str, Dict[str, Any]] = Field(..., description="Словарь с весами и описаниями критериев.")
+
+# --- Модели для переранжирования ---
+
+class RerankRequest(BaseModel):
+    """Модель запроса для переранжирования кандидатов вакансии по новым весам."""
+    weights: Optional[Dict[str, Dict[str, Any]]] = Field(None, description="Новые веса критериев. Если не заданы, используются сохраненные веса вакансии.")
+    save: bool = Field(False, description="Сохранить новые веса и пересчитанные оценки кандидатов в БД.")
+
+# --- Схемы структурированных ответов LLM (см. services/structured_output.py) ---
+# Проверяются обязательные поля и их типы; остальные поля ответа сохраняются как есть.
+
+Number = Union[int, float]
+
+class ResumeScoreOutput(BaseModel):
+    """Ответ цепочки скоринга одного резюме."""
+    model_config = ConfigDict(extra="allow")
+    score: Number
+    summary: str = ""
+    keywords: List[str] = []
+    subscores: Dict[str, Number] = {}
+
+class ChartScoresOutput(BaseModel):
+    """Ответ цепочки числового анализа собеседования для графиков."""
+    model_config = ConfigDict(extra="allow")
+    suitability_score: Number
+    score_breakdown: Dict[str, Number]
+    keyword_analysis: Dict[str, List[str]] = {}
+
+class InterviewScoreSection(BaseModel):
+    """Раздел анализа собеседования с итоговой оценкой."""
+    model_config = ConfigDict(extra="allow")
+    suitability_score: Number
+
+class InterviewAnalysisOutput(BaseModel):
+    """Ответ цепочки полного анализа собеседования."""
+    model_config = ConfigDict(extra="allow")
+    on_paper_analysis: Dict[str, Any]
+    interview_analysis: InterviewScoreSection
+    final_recommendations: Dict[str, Any]
@@ -5,7 +5,7 @@
 import datetime
 
 from sqlalchemy import (Column, Integer, String, Text, Float, DateTime, 
-                        ForeignKey, JSON)
+                        ForeignKey, JSON, LargeBinary)
 from sqlalchemy.orm import relationship
 
 from core.database import Base
@@ -19,6 +19,13 @@ class Vacancy(Base):
     generated_questions = Column(Text, nullable=True) # Сгенерированные вопросы для интервью
     weights_json = Column(JSON, nullable=True) # Веса критериев оценки в формате JSON
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    # Артефакты, подготовленные при создании вакансии (см. services/vacancy_compiler.py)
+    tech_summary = Column(Text, nullable=True) # Выжимка технических требований
+    tags = Column(Text, nullable=True)
+    interviewer_prompt_prefix = Column(Text, nullable=True) # Готовый шаблон промпта интервьюера
+    opening_question = Column(Text, nullable=True) # Первая реплика интервьюера
+    artifacts_version = Column(String(32), nullable=True) # Версия промптов и моделей, которыми подготовлены артефакты
+    compiled_at = Column(DateTime, nullable=True)
 
     # Связь с кандидатами: одна вакансия может иметь много кандидатов
     candidates = relationship("Candidate", back_populates="vacancy")
@@ -30,6 +37,10 @@ class Candidate(Base):
     filename = Column(String, nullable=False)
     resume_text = Column(Text)
     initial_score = Column(Float)
+    # Независимые от весов оценки по критериям: {criterion_id: 0-100}
+    subscores_json = Column(JSON, nullable=True)
+    # Сигнатура SimHash текста резюме (16 hex-символов) для поиска почти дубликатов
+    simhash = Column(String(16), nullable=True)
     # Статус для воронки найма
     status = Column(String, default="new", index=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
@@ -53,3 +64,57 @@ class Interview(Base):
 
     # Связь
     candidate = relationship("Candidate", back_populates="interviews")
+
+class ScoreCacheEntry(Base):
+    __tablename__ = "score_cache"
+
+    # SHA-256 от нормализованных текстов вакансии и резюме, весов, модели и версии промпта
+    cache_key = Column(String(64), primary_key=True)
+    result_json = Column(JSON, nullable=False)
+    model_name = Column(String)
+    prompt_version = Column(String)
+    hit_count = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+    last_accessed_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+
+class ExtractedTextCacheEntry(Base):
+    __tablename__ = "extracted_text_cache"
+
+    # SHA-256 от исходных байтов файла и версия парсеров (с бюджетом разбора PDF), которыми извлечен текст
+    content_hash = Column(String(64), primary_key=True)
+    parser_version = Column(String(32), primary_key=True)
+    # Извлеченный текст в UTF-8, сжатый zstd
+    text_zstd = Column(LargeBinary, nullable=False)
+    text_size = Column(Integer)
+    compressed_size = Column(Integer)
+    hit_count = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    last_accessed_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+
+class LLMResponseCacheEntry(Base):
+    __tablename__ = "llm_response_cache"
+
+    # SHA-256 от имени цепочки, версии промпта, модели с параметрами и входных данных
+    cache_key = Column(String(64), primary_key=True)
+    chain_name = Column(String, index=True)
+    model_name = Column(String)
+    prompt_version = Column(String)
+    response_text = Column(Text, nullable=False)
+    hit_count = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+    last_accessed_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(String(32), primary_key=True)
+    job_type = Column(String, nullable=False, index=True)
+    # Статусы: queued, running, completed, failed
+    status = Column(String, default="queued", nullable=False, index=True)
+    payload_json = Column(JSON, nullable=False)
+    result_json = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
@@ -8,9 +8,10 @@ from pydantic import BaseModel, HttpUrl
 
 from llm_providers.config import llm_settings_manager
 from llm_providers.llm_selector import get_current_llm_provider, generate_text_with_current_llm
+from services.http_clients import http_clients
+from services.llm_limits import LLMOverloadedError
 
 # Для вебхуков
-import httpx
 import hmac
 import hashlib
 import json
@@ -96,6 +97,8 @@ async def generate_text_api(request: GenerateTextRequest):
             temperature=request.temperature
         )
         return {"generated_text": generated_text}
+    except LLMOverloadedError:
+        raise
     except Exception as e:
         logging.error(f"Ошибка при генерации текста через API: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Ошибка генерации текста: {e}")
@@ -114,10 +117,10 @@ async def send_webhook(url: str, data: dict, secret: str) -> bool:
             'X-Webhook-Signature-256': f"sha256={signature}"
         }
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, content=payload, headers=headers, timeout=30.0)
-            response.raise_for_status()
-            
+        # Общий клиент с пулом keep-alive соединений вместо нового соединения на каждую доставку
+        response = await http_clients.get("webhooks").post(url, content=payload, headers=headers)
+        response.raise_for_status()
+
         logging.info(f"Вебхук успешно отправлен на {url}. Статус: {response.status_code}")
         return True
     except Exception as e:
@@ -7,6 +7,7 @@ from llm_providers.openai_llm import OpenAILLMProvider
 from llm_providers.yandex_llm import YandexLLMProvider
 from llm_providers.sber_llm import SberLLMProvider
 from llm_providers.config import llm_settings_manager
+from services.llm_limits import llm_slot
 
 # Словарь доступных провайдеров LLM
 LLM_PROVIDERS: Dict[str, BaseLLMProvider] = {
@@ -39,6 +40,9 @@ def get_llm_instance(model_name: str, temperature: float) -> Any:
 async def generate_text_with_current_llm(prompt: str, model_name: str, temperature: float) -> str:
     """
     Генерирует текст с использованием текущего выбранного LLM провайдера.
+    Запрос занимает место в адаптивном лимите провайдера (см. services/llm_limits.py).
     """
     provider = get_current_llm_provider()
-    return await provider.generate_text(prompt, model_name, temperature)
+    provider_name = next(name for name, instance in LLM_PROVIDERS.items() if instance is provider)
+    async with llm_slot(provider_name):
+        return await provider.generate_text(prompt, model_name, temperature)
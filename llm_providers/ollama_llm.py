@@ -1,10 +1,10 @@
 import logging
-from typing import Any
+from typing import Any, Dict, Tuple
 
-from langchain_community.chat_models import ChatOllama
 from langchain_core.messages import HumanMessage
 
 from llm_providers.base_llm import BaseLLMProvider
+from services.pooled_ollama import PooledChatOllama
 
 class OllamaLLMProvider(BaseLLMProvider):
     """
@@ -12,12 +12,17 @@ class OllamaLLMProvider(BaseLLMProvider):
     """
     def __init__(self):
         self._supported_models = ["gemma3:4b", "qwen2.5-coder:3b"] # Пример поддерживаемых моделей
+        # Экземпляры моделей переиспользуются между вызовами; соединения берутся из общего пула
+        self._instances: Dict[Tuple[str, float], PooledChatOllama] = {}
 
-    def get_llm_instance(self, model_name: str, temperature: float) -> ChatOllama:
+    def get_llm_instance(self, model_name: str, temperature: float) -> PooledChatOllama:
         if model_name not in self._supported_models:
             logging.warning(f"Модель {model_name} не поддерживается OllamaLLMProvider. Использую первую доступную: {self._supported_models[0]}")
             model_name = self._supported_models[0]
-        return ChatOllama(model=model_name, temperature=temperature)
+        key = (model_name, temperature)
+        if key not in self._instances:
+            self._instances[key] = PooledChatOllama(model=model_name, temperature=temperature)
+        return self._instances[key]
 
     async def generate_text(self, prompt: str, model_name: str, temperature: float) -> str:
         llm = self.get_llm_instance(model_name, temperature)
@@ -1,11 +1,12 @@
 import logging
-from typing import Any
+from typing import Any, Dict, Tuple
 
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage
 
 from llm_providers.base_llm import BaseLLMProvider
 from llm_providers.config import llm_settings_manager
+from services.http_clients import http_clients
 
 class OpenAILLMProvider(BaseLLMProvider):
     """
@@ -13,6 +14,8 @@ class OpenAILLMProvider(BaseLLMProvider):
     """
     def __init__(self):
         self._supported_models = ["gpt-3.5-turbo", "gpt-4", "gpt-4o"] # Пример поддерживаемых моделей
+        # Экземпляры моделей переиспользуются между вызовами и работают через общий пул соединений
+        self._instances: Dict[Tuple[Any, ...], ChatOpenAI] = {}
 
     def get_llm_instance(self, model_name: str, temperature: float) -> ChatOpenAI:
         api_key = llm_settings_manager.settings.OPENAI_API_KEY
@@ -23,7 +26,14 @@ class OpenAILLMProvider(BaseLLMProvider):
             logging.warning(f"Модель {model_name} не поддерживается OpenAILLMProvider. Использую первую доступную: {self._supported_models[0]}")
             model_name = self._supported_models[0]
 
-        return ChatOpenAI(model=model_name, temperature=temperature, api_key=api_key)
+        http_client = http_clients.get("openai")
+        # Клиент входит в ключ: после перезапуска реестра экземпляры создаются заново
+        key = (model_name, temperature, api_key, id(http_client))
+        if key not in self._instances:
+            self._instances[key] = ChatOpenAI(
+                model=model_name, temperature=temperature, api_key=api_key, http_async_client=http_client
+            )
+        return self._instances[key]
 
     async def generate_text(self, prompt: str, model_name: str, temperature: float) -> str:
         try:
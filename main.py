@@ -8,19 +8,31 @@
 import logging
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy import text # <--- Импортируем text
 
 # Импорт модулей для инициализации БД
-from core.database import engine, Base
+from core.config import settings
+from core.database import engine, Base, add_missing_columns
 from core import schemas # Убедимся, что модуль со схемами импортирован
 
 # Импорт маршрутизаторов
-from api import ranking, interview, general, dashboard, webhook, api_v1, stt_settings, stt_interview # Импорт существующих роутеров и нового api_v1
+from api import ranking, interview, general, dashboard, webhook, api_v1, stt_settings, stt_interview, metrics, matching, jobs # Импорт существующих роутеров и нового api_v1
 from audio_processing.api import router as audio_processing_router # Импорт роутера для обработки аудио
 from llm_providers.api import router as llm_providers_router # Импорт роутера для LLM провайдеров
+from services.score_cache import score_cache
+from services.text_cache import text_cache
+from services.llm_response_cache import llm_response_cache
+from services.vector_index import ensure_vector_indexes
+from services.job_queue import job_queue
+from services.parsing_pool import parsing_pool
+from services.vacancy_compiler import vacancy_compiler
+from services.http_clients import http_clients
+from services.ollama_backends import ollama_backends
+from services.llm_limits import LLMOverloadedError
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -36,14 +48,58 @@ async def lifespan(app: FastAPI):
         await conn.run_sync(lambda sync_conn: sync_conn.execute(text("PRAGMA foreign_keys=ON")))
         # Создаем все таблицы, определенные в Base
         await conn.run_sync(Base.metadata.create_all)
+        # Добавляем новые колонки в таблицы, созданные предыдущими версиями
+        await conn.run_sync(add_missing_columns)
     logging.info("База данных и таблицы успешно инициализированы.")
+    # Удаляем устаревшие записи кэша оценок, накопившиеся с прошлого запуска
+    await score_cache.evict()
+    # Удаляем тексты, извлеченные прошлыми версиями парсеров
+    await text_cache.evict()
+    # Удаляем устаревшие ответы цепочек LLM
+    await llm_response_cache.evict()
+    # При первом запуске строим векторные индексы по уже сохраненным данным
+    await ensure_vector_indexes()
+    # Запускаем воркеров фоновых задач и продолжаем задачи, прерванные прошлым остановом
+    await job_queue.start()
+    # Запускаем проверку серверов Ollama (если настроено несколько)
+    ollama_backends.start()
+    # В фоне готовим артефакты вакансий, созданных до включения подготовки или до смены промптов
+    vacancy_compiler.schedule_backfill()
     yield
     logging.info("Приложение останавливается...")
+    await job_queue.stop()
+    parsing_pool.shutdown()
+    await ollama_backends.stop()
+    # Закрываем соединения общих HTTP-клиентов
+    await http_clients.aclose()
 
 
 # Создание экземпляра FastAPI с менеджером жизненного цикла
 app = FastAPI(lifespan=lifespan)
 
+@app.exception_handler(LLMOverloadedError)
+async def llm_overloaded_handler(request: Request, exc: LLMOverloadedError):
+    """Перегрузка LLM-провайдера: клиент получает 429 и время, через которое стоит повторить запрос."""
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc), "provider": exc.provider},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+@app.middleware("http")
+async def reject_oversized_archive(request: Request, call_next):
+    """Отклоняет слишком большой архив по Content-Length, не дожидаясь загрузки тела запроса."""
+    if request.url.path == "/rank-resumes/archive":
+        # Кроме архива в запросе файл вакансии и поля формы
+        max_bytes = (settings.ARCHIVE_MAX_UPLOAD_MB + settings.PARSER_MAX_FILE_MB) * 1024 * 1024
+        content_length = request.headers.get("content-length", "")
+        if content_length.isdigit() and int(content_length) > max_bytes:
+            return JSONResponse(
+                status_code=413,
+                content={"detail": f"Архив превышает допустимый размер {settings.ARCHIVE_MAX_UPLOAD_MB} МБ."}
+            )
+    return await call_next(request)
+
 # Настройка CORS
 app.add_middleware(
     CORSMiddleware,
@@ -64,6 +120,9 @@ app.include_router(stt_settings.router) # New router for STT settings
 app.include_router(stt_interview.router) # New router for STT-enabled interview
 app.include_router(audio_processing_router) # New router for audio processing
 app.include_router(llm_providers_router) # New router for LLM providers
+app.include_router(metrics.router) # Метрики кэшей и очередей
+app.include_router(matching.router) # Подбор вакансий и кандидатов по векторному индексу
+app.include_router(jobs.router) # Статус и результаты фоновых задач
 
 # Подключение статических файлов
 app.mount("/static", StaticFiles(directory="static"), name="static")
\ No newline at end of file
@@ -3,9 +3,10 @@ import requests
 import os
 from dotenv import load_dotenv
 import json
-import re
 from datetime import datetime, timezone
 
+from json_extraction import StructuredOutputError, extract_json
+
 load_dotenv() # Загружаем переменные окружения из .env
 
 app = Flask(__name__)
@@ -22,34 +23,22 @@ MODEL_MAPPING = {
 
 def extract_json_from_content(content: str) -> str | None:
     """
-    Извлекает строку JSON из ответа LLM, который может содержать Markdown.
+    Извлекает строку JSON из ответа LLM, который может содержать Markdown,
+    пояснения, висячие запятые или обрываться на лимите токенов.
     """
-    # Попытка 1: Ищем JSON-блок в Markdown-формате
-    match = re.search(r"""```json
-(.*?)
-```""", content, re.DOTALL)
-    if match:
-        print(f"[{os.getpid()}] Found JSON block in Markdown.")
-        return match.group(1)
-
-    # Попытка 2: Ищем JSON, который начинается с '{' и заканчивается '}'
-    try:
-        start = content.index('{')
-        end = content.rindex('}') + 1
-        substring = content[start:end]
-        json.loads(substring) # Проверяем валидность
-        print(f"[{os.getpid()}] Found JSON block by slicing from {{ to }}.")
-        return substring
-    except (ValueError, json.JSONDecodeError):
-        pass # Идем дальше, если не нашли или невалидный JSON
-
-    # Попытка 3: Пробуем распарсить весь content как JSON
     try:
         json.loads(content)
         print(f"[{os.getpid()}] Content is directly parsable as JSON.")
         return content
     except json.JSONDecodeError:
-        print(f"[{os.getpid()}] No valid JSON found in content.")
+        pass
+
+    try:
+        extracted = json.dumps(extract_json(content), ensure_ascii=False)
+        print(f"[{os.getpid()}] Extracted and repaired JSON from content.")
+        return extracted
+    except StructuredOutputError as e:
+        print(f"[{os.getpid()}] No valid JSON found in content: {e}")
         return None
 
 def create_error_json_content(summary: str, original_text: str = "") -> str:
@@ -113,14 +102,8 @@ def proxy_request():
                 # Если клиент просил JSON, мы должны его извлечь
                 extracted_json = extract_json_from_content(original_content)
                 if extracted_json:
-                    # Проверяем валидность извлеченного JSON
-                    try:
-                        json.loads(extracted_json)
-                        final_content_str = extracted_json
-                        print(f"[{os.getpid()}] Successfully extracted and validated JSON content.")
-                    except json.JSONDecodeError:
-                        final_content_str = create_error_json_content("LLM вернул невалидный JSON", extracted_json)
-                        print(f"[{os.getpid()}] Extracted content is not valid JSON. Replaced with error JSON.")
+                    final_content_str = extracted_json
+                    print(f"[{os.getpid()}] Successfully extracted and validated JSON content.")
                 else:
                     # Если JSON не найден вообще
                     final_content_str = create_error_json_content("LLM вернул не-JSON ответ", original_content)
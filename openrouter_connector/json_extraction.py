@@ -0,0 +1,205 @@
+"""
+Нестрогое извлечение JSON из ответов LLM для OpenRouter-коннектора.
+
+Копия разбора из services/structured_output.py основного проекта: коннектор
+разворачивается отдельно от него, поэтому зависит только от стандартной
+библиотеки и собственных файлов. При изменении разбора обновляйте обе копии.
+"""
+
+import json
+from typing import Any, List, Optional
+
+# Сколько возможных начал JSON перебирать, если перед ответом есть текст со скобками
+MAX_JSON_CANDIDATES = 20
+# Python-литералы, которые модели иногда пишут вместо JSON
+PYTHON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+
+class StructuredOutputError(ValueError):
+    """Ответ LLM не удалось разобрать как JSON или он не соответствует схеме."""
+
+    def __init__(self, message: str, raw: str):
+        super().__init__(message)
+        self.raw = raw
+
+
+class IncrementalJSONParser:
+    """
+    Потоковый нестрогий разбор JSON-объекта или массива из ответа LLM.
+
+    Текст до первой `{` или `[` пропускается, текст после закрытия JSON
+    верхнего уровня игнорируется. Пробелы вне строк отбрасываются, висячие
+    и повторные запятые удаляются.
+    """
+
+    def __init__(self):
+        self._buf: List[str] = []
+        # Открытые контейнеры: [закрывающая скобка, состояние, начало текущего элемента в буфере]
+        self._stack: List[List[Any]] = []
+        self._in_string = False
+        self._escape = False
+        self._literal_start: Optional[int] = None
+        self.complete = False
+        self.started = False
+
+    def feed(self, chunk: str) -> bool:
+        """Добавляет фрагмент ответа. Возвращает True, когда JSON верхнего уровня закрыт."""
+        for char in chunk:
+            if self.complete:
+                break
+            self._feed_char(char)
+        return self.complete
+
+    def _feed_char(self, char: str) -> None:
+        buf = self._buf
+        if not self.started:
+            if char in "{[":
+                self.started = True
+                self._open(char)
+            return
+
+        if self._in_string:
+            buf.append(char)
+            if self._escape:
+                self._escape = False
+            elif char == "\\":
+                self._escape = True
+            elif char == '"':
+                self._in_string = False
+                frame = self._stack[-1]
+                # Закрылась строка-ключ — ждем двоеточие, строка-значение — запятую
+                frame[1] = "colon" if frame[1] == "key" else "comma"
+            return
+
+        if self._literal_start is not None and (char.isspace() or char in ",:}]"):
+            self._end_literal()
+
+        if char.isspace():
+            return
+        if char in "{[":
+            self._start_value()
+            self._open(char)
+        elif char in "}]":
+            self._close()
+        elif char == ",":
+            if buf and buf[-1] not in ",[{":
+                buf.append(",")
+            frame = self._stack[-1]
+            frame[1] = "key" if frame[0] == "}" else "value"
+            frame[2] = len(buf)
+        elif char == ":":
+            buf.append(":")
+            self._stack[-1][1] = "value"
+        elif char == '"':
+            frame = self._stack[-1]
+            if frame[0] == "}" and frame[1] in ("key", "comma"):
+                # Пропущенная между парами запятая
+                if frame[1] == "comma":
+                    buf.append(",")
+                frame[1], frame[2] = "key", len(buf)
+            else:
+                self._start_value()
+            buf.append(char)
+            self._in_string = True
+        elif self._literal_start is None:
+            self._start_value()
+            self._literal_start = len(buf)
+            buf.append(char)
+        else:
+            buf.append(char)
+
+    def _open(self, char: str) -> None:
+        self._buf.append(char)
+        self._stack.append(["}" if char == "{" else "]", "key" if char == "{" else "value", len(self._buf)])
+
+    def _start_value(self) -> None:
+        frame = self._stack[-1]
+        if frame[0] == "]" and frame[1] != "in_value":
+            frame[2] = len(self._buf)
+        frame[1] = "in_value"
+
+    def _end_literal(self) -> None:
+        literal = "".join(self._buf[self._literal_start:])
+        if literal in PYTHON_LITERALS:
+            del self._buf[self._literal_start:]
+            self._buf.extend(PYTHON_LITERALS[literal])
+        self._literal_start = None
+        self._stack[-1][1] = "comma"
+
+    def _close(self) -> None:
+        frame = self._stack.pop()
+        buf = self._buf
+        # Ключ без значения (`{"a": }`) отбрасываем вместе с ключом
+        if frame[0] == "}" and frame[1] in ("colon", "value"):
+            del buf[frame[2]:]
+        while buf and buf[-1] == ",":
+            buf.pop()
+        buf.append(frame[0])
+        if self._stack:
+            self._stack[-1][1] = "comma"
+        else:
+            self.complete = True
+
+    def text(self) -> str:
+        """JSON-текст, разобранный на данный момент; незакрытый ответ достраивается."""
+        if not self.started:
+            raise StructuredOutputError("Ответ не содержит JSON.", "")
+        if self.complete:
+            return "".join(self._buf)
+
+        buf = list(self._buf)
+        stack = [list(frame) for frame in self._stack]
+        top = stack[-1]
+        if self._in_string:
+            if top[1] == "key":
+                # Оборванный ключ отбрасываем
+                del buf[top[2]:]
+                top[1] = "comma"
+            else:
+                if self._escape:
+                    buf.pop()
+                buf.append('"')
+        elif self._literal_start is not None:
+            literal = "".join(buf[self._literal_start:])
+            literal = PYTHON_LITERALS.get(literal, literal)
+            if literal in ("true", "false", "null"):
+                buf[self._literal_start:] = literal
+            else:
+                # Число на обрыве могло быть не дописано (`8` вместо `85`), литерал — тоже (`tru`):
+                # отбрасываем его вместе с ключом
+                del buf[top[2]:]
+
+        for frame in reversed(stack):
+            if frame[0] == "}" and frame[1] in ("colon", "value"):
+                del buf[frame[2]:]
+            while buf and buf[-1] in ",:":
+                buf.pop()
+            buf.append(frame[0])
+        return "".join(buf)
+
+    def value(self) -> Any:
+        """Разобранное значение; незакрытый ответ достраивается."""
+        text = self.text()
+        try:
+            return json.loads(text, strict=False)
+        except ValueError as e:
+            raise StructuredOutputError(f"Не удалось восстановить JSON: {e}", text) from e
+
+
+def extract_json(text: str) -> Any:
+    """
+    Нестрого извлекает JSON-объект или массив из ответа LLM.
+
+    Raises:
+        StructuredOutputError: В ответе нет JSON, который удалось бы восстановить.
+    """
+    starts = [i for i, char in enumerate(text or "") if char in "{["][:MAX_JSON_CANDIDATES]
+    error: Optional[Exception] = None
+    for start in starts:
+        parser = IncrementalJSONParser()
+        parser.feed(text[start:])
+        try:
+            return parser.value()
+        except StructuredOutputError as e:
+            error = e
+    raise StructuredOutputError(f"Ответ не содержит корректного JSON{f': {error}' if error else ''}.", text or "")
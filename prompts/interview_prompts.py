@@ -105,6 +105,9 @@ VACANCY_TECH_SUMMARY_PROMPT = """
 КЛЮЧЕВЫЕ ТЕХНИЧЕСКИЕ И ПРОФЕССИОНАЛЬНЫЕ ТРЕБОВАНИЯ:
 """
 
+# Реплика, с которой интервьюер начинает голосовое собеседование
+OPENING_HUMAN_INPUT = "Начни собеседование, представившись и обозначив вакансию и ключевые темы для обсуждения."
+
 STRESS_CANDIDATE_SYSTEM_PROMPT = '''
 Ты — Даниил, кандидат на собеседовании. Ты **не AI**, ты человек. Ты очень сложный, непредсказуемый и язвительный человек. Твоя цель — вести себя так, чтобы максимально проверить терпение и гибкость рекрутера.
 
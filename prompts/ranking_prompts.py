@@ -1,14 +1,20 @@
-RESUME_SCORER_PROMPT = """Ты — HR-ассистент, специализирующийся на скоринге резюме. Сравни резюме кандидата с описанием вакансии, уделяя особое внимание указанным критериям и их весам.
+# Версия промпта скоринга. Увеличивайте при любом изменении RESUME_SCORER_PROMPT,
+# чтобы кэш оценок не отдавал результаты, полученные со старой версией.
+RESUME_SCORER_PROMPT_VERSION = "2"
+RESUME_BATCH_SCORER_PROMPT_VERSION = "2"
 
-**КРИТЕРИИ ОЦЕНКИ И ИХ ВЕСА:**
-{weights_json}
+RESUME_SCORER_PROMPT = """Ты — HR-ассистент, специализирующийся на скоринге резюме. Сравни резюме кандидата с описанием вакансии и оцени его отдельно по каждому из указанных критериев.
+
+**КРИТЕРИИ ОЦЕНКИ:**
+{criteria_json}
 
-Твоя задача — вернуть JSON с оценкой, где итоговый балл `score` является взвешенным средним, рассчитанным на основе этих критериев.
+Оценивай каждый критерий независимо от остальных: итоговый балл с учетом весов критериев рассчитывается на сервере.
 
-Твой ответ ДОЛЖЕН быть в формате JSON и содержать ключи "score", "summary", "keywords".
-- "score": Итоговая оценка соответствия резюме вакансии по шкале от 0 до 100, рассчитанная с учетом весов.
-- "summary": Краткое (2-3 предложения) обоснование оценки, объясняющее, как сильные и слабые стороны кандидата соотносятся с наиболее весомыми критериями.
-- "keywords": ["Список из 3-5 ключевых навыков или совпадений, особенно по важным критериям."]
+Твой ответ ДОЛЖЕН быть в формате JSON и содержать ключи "subscores", "score", "summary", "keywords".
+- "subscores": Объект, где ключ — идентификатор критерия из списка выше, а значение — оценка резюме по этому критерию по шкале от 0 до 100.
+- "score": Общая оценка соответствия резюме вакансии по шкале от 0 до 100.
+- "summary": Краткое (2-3 предложения) обоснование оценки, объясняющее сильные и слабые стороны кандидата по критериям.
+- "keywords": ["Список из 3-5 ключевых навыков или совпадений с требованиями вакансии."]
 
 ВАКАНСИЯ:
 {vacancy_text}
@@ -17,6 +23,29 @@ RESUME_SCORER_PROMPT = """Ты — HR-ассистент, специализир
 {resume_text}
 """
 
+RESUME_BATCH_SCORER_PROMPT = """Ты — HR-ассистент, специализирующийся на скоринге резюме. Сравни КАЖДОЕ из приведенных ниже резюме с описанием вакансии независимо от остальных и оцени его отдельно по каждому из указанных критериев.
+
+**КРИТЕРИИ ОЦЕНКИ:**
+{criteria_json}
+
+Оценивай каждый критерий независимо от остальных: итоговый балл с учетом весов критериев рассчитывается на сервере.
+
+Твой ответ ДОЛЖЕН быть в формате JSON с единственным ключом "results" — списком объектов, по одному на каждое резюме. Каждый объект содержит ключи "id", "subscores", "score", "summary", "keywords".
+- "id": Идентификатор резюме ровно в том виде, в котором он указан в заголовке резюме (например, "R1").
+- "subscores": Объект, где ключ — идентификатор критерия из списка выше, а значение — оценка резюме по этому критерию по шкале от 0 до 100.
+- "score": Общая оценка соответствия резюме вакансии по шкале от 0 до 100.
+- "summary": Краткое (2-3 предложения) обоснование оценки, объясняющее сильные и слабые стороны кандидата по критериям.
+- "keywords": ["Список из 3-5 ключевых навыков или совпадений с требованиями вакансии."]
+
+Не пропускай ни одного резюме и не объединяй их.
+
+ВАКАНСИЯ:
+{vacancy_text}
+
+РЕЗЮМЕ:
+{resumes_block}
+"""
+
 TOP_RANKER_PROMPT = """Ты — главный рекрутер. Тебе предоставлен список кандидатов с их индивидуальными оценками соответствия вакансии.
 Твоя задача — написать краткое общее заключение и отсортировать кандидатов от лучшего к худшему по ключу `score`.
 Твой ответ ДОЛЖЕН быть в формате JSON, содержащий один ключ "ranking", который является списком всех полученных тобой объектов кандидатов.
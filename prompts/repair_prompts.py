@@ -0,0 +1,23 @@
+# flake8: noqa
+"""
+Промпт для исправления структурированного ответа LLM без повторного полного запроса.
+"""
+
+JSON_REPAIR_PROMPT = """
+Ты — валидатор JSON. Ниже приведен ответ другой модели, который должен был быть JSON, но не прошел проверку.
+Исправь ТОЛЬКО форму ответа: синтаксис JSON, названия и типы полей. Не придумывай новых данных и не меняй смысл существующих.
+Если поле обязательно, но его значение нельзя восстановить из ответа, укажи правдоподобное значение по остальному содержимому ответа.
+
+**Ошибка проверки:**
+{error}
+
+**Ожидаемая JSON-схема:**
+{schema}
+
+**Ответ модели:**
+---
+{raw_output}
+---
+
+Верни ТОЛЬКО исправленный JSON, без пояснений и без ```json маркеров.
+"""
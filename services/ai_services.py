@@ -1,8 +1,8 @@
+import contextlib
 import json
 import logging
-from typing import List, Dict
+from typing import Any, Dict
 
-from langchain_community.chat_models import ChatOllama
 from langchain.prompts import PromptTemplate
 from langchain.chains import LLMChain
 
@@ -10,18 +10,33 @@ from langchain.chains import LLMChain
 from core.config import settings
 from prompts.interview_prompts import QUESTION_GEN_PROMPT, VACANCY_TECH_SUMMARY_PROMPT
 from prompts.analysis_prompts import ANALYST_SYSTEM_PROMPT
-from prompts.ranking_prompts import RESUME_SCORER_PROMPT, VACANCY_BUILDER_PROMPT
+from prompts.ranking_prompts import RESUME_SCORER_PROMPT, RESUME_BATCH_SCORER_PROMPT, VACANCY_BUILDER_PROMPT
 from prompts.chart_prompts import SCORING_ANALYST_PROMPT
+from prompts.repair_prompts import JSON_REPAIR_PROMPT
+# ChatOllama, работающий через общий пул HTTP-соединений
+from services.pooled_ollama import PooledChatOllama
+from services.llm_response_cache import llm_response_cache
+from services.structured_output import (
+    IncrementalJSONParser,
+    StructuredOutputError,
+    parse_structured,
+    structured_output_stats
+)
+
+# Сколько символов неразобранного ответа отправлять модели на исправление
+JSON_REPAIR_MAX_CHARS = 8000
 
 # --- Инициализация LLM на основе настроек ---
-interviewer_llm = ChatOllama(model=settings.LLM_INTERVIEWER_MODEL, temperature=0.7)
-candidate_llm = ChatOllama(model=settings.LLM_CANDIDATE_MODEL, temperature=0.7)
-question_gen_llm = ChatOllama(model=settings.LLM_QUESTION_GEN_MODEL, temperature=0.5)
+interviewer_llm = PooledChatOllama(model=settings.LLM_INTERVIEWER_MODEL, temperature=0.7)
+candidate_llm = PooledChatOllama(model=settings.LLM_CANDIDATE_MODEL, temperature=0.7)
+question_gen_llm = PooledChatOllama(model=settings.LLM_QUESTION_GEN_MODEL, temperature=0.5)
 # Модель для анализа и скоринга должна уметь работать с JSON
-analyst_llm = ChatOllama(model=settings.LLM_ANALYST_MODEL, temperature=0.2, format="json")
-scoring_llm = ChatOllama(model=settings.LLM_ANALYST_MODEL, temperature=0.1, format="json")
+analyst_llm = PooledChatOllama(model=settings.LLM_ANALYST_MODEL, temperature=0.2, format="json")
+scoring_llm = PooledChatOllama(model=settings.LLM_ANALYST_MODEL, temperature=0.1, format="json")
 # Новый LLM для генерации текста без JSON формата
-text_llm = ChatOllama(model=settings.LLM_ANALYST_MODEL, temperature=0.2)
+text_llm = PooledChatOllama(model=settings.LLM_ANALYST_MODEL, temperature=0.2)
+# LLM для исправления JSON-ответов других цепочек
+json_repair_llm = PooledChatOllama(model=settings.LLM_ANALYST_MODEL, temperature=0.0, format="json")
 
 # --- Инициализация цепочек LLM с использованием промптов ---
 question_gen_chain = LLMChain(
@@ -48,6 +63,13 @@ resume_scorer_chain = LLMChain(
     verbose=False
 )
 
+# Пакетный скоринг: несколько резюме в одном запросе к LLM
+resume_batch_scorer_chain = LLMChain(
+    llm=analyst_llm,
+    prompt=PromptTemplate.from_template(RESUME_BATCH_SCORER_PROMPT),
+    verbose=False
+)
+
 vacancy_builder_chain = LLMChain(
     llm=text_llm,
     prompt=PromptTemplate.from_template(VACANCY_BUILDER_PROMPT),
@@ -60,6 +82,13 @@ vacancy_tech_summary_chain = LLMChain(
     verbose=False
 )
 
+# Исправление JSON-ответа: получает только сам ответ, без контекста исходного запроса
+json_repair_chain = LLMChain(
+    llm=json_repair_llm,
+    prompt=PromptTemplate.from_template(JSON_REPAIR_PROMPT),
+    verbose=False
+)
+
 def create_llm_chain(llm_instance, template):
     """Фабричная функция для создания кастомных цепочек LLM для диалогов."""
     prompt = PromptTemplate(template=template, input_variables=["chat_history", "human_input"])
@@ -84,7 +113,9 @@ async def build_vacancy_description(vacancy_text: str, weights: Dict) -> str:
 
         weights_json = json.dumps(processed_weights, ensure_ascii=False, indent=2)
         
-        generated_description = await vacancy_builder_chain.apredict(
+        generated_description = await llm_response_cache.apredict(
+            "vacancy_builder",
+            vacancy_builder_chain,
             vacancy_text=vacancy_text,
             weights_json=weights_json
         )
@@ -95,66 +126,72 @@ async def build_vacancy_description(vacancy_text: str, weights: Dict) -> str:
         raise Exception(f"Ошибка при генерации описания вакансии: {e}")
 
 
-async def score_and_sort_resumes(vacancy_text: str, resumes: List[Dict]) -> List[Dict]:
-    """
-    Асинхронно оценивает список резюме относительно вакансии и сортирует их.
-    Обрабатывает ошибки для каждого резюме индивидуально.
-
-    Args:
-        vacancy_text: Текст вакансии.
-        resumes: Список словарей, где каждый словарь содержит 'id' и 'text' резюме.
-
-    Returns:
-        Отсортированный список словарей с результатами скоринга.
-    """
-    scored_resumes = []
-    for i, resume_data in enumerate(resumes, 1):
-        resume_id = resume_data.get("id", f"unknown_{i}")
-        resume_text = resume_data.get("text")
-        logging.info(f"[Скоринг {i}/{len(resumes)}] Обработка резюме ID: {resume_id}")
-
-        if not resume_text:
-            logging.warning(f"[Скоринг {i}/{len(resumes)}] Пустой текст для резюме ID: {resume_id}. Пропуск.")
-            scored_resumes.append({
-                "id": resume_id,
-                "filename": resume_id, # Для обратной совместимости с UI
-                "score": -1,
-                "summary": "Ошибка: Текст резюме пуст.",
-                "keywords": ["ОШИБКА"],
-            })
-            continue
-
-        try:
-            score_str = await resume_scorer_chain.apredict(vacancy_text=vacancy_text, resume_text=resume_text)
-            score_data = json.loads(score_str)
-            score_data["id"] = resume_id
-            score_data["filename"] = resume_id # Для обратной совместимости с UI
-            scored_resumes.append(score_data)
-            logging.info(f"[Скоринг {i}/{len(resumes)}] Резюме ID: {resume_id} успешно оценено.")
-        except Exception as e:
-            error_summary = f"Ошибка анализа ИИ: {e}"
-            logging.error(f"[Скоринг {i}/{len(resumes)}] Сбой обработки резюме ID: {resume_id}. Причина: {error_summary}", exc_info=True)
-            scored_resumes.append({
-                "id": resume_id,
-                "filename": resume_id, # Для обратной совместимости с UI
-                "score": -1,
-                "summary": error_summary,
-                "keywords": ["ОШИБКА"],
-            })
-            continue
-            
-    sorted_resumes = sorted(scored_resumes, key=lambda x: x.get('score', 0), reverse=True)
-    return sorted_resumes
-
 async def summarize_vacancy_tech_requirements(vacancy_text: str) -> str:
     """
     Извлекает и суммирует ключевые технические и профессиональные требования из текста вакансии.
     """
     logging.info(f"Начинаю извлечение технических требований из вакансии: {vacancy_text[:50]}...")
     try:
-        summary = await vacancy_tech_summary_chain.apredict(vacancy_text=vacancy_text)
+        summary = await llm_response_cache.apredict("vacancy_tech_summary", vacancy_tech_summary_chain, vacancy_text=vacancy_text)
         logging.info("Технические требования успешно извлечены.")
         return summary
     except Exception as e:
         logging.error(f"Ошибка при извлечении технических требований из вакансии: {e}", exc_info=True)
         return "Не удалось извлечь технические требования."
+
+
+async def _generate_json_text(chain, inputs: Dict[str, Any]) -> str:
+    """Генерирует ответ цепочки; при потоковой генерации останавливается, как только JSON верхнего уровня закрыт."""
+    if not settings.STRUCTURED_OUTPUT_STREAMING:
+        return await chain.apredict(**inputs)
+    parser = IncrementalJSONParser()
+    parts = []
+    async with contextlib.aclosing(chain.llm.astream(chain.prompt.format_prompt(**inputs))) as stream:
+        async for chunk in stream:
+            parts.append(chunk.content)
+            # Продолжение после JSON (пояснения, хвост из пробелов в режиме format=json) не нужно
+            if parser.feed(chunk.content):
+                break
+    return "".join(parts)
+
+
+async def apredict_json(name: str, chain, schema: Any = None, **inputs: Any) -> Any:
+    """
+    Вызывает цепочку с JSON-ответом и возвращает разобранный результат.
+
+    Ответ разбирается нестрого и проверяется по схеме (см. services/structured_output.py).
+    Если это не удалось, модели отправляется короткий промпт на исправление только самого
+    ответа (до `STRUCTURED_OUTPUT_REPAIR_ATTEMPTS` раз) вместо повторного полного запроса.
+
+    Args:
+        name: Имя цепочки для логов и метрик.
+        chain: Цепочка LLMChain.
+        schema: Pydantic-модель ответа (необязательно).
+        **inputs: Входные переменные промпта.
+
+    Raises:
+        StructuredOutputError: Ответ не удалось ни разобрать, ни исправить.
+    """
+    raw = await _generate_json_text(chain, inputs)
+    try:
+        return parse_structured(raw, schema, name)
+    except StructuredOutputError as e:
+        error = e
+
+    schema_text = json.dumps(schema.model_json_schema(), ensure_ascii=False) if schema is not None else "Любой корректный JSON."
+    for attempt in range(settings.STRUCTURED_OUTPUT_REPAIR_ATTEMPTS):
+        structured_output_stats.llm_repairs[name] += 1
+        logging.warning(f"[StructuredOutput] {name}: прошу модель исправить ответ (попытка {attempt + 1}).")
+        raw = await _generate_json_text(json_repair_chain, {
+            "error": str(error),
+            "schema": schema_text,
+            "raw_output": raw[:JSON_REPAIR_MAX_CHARS]
+        })
+        try:
+            data = parse_structured(raw, schema, name)
+        except StructuredOutputError as e:
+            error = e
+            continue
+        structured_output_stats.llm_repaired[name] += 1
+        return data
+    raise error
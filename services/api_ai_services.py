@@ -1,11 +1,11 @@
 
 import logging
-import json
-from langchain_community.chat_models import ChatOllama
 from langchain.prompts import PromptTemplate
 from langchain.chains import LLMChain
 
 from core.config import settings
+from core.models import InterviewAnalysisOutput
+from services.pooled_ollama import PooledChatOllama
 from prompts.tag_prompts import TAG_CLOUD_PROMPT_TEMPLATE
 from prompts.interview_prompts import (
     INTERVIEWER_SYSTEM_PROMPT,
@@ -16,17 +16,20 @@ from prompts.interview_prompts import (
     RECOMMENDED_QUESTIONS_BLOCK,
     DEFAULT_JOB_DESCRIPTION
 )
+from services.resume_sections import fit_resume_to_budget
+from services.llm_response_cache import llm_response_cache
 # Импортируем существующие, уже настроенные цепочки и LLM
 from services.ai_services import (
     analyst_chain,
     question_gen_chain,
     interviewer_llm,
-    candidate_llm
+    candidate_llm,
+    apredict_json
 )
 
 # --- Инициализация LLM для API ---
 # Модель для генерации тегов (текстовый вывод)
-tag_gen_llm = ChatOllama(model=settings.LLM_QUESTION_GEN_MODEL, temperature=0.1)
+tag_gen_llm = PooledChatOllama(model=settings.LLM_QUESTION_GEN_MODEL, temperature=0.1)
 
 # --- Цепочки для API ---
 tag_gen_chain = LLMChain(
@@ -41,7 +44,7 @@ async def generate_tags_for_vacancy(vacancy_text: str) -> str:
     """
     logging.info(f"[API AI Service] Начинаю генерацию тегов для вакансии: {vacancy_text[:50]}...")
     try:
-        tags = await tag_gen_chain.apredict(vacancy_text=vacancy_text)
+        tags = await llm_response_cache.apredict("tag_gen", tag_gen_chain, vacancy_text=vacancy_text)
         logging.info(f"[API AI Service] Теги успешно сгенерированы: {tags}")
         return tags.strip()
     except Exception as e:
@@ -57,9 +60,12 @@ async def run_interview_simulation(vacancy_text: str, resume_text: str) -> dict:
     # 1. Подготовка контекста для интервью
     if not vacancy_text: vacancy_text = DEFAULT_JOB_DESCRIPTION
     if not resume_text: resume_text = "Резюме не предоставлено."
+    # Длинные резюме сокращаем до самых релевантных вакансии разделов под бюджеты промптов
+    simulation_resume_text = fit_resume_to_budget(resume_text, vacancy_text, "simulation")
+    analyst_resume_text = fit_resume_to_budget(resume_text, vacancy_text, "analyst")
 
     try:
-        generated_questions = await question_gen_chain.apredict(vacancy_text=vacancy_text)
+        generated_questions = await llm_response_cache.apredict("question_gen", question_gen_chain, vacancy_text=vacancy_text)
     except Exception as e:
         logging.error(f"[API AI Service] Ошибка при подготовке контекста для симуляции: {e}", exc_info=True)
         generated_questions = "Вопросы не сгенерированы из-за ошибки."
@@ -69,13 +75,13 @@ async def run_interview_simulation(vacancy_text: str, resume_text: str) -> dict:
     interviewer_prompt_template = (
         INTERVIEWER_SYSTEM_PROMPT +
         INTERVIEW_PLAN +
-        CANDIDATE_INFO_BLOCK.format(candidate_profile=resume_text) +
+        CANDIDATE_INFO_BLOCK.format(candidate_profile=simulation_resume_text) +
         RECOMMENDED_QUESTIONS_BLOCK.format(generated_questions=generated_questions) +
         "\n\nТекущий диалог:\n{chat_history}\n\nКандидат: {human_input}\nAI-Рекрутер:"
     )
 
     candidate_prompt_template = (
-        CANDIDATE_SYSTEM_PROMPT.format(resume_text=resume_text) +
+        CANDIDATE_SYSTEM_PROMPT.format(resume_text=simulation_resume_text) +
         "\n\nТекущий диалог:\n{chat_history}\n\nAI-Рекрутер: {human_input}\nКандидат:"
     )
 
@@ -138,13 +144,15 @@ async def run_interview_simulation(vacancy_text: str, resume_text: str) -> dict:
     try:
         dialogue_log = "\n".join(chat_history)
         # Веса не передаются в этом сценарии, поэтому используем пустой JSON-объект
-        analysis_json_str = await analyst_chain.apredict(
+        analysis_data = await apredict_json(
+            "analyst",
+            analyst_chain,
+            InterviewAnalysisOutput,
             vacancy_text=vacancy_text,
-            resume_text=resume_text,
+            resume_text=analyst_resume_text,
             dialogue_log=dialogue_log,
             weights_json="{}"
         )
-        analysis_data = json.loads(analysis_json_str)
         logging.info("[API AI Service] Анализ интервью завершен.")
     except Exception as e:
         logging.error(f"[API AI Service] Ошибка при анализе симуляции: {e}", exc_info=True)
@@ -165,9 +173,12 @@ async def run_stress_test_simulation(vacancy_text: str, resume_text: str) -> dic
     # 1. Подготовка контекста для интервью
     if not vacancy_text: vacancy_text = DEFAULT_JOB_DESCRIPTION
     if not resume_text: resume_text = "Резюме не предоставлено."
+    # Длинные резюме сокращаем до самых релевантных вакансии разделов под бюджеты промптов
+    simulation_resume_text = fit_resume_to_budget(resume_text, vacancy_text, "simulation")
+    analyst_resume_text = fit_resume_to_budget(resume_text, vacancy_text, "analyst")
 
     try:
-        generated_questions = await question_gen_chain.apredict(vacancy_text=vacancy_text)
+        generated_questions = await llm_response_cache.apredict("question_gen", question_gen_chain, vacancy_text=vacancy_text)
     except Exception as e:
         logging.error(f"[API AI Service] Ошибка при подготовке контекста для симуляции: {e}", exc_info=True)
         generated_questions = "Вопросы не сгенерированы из-за ошибки."
@@ -177,13 +188,13 @@ async def run_stress_test_simulation(vacancy_text: str, resume_text: str) -> dic
     interviewer_prompt_template = (
         INTERVIEWER_SYSTEM_PROMPT +
         INTERVIEW_PLAN +
-        CANDIDATE_INFO_BLOCK.format(candidate_profile=resume_text) +
+        CANDIDATE_INFO_BLOCK.format(candidate_profile=simulation_resume_text) +
         RECOMMENDED_QUESTIONS_BLOCK.format(generated_questions=generated_questions) +
         "\n\nТекущий диалог:\n{chat_history}\n\nКандидат: {human_input}\nAI-Рекрутер:"
     )
 
     candidate_prompt_template = (
-        STRESS_CANDIDATE_SYSTEM_PROMPT.format(resume_text=resume_text) +
+        STRESS_CANDIDATE_SYSTEM_PROMPT.format(resume_text=simulation_resume_text) +
         "\n\nТекущий диалог:\n{chat_history}\n\nAI-Рекрутер: {human_input}\nКандидат:"
     )
 
@@ -246,13 +257,15 @@ async def run_stress_test_simulation(vacancy_text: str, resume_text: str) -> dic
     try:
         dialogue_log = "\n".join(chat_history)
         # Веса не передаются в этом сценарии, поэтому используем пустой JSON-объект
-        analysis_json_str = await analyst_chain.apredict(
+        analysis_data = await apredict_json(
+            "analyst",
+            analyst_chain,
+            InterviewAnalysisOutput,
             vacancy_text=vacancy_text,
-            resume_text=resume_text,
+            resume_text=analyst_resume_text,
             dialogue_log=dialogue_log,
             weights_json="{}"
         )
-        analysis_data = json.loads(analysis_json_str)
         logging.info("[API AI Service] Анализ интервью завершен.")
     except Exception as e:
         logging.error(f"[API AI Service] Ошибка при анализе симуляции: {e}", exc_info=True)
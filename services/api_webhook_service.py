@@ -6,11 +6,10 @@
 import logging
 import json
 
-from sqlalchemy.ext.asyncio import AsyncSession
-
 # Импорт моделей запросов
 from api.schemas import (
     WebhookRankRequest,
+    WebhookAppendResumesRequest,
     WebhookInterviewRequest,
     WebhookBuildVacancyRequest,
     WebhookAddVacancyRequest,
@@ -18,43 +17,84 @@ from api.schemas import (
 )
 
 # Импорт существующих сервисов
-from services.ai_services import score_and_sort_resumes, build_vacancy_description, question_gen_chain
+from services.ai_services import build_vacancy_description, question_gen_chain
+from services.llm_response_cache import llm_response_cache
+from services.scoring_service import score_and_sort_resumes, stream_ranking_events, sort_scored_resumes
 from services.candidate_service import save_ranking_results
+from services.vacancy_compiler import vacancy_compiler
+from services.dedup import collect_duplicate_groups
+from services.incremental_ranking import rank_new_resumes
 from services.webhook_service import send_webhook # Переиспользуем функцию отправки
 from core.config import settings
+from core.database import AsyncSessionFactory
 
 # Импорт новых AI сервисов для API
 from services.api_ai_services import generate_tags_for_vacancy, run_interview_simulation
 
 
-async def process_ranking_request_v1(request: WebhookRankRequest, db: AsyncSession):
+async def _stream_ranking_to_webhook(request: WebhookRankRequest, resumes_data: list) -> list:
+    """Отправляет на webhook_url каждую оценку и обновления топа по мере готовности."""
+    resumes_meta = [{'id': r['id'], 'filename': r['id'], 'text': r['text']} for r in resumes_data]
+    results = []
+    async for event in stream_ranking_events(
+        request.vacancy_text, resumes_meta, request.weights, top_k=request.top_k, prefilter=request.prefilter, batch=request.batch_scoring
+    ):
+        if event["event"] == "result":
+            results.append(event["result"])
+        await send_webhook(url=str(request.webhook_url), data=event, secret=settings.WEBHOOK_SECRET_TOKEN)
+    return sort_scored_resumes(results)
+
+async def process_ranking_request_v1(request: WebhookRankRequest) -> dict:
     """Фоновая задача для ранжирования резюме с учетом весов."""
     logging.info(f"[API Webhook] Запуск v1 задачи ранжирования для {request.webhook_url}")
     try:
         resumes_data = [{'id': r.filename, 'text': r.content} for r in request.resumes]
+        if request.stream_results:
+            sorted_results = await _stream_ranking_to_webhook(request, resumes_data)
+        else:
+            sorted_results = await score_and_sort_resumes(
+                request.vacancy_text, resumes_data, weights=request.weights, prefilter=request.prefilter, batch=request.batch_scoring
+            )
         
-        # Здесь должна быть логика передачи weights в score_and_sort_resumes
-        # Текущая реализация score_and_sort_resumes не принимает weights, нужно будет это учесть.
-        # Пока вызываем как есть.
-        sorted_results = await score_and_sort_resumes(request.vacancy_text, resumes_data)
-        
-        final_payload = {"results": sorted_results}
+        final_payload = {"results": sorted_results, "duplicate_groups": collect_duplicate_groups(sorted_results, "id")}
         await send_webhook(url=str(request.webhook_url), data=final_payload, secret=settings.WEBHOOK_SECRET_TOKEN)
+        return final_payload
     except Exception as e:
         logging.error(f"[API Webhook] Сбой v1 задачи ранжирования: {e}", exc_info=True)
         await send_webhook(url=str(request.webhook_url), data={"error": str(e)}, secret=settings.WEBHOOK_SECRET_TOKEN)
+        raise
 
-async def process_interview_simulation_request(request: WebhookInterviewRequest):
+async def process_append_resumes_request(request: WebhookAppendResumesRequest) -> dict:
+    """Фоновая задача для инкрементального ранжирования новых резюме вакансии."""
+    logging.info(f"[API Webhook] Запуск задачи добавления резюме к вакансии {request.vacancy_id} для {request.webhook_url}")
+    try:
+        resumes = [{"filename": r.filename, "text": r.content} for r in request.resumes]
+        async with AsyncSessionFactory() as db:
+            result = await rank_new_resumes(
+                db, request.vacancy_id, resumes, prefilter=request.prefilter, batch=request.batch_scoring
+            )
+        if result is None:
+            raise ValueError(f"Вакансия с ID {request.vacancy_id} не найдена.")
+        await send_webhook(url=str(request.webhook_url), data=result, secret=settings.WEBHOOK_SECRET_TOKEN)
+        return result
+    except Exception as e:
+        logging.error(f"[API Webhook] Сбой задачи добавления резюме: {e}", exc_info=True)
+        await send_webhook(url=str(request.webhook_url), data={"error": str(e)}, secret=settings.WEBHOOK_SECRET_TOKEN)
+        raise
+
+async def process_interview_simulation_request(request: WebhookInterviewRequest) -> dict:
     """Фоновая задача для полной симуляции интервью."""
     logging.info(f"[API Webhook] Запуск задачи симуляции интервью для {request.webhook_url}")
     try:
         result = await run_interview_simulation(request.vacancy_text, request.resume_text)
         await send_webhook(url=str(request.webhook_url), data=result, secret=settings.WEBHOOK_SECRET_TOKEN)
+        return result
     except Exception as e:
         logging.error(f"[API Webhook] Сбой задачи симуляции интервью: {e}", exc_info=True)
         await send_webhook(url=str(request.webhook_url), data={"error": str(e)}, secret=settings.WEBHOOK_SECRET_TOKEN)
+        raise
 
-async def process_vacancy_build_request(request: WebhookBuildVacancyRequest):
+async def process_vacancy_build_request(request: WebhookBuildVacancyRequest) -> dict:
     """Фоновая задача для конструктора вакансий."""
     logging.info(f"[API Webhook] Запуск задачи конструктора вакансий для {request.webhook_url}")
     try:
@@ -64,16 +104,18 @@ async def process_vacancy_build_request(request: WebhookBuildVacancyRequest):
         }
         description = await build_vacancy_description(request.base_text, weights_for_service)
         await send_webhook(url=str(request.webhook_url), data={"description": description}, secret=settings.WEBHOOK_SECRET_TOKEN)
+        return {"description": description}
     except Exception as e:
         logging.error(f"[API Webhook] Сбой задачи конструктора вакансий: {e}", exc_info=True)
         await send_webhook(url=str(request.webhook_url), data={"error": str(e)}, secret=settings.WEBHOOK_SECRET_TOKEN)
+        raise
 
-async def process_add_vacancy_request(request: WebhookAddVacancyRequest, db: AsyncSession):
+async def process_add_vacancy_request(request: WebhookAddVacancyRequest) -> dict:
     """Фоновая задача для добавления вакансии и кандидатов в БД."""
     logging.info(f"[API Webhook] Запуск задачи добавления вакансии и кандидатов для {request.webhook_url}")
     try:
         # 1. Генерируем вопросы для вакансии
-        generated_questions = await question_gen_chain.apredict(vacancy_text=request.vacancy_content)
+        generated_questions = await llm_response_cache.apredict("question_gen", question_gen_chain, vacancy_text=request.vacancy_content)
 
         # 2. Формируем "псевдо-результаты" скоринга, чтобы использовать существующий сервис
         scored_resumes = []
@@ -86,33 +128,46 @@ async def process_add_vacancy_request(request: WebhookAddVacancyRequest, db: Asy
                 "keywords": []
             })
 
-        # 3. Сохраняем в БД через существующий сервис
-        saved_candidates = await save_ranking_results(
-            db=db,
-            vacancy_text=request.vacancy_content,
-            generated_questions=generated_questions,
-            weights=None, # Веса не передаются в этом сценарии
-            scored_resumes=scored_resumes
-        )
-        
+        # 3. Сохраняем в БД через существующий сервис в собственной сессии задачи
+        async with AsyncSessionFactory() as db:
+            saved_candidates = await save_ranking_results(
+                db=db,
+                vacancy_text=request.vacancy_content,
+                generated_questions=generated_questions,
+                weights=None, # Веса не передаются в этом сценарии
+                scored_resumes=scored_resumes,
+                # Задача и так фоновая: артефакты готовим здесь же, до отправки вебхука
+                precompile=False
+            )
+
         # Получаем ID вакансии из первого сохраненного кандидата (у всех он будет один)
         vacancy_id = saved_candidates[0].get('vacancy_id') if saved_candidates else None
+        if vacancy_id is None and saved_candidates:
+            raise RuntimeError("Не удалось сохранить вакансию и кандидатов в БД.")
+
+        # 4. Готовим артефакты вакансии для собеседований
+        artifacts = await vacancy_compiler.compile(vacancy_id) if vacancy_id is not None else None
 
         final_payload = {
             "message": "Вакансия и кандидаты успешно добавлены",
-            "vacancy_id": vacancy_id
+            "vacancy_id": vacancy_id,
+            "tags": artifacts.tags if artifacts else None
         }
         await send_webhook(url=str(request.webhook_url), data=final_payload, secret=settings.WEBHOOK_SECRET_TOKEN)
+        return final_payload
     except Exception as e:
         logging.error(f"[API Webhook] Сбой задачи добавления вакансии: {e}", exc_info=True)
         await send_webhook(url=str(request.webhook_url), data={"error": str(e)}, secret=settings.WEBHOOK_SECRET_TOKEN)
+        raise
 
-async def process_tag_generation_request(request: WebhookGenerateTagsRequest):
+async def process_tag_generation_request(request: WebhookGenerateTagsRequest) -> dict:
     """Фоновая задача для генерации тегов."""
     logging.info(f"[API Webhook] Запуск задачи генерации тегов для {request.webhook_url}")
     try:
         tags = await generate_tags_for_vacancy(request.vacancy_text)
         await send_webhook(url=str(request.webhook_url), data={"tags": tags}, secret=settings.WEBHOOK_SECRET_TOKEN)
+        return {"tags": tags}
     except Exception as e:
         logging.error(f"[API Webhook] Сбой задачи генерации тегов: {e}", exc_info=True)
         await send_webhook(url=str(request.webhook_url), data={"error": str(e)}, secret=settings.WEBHOOK_SECRET_TOKEN)
+        raise
@@ -0,0 +1,306 @@
+"""
+Прием резюме ZIP-архивом.
+
+Архив читается из буфера загрузки запись за записью, без распаковки на диск:
+каждая запись распаковывается в память (в отдельном потоке) и сразу
+отправляется в пул парсинга по расширению, так что парсинг идет параллельно
+с чтением следующих записей. Число записей в обработке ограничено, поэтому
+пиковая память не зависит от размера архива.
+
+Защита от zip-бомб: ограничены число записей (`ARCHIVE_MAX_ENTRIES`),
+степень сжатия записи (`ARCHIVE_MAX_COMPRESSION_RATIO`), размер записи
+(`PARSER_MAX_FILE_MB`) и суммарный распакованный объем
+(`ARCHIVE_MAX_UNCOMPRESSED_MB`). Размеры считаются по фактически
+распакованным байтам, а не по заголовкам архива.
+
+Резюме отправляются на оценку волнами по мере извлечения. Волны оцениваются
+параллельно (общий лимит задает адаптивный лимит LLM-провайдера), поэтому
+медленное резюме одной волны не задерживает следующие. Почти дубликаты
+ищутся по всему архиву: дубликат получает оценку первого резюме группы.
+
+Загрузка копируется во временный файл, которым владеет поток ответа:
+буфер формы закрывается вместе с запросом раньше, чем поток дочитает архив.
+"""
+
+import asyncio
+import logging
+import tempfile
+import time
+import zipfile
+from pathlib import PurePosixPath
+from typing import Any, AsyncIterator, BinaryIO, Dict, List, Optional, Tuple
+
+from core.config import settings
+from services.dedup import SimHashIndex, simhash
+from services.file_processing import parse_document_bytes
+from services.scoring_service import LiveTopK, build_error_result, iter_scored_resumes
+
+# Размер блока при распаковке записи архива и копировании загрузки
+ENTRY_CHUNK_SIZE = 256 * 1024
+
+
+class ArchiveError(Exception):
+    """Архив поврежден или нарушает ограничения на размер."""
+
+
+class EntryTooLargeError(ValueError):
+    """Запись архива превышает допустимый размер файла; остальные записи обрабатываются."""
+
+
+class ArchiveTooLargeError(ArchiveError):
+    """Загруженный архив превышает `ARCHIVE_MAX_UPLOAD_MB`."""
+
+
+async def copy_archive_upload(upload: Any) -> BinaryIO:
+    """
+    Копирует загруженный архив во временный файл, считая байты по ходу копирования.
+
+    Args:
+        upload: UploadFile (или объект с асинхронным `read(size)`).
+
+    Returns:
+        Временный файл, позиционированный на начало. Закрыть его должен вызывающий код.
+
+    Raises:
+        ArchiveTooLargeError: если архив больше `ARCHIVE_MAX_UPLOAD_MB`.
+    """
+    max_bytes = settings.ARCHIVE_MAX_UPLOAD_MB * 1024 * 1024
+    copy = tempfile.TemporaryFile()
+    size = 0
+    try:
+        while chunk := await upload.read(ENTRY_CHUNK_SIZE):
+            size += len(chunk)
+            if size > max_bytes:
+                raise ArchiveTooLargeError(f"Архив превышает допустимый размер {settings.ARCHIVE_MAX_UPLOAD_MB} МБ.")
+            await asyncio.to_thread(copy.write, chunk)
+        copy.seek(0)
+    except BaseException:
+        copy.close()
+        raise
+    return copy
+
+
+def _is_service_entry(info: zipfile.ZipInfo) -> bool:
+    """Каталоги и служебные файлы архиваторов (macOS, скрытые файлы) не являются резюме."""
+    path = PurePosixPath(info.filename)
+    return info.is_dir() or "__MACOSX" in path.parts or path.name.startswith(".")
+
+
+def _read_entry(archive: zipfile.ZipFile, info: zipfile.ZipInfo, max_bytes: int) -> bytes:
+    """Распаковывает запись в память, прерываясь при превышении max_bytes."""
+    chunks, size = [], 0
+    with archive.open(info) as entry:
+        while chunk := entry.read(ENTRY_CHUNK_SIZE):
+            size += len(chunk)
+            if size > max_bytes:
+                raise EntryTooLargeError(f"Файл превышает допустимый размер {max_bytes // (1024 * 1024)} МБ.")
+            chunks.append(chunk)
+    return b"".join(chunks)
+
+
+async def iter_archive_entries(file: BinaryIO) -> AsyncIterator[Tuple[str, Optional[bytes], Optional[str]]]:
+    """
+    Последовательно распаковывает записи ZIP-архива в память.
+
+    Yields:
+        Тройки (имя записи, содержимое, ошибка). Для записи, нарушившей
+        ограничения, содержимое None, а ошибка описывает причину.
+
+    Raises:
+        ArchiveError: если архив поврежден или превышены ограничения на архив целиком.
+    """
+    try:
+        archive = await asyncio.to_thread(zipfile.ZipFile, file)
+    except zipfile.BadZipFile as e:
+        raise ArchiveError(f"Файл не является корректным ZIP-архивом: {e}")
+
+    max_entry_bytes = settings.PARSER_MAX_FILE_MB * 1024 * 1024
+    max_total_bytes = settings.ARCHIVE_MAX_UNCOMPRESSED_MB * 1024 * 1024
+    total_bytes, entries = 0, 0
+    with archive:
+        for info in archive.infolist():
+            if _is_service_entry(info):
+                continue
+            entries += 1
+            if entries > settings.ARCHIVE_MAX_ENTRIES:
+                raise ArchiveError(f"Архив содержит больше {settings.ARCHIVE_MAX_ENTRIES} файлов.")
+            if info.compress_size and info.file_size / info.compress_size > settings.ARCHIVE_MAX_COMPRESSION_RATIO:
+                yield info.filename, None, "Подозрительно высокая степень сжатия файла."
+                continue
+            try:
+                content = await asyncio.to_thread(_read_entry, archive, info, max_entry_bytes)
+            except EntryTooLargeError as e:
+                # Слишком большой файл пропускаем: в суммарный объем он не входит
+                yield info.filename, None, str(e)
+                continue
+            except (zipfile.BadZipFile, RuntimeError, NotImplementedError, OSError) as e:
+                # Поврежденная или зашифрованная запись не мешает обработать остальные
+                yield info.filename, None, f"Не удалось распаковать файл: {e}"
+                continue
+            total_bytes += len(content)
+            if total_bytes > max_total_bytes:
+                raise ArchiveError(f"Суммарный объем файлов архива превышает {settings.ARCHIVE_MAX_UNCOMPRESSED_MB} МБ.")
+            yield info.filename, content, None
+
+
+async def stream_archive_ranking_events(
+    vacancy_text: str,
+    file: BinaryIO,
+    weights: Optional[Dict[str, Any]] = None,
+    top_k: Optional[int] = None,
+    prefilter: Optional[bool] = None,
+    batch: Optional[bool] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Извлекает резюме из ZIP-архива и оценивает их по мере извлечения.
+
+    События:
+        - {"event": "extracted", "filename", "entry", "chars" | "error"} — обработана запись архива с номером entry.
+        - {"event": "result", "scored", "result"} — оценка резюме. Результат содержит
+          'filename' и 'resume_text'; записи с ошибкой извлечения приходят с оценкой -1.
+        - {"event": "top_k", "scored", "top"} — обновленный топ-K (не чаще `RANKING_STREAM_TOPK_INTERVAL`).
+        - {"event": "error", "detail"} — архив поврежден или превысил ограничения;
+          уже извлеченные резюме все равно оцениваются.
+
+    Если включен лексический предфильтр, оценка начинается после извлечения
+    всего архива: предфильтру нужен весь пул резюме.
+    """
+    use_prefilter = settings.PREFILTER_ENABLED if prefilter is None else prefilter
+    events: asyncio.Queue = asyncio.Queue()
+    ready: asyncio.Queue = asyncio.Queue()
+    # Ограничиваем число распакованных, но еще не разобранных записей в памяти
+    in_flight = asyncio.Semaphore(max(1, settings.PARSER_WORKERS * 2))
+
+    async def parse_entry(filename: str, content: bytes, entry: int) -> None:
+        try:
+            text = await parse_document_bytes(filename, content)
+            error = None if text else "Текст из файла не был извлечен."
+        except Exception as e:
+            text, error = None, str(e) or type(e).__name__
+        finally:
+            in_flight.release()
+        await report_entry(filename, text, error, entry)
+
+    async def report_entry(filename: str, text: Optional[str], error: Optional[str], entry: int) -> None:
+        if error:
+            logging.error(f"[Архив] Сбой: {filename}. Причина: {error}")
+            await events.put({"event": "extracted", "filename": filename, "entry": entry, "error": error})
+            result = build_error_result(f"Ошибка обработки файла: {error}")
+            result.update({"filename": filename, "resume_text": "Текст не был извлечен."})
+            await events.put({"event": "result", "result": result})
+        else:
+            await events.put({"event": "extracted", "filename": filename, "entry": entry, "chars": len(text)})
+            await ready.put({"filename": filename, "text": text})
+
+    async def extract() -> None:
+        tasks: List[asyncio.Task] = []
+        entries = 0
+        try:
+            async for filename, content, error in iter_archive_entries(file):
+                entries += 1
+                if error:
+                    await report_entry(filename, None, error, entries)
+                    continue
+                await in_flight.acquire()
+                tasks.append(asyncio.create_task(parse_entry(filename, content, entries)))
+        except ArchiveError as e:
+            logging.error(f"[Архив] Обработка архива прервана: {e}")
+            await events.put({"event": "error", "detail": str(e)})
+        finally:
+            await asyncio.gather(*tasks, return_exceptions=True)
+            logging.info(f"[Архив] Извлечено записей: {entries}.")
+            await ready.put(None)
+
+    async def score() -> None:
+        archive_index = SimHashIndex(settings.DEDUP_MAX_HAMMING) if settings.DEDUP_ENABLED else None
+        items: List[Dict[str, Any]] = []
+        scored: Dict[int, Dict[str, Any]] = {}
+        # Почти дубликаты, ждущие оценки первого резюме группы: {позиция первого: [позиции дубликатов]}
+        waiting: Dict[int, List[int]] = {}
+        waves: List[asyncio.Task] = []
+
+        async def emit(position: int, score_data: Dict[str, Any]) -> None:
+            scored[position] = score_data
+            duplicates = waiting.pop(position, [])
+            item = items[position]
+            await events.put({"event": "result", "result": {"filename": item["filename"], **score_data, "resume_text": item["text"]}})
+            for duplicate in duplicates:
+                await emit(duplicate, {**score_data, "duplicate_of": item["filename"]})
+
+        async def admit(item: Dict[str, Any]) -> Optional[int]:
+            """Возвращает позицию резюме, если его нужно оценивать; дубликаты получат оценку первого резюме группы."""
+            position = len(items)
+            items.append(item)
+            signature = simhash(item["text"]) if archive_index is not None else None
+            if signature is None:
+                return position
+            found = archive_index.find(signature)
+            if not found:
+                archive_index.add(position, signature)
+                return position
+            representative = found[0][0]
+            if representative in scored:
+                await emit(position, {**scored[representative], "duplicate_of": items[representative]["filename"]})
+            else:
+                waiting.setdefault(representative, []).append(position)
+            return None
+
+        async def score_wave(positions: List[int]) -> None:
+            logging.info(f"[Архив] Оценка волны из {len(positions)} резюме.")
+            async for index, score_data in iter_scored_resumes(
+                vacancy_text, [items[position] for position in positions], weights, prefilter=prefilter, batch=batch
+            ):
+                await emit(positions[index], score_data)
+
+        try:
+            finished = False
+            while not finished:
+                wave = [await ready.get()]
+                while not ready.empty():
+                    wave.append(ready.get_nowait())
+                if wave[-1] is None:
+                    finished = True
+                    wave.pop()
+                if use_prefilter and not finished:
+                    # Копим резюме до конца архива
+                    while (item := await ready.get()) is not None:
+                        wave.append(item)
+                    finished = True
+                positions = [position for item in wave if (position := await admit(item)) is not None]
+                if positions:
+                    waves.append(asyncio.create_task(score_wave(positions)))
+            await asyncio.gather(*waves)
+        finally:
+            for task in waves:
+                task.cancel()
+
+    async def run() -> None:
+        try:
+            await asyncio.gather(extract(), score())
+        finally:
+            await events.put(None)
+
+    runner = asyncio.create_task(run())
+    tracker = LiveTopK(top_k or settings.RANKING_STREAM_TOP_K)
+    scored, pending_top_update, last_top_emit = 0, False, 0.0
+    try:
+        while (event := await events.get()) is not None:
+            if event["event"] == "result":
+                scored += 1
+                event["scored"] = scored
+                pending_top_update = tracker.add(
+                    {k: v for k, v in event["result"].items() if k != "resume_text"}
+                ) or pending_top_update
+            yield event
+
+            now = time.monotonic()
+            if pending_top_update and now - last_top_emit >= settings.RANKING_STREAM_TOPK_INTERVAL:
+                pending_top_update, last_top_emit = False, now
+                yield {"event": "top_k", "scored": scored, "top": tracker.snapshot()}
+        if pending_top_update:
+            yield {"event": "top_k", "scored": scored, "top": tracker.snapshot()}
+        # Пробрасываем исключение фоновой обработки, если оно было
+        await runner
+    finally:
+        if not runner.done():
+            runner.cancel()
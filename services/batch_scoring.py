@@ -0,0 +1,100 @@
+"""
+Вспомогательные функции пакетного скоринга резюме.
+
+В пакетном режиме несколько резюме упаковываются в один запрос к LLM, чтобы
+не повторять текст вакансии и инструкции промпта для каждого резюме. Модуль
+отвечает за оценку размера промпта, упаковку резюме в пакеты в пределах
+бюджета токенов и разбор ответа модели.
+"""
+
+from typing import Any, Dict, List, Sequence, Tuple
+
+# Грубая оценка: в среднем около трех символов смешанного русско-английского текста на токен
+CHARS_PER_TOKEN = 3
+
+
+def estimate_tokens(text: str) -> int:
+    """Приблизительно оценивает число токенов в тексте."""
+    return len(text or "") // CHARS_PER_TOKEN + 1
+
+
+def make_label(index: int) -> str:
+    """Возвращает короткий идентификатор резюме внутри пакета."""
+    return f"R{index + 1}"
+
+
+def format_resumes_block(items: Sequence[Tuple[int, str]]) -> str:
+    """Формирует блок резюме для промпта. items — пары (индекс, текст)."""
+    return "\n\n".join(
+        f"=== РЕЗЮМЕ {make_label(index)} ===\n{text}" for index, text in items
+    )
+
+
+def pack_batches(
+    items: Sequence[Tuple[int, str]],
+    overhead_tokens: int,
+    budget_tokens: int,
+    max_batch_size: int
+) -> List[List[Tuple[int, str]]]:
+    """
+    Жадно упаковывает резюме в пакеты, не превышая бюджет токенов.
+
+    Args:
+        items: Пары (индекс резюме, текст) в порядке обработки.
+        overhead_tokens: Размер общей части промпта (инструкции, вакансия, веса).
+        budget_tokens: Максимальный размер промпта одного запроса.
+        max_batch_size: Максимальное число резюме в пакете.
+
+    Returns:
+        Список пакетов. Резюме, которое само не помещается в бюджет, идет отдельным пакетом.
+    """
+    batches: List[List[Tuple[int, str]]] = []
+    current: List[Tuple[int, str]] = []
+    current_tokens = overhead_tokens
+
+    for item in items:
+        item_tokens = estimate_tokens(item[1])
+        if current and (current_tokens + item_tokens > budget_tokens or len(current) >= max_batch_size):
+            batches.append(current)
+            current, current_tokens = [], overhead_tokens
+        current.append(item)
+        current_tokens += item_tokens
+
+    if current:
+        batches.append(current)
+    return batches
+
+
+def parse_batch_response(data: Any, expected_labels: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Разбирает ответ модели на пакетный промпт, уже прочитанный как JSON
+    (оборванный ответ достраивается, см. services/structured_output.py).
+
+    Returns:
+        Словарь {идентификатор резюме: результат} только для корректных записей
+        с ожидаемыми идентификаторами. Отсутствующие записи вызывающий код
+        должен переоценить.
+
+    Raises:
+        ValueError: если ответ не имеет ожидаемой структуры.
+    """
+    if isinstance(data, dict):
+        data = data.get("results")
+    if not isinstance(data, list):
+        raise ValueError("Ответ пакетного скоринга не содержит списка 'results'.")
+
+    expected = set(expected_labels)
+    parsed: Dict[str, Dict[str, Any]] = {}
+    for entry in data:
+        if not isinstance(entry, dict):
+            continue
+        label = str(entry.get("id", "")).strip()
+        if label not in expected or label in parsed:
+            continue
+        if not isinstance(entry.get("score"), (int, float)):
+            continue
+        result = {key: value for key, value in entry.items() if key != "id"}
+        result.setdefault("summary", "")
+        result.setdefault("keywords", [])
+        parsed[label] = result
+    return parsed
@@ -6,19 +6,55 @@ import logging
 from typing import List, Dict, Any, Optional
 
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
 
 from core.schemas import Vacancy, Candidate, Interview
+from services.vector_index import index_vacancy, index_candidates
+from services.weighted_scoring import compute_weighted_scores
+from services.dedup import simhash, format_simhash, parse_simhash, stored_resume_index
+from services.vacancy_compiler import vacancy_compiler
+
+def _add_scored_candidates(
+    db: AsyncSession,
+    vacancy_id: int,
+    scored_resumes: List[Dict[str, Any]]
+) -> List[tuple]:
+    """Добавляет в сессию кандидатов для всех успешно отскоренных резюме."""
+    candidates_to_create = []
+    for resume_data in scored_resumes:
+        if resume_data.get("score", -1) != -1:
+            candidate = Candidate(
+                filename=resume_data.get("filename", "unknown"),
+                resume_text=resume_data.get("resume_text", ""),
+                initial_score=resume_data.get("score"),
+                subscores_json=resume_data.get("subscores"),
+                simhash=format_simhash(simhash(resume_data.get("resume_text", ""))),
+                status="new",
+                vacancy_id=vacancy_id
+            )
+            candidates_to_create.append((candidate, resume_data))
+            db.add(candidate)
+    logging.info(f"{len(candidates_to_create)} кандидатов добавлено в сессию.")
+    return candidates_to_create
+
+async def _index_saved_candidates(candidates: List[tuple]) -> None:
+    """Дописывает сохраненных кандидатов в векторный индекс и индекс дубликатов."""
+    await index_candidates([(candidate_id, resume_text) for candidate_id, resume_text, _ in candidates])
+    for candidate_id, _, signature in candidates:
+        stored_resume_index.add(candidate_id, signature)
 
 async def save_ranking_results(
     db: AsyncSession, 
     vacancy_text: str, 
     generated_questions: Optional[str], # Добавлено
     weights: Optional[Dict[str, Any]], # Добавлено
-    scored_resumes: List[Dict[str, Any]]
+    scored_resumes: List[Dict[str, Any]],
+    precompile: bool = True
 ) -> List[Dict[str, Any]]:
     """
     Атомарно сохраняет вакансию и всех успешно отскоренных кандидатов в БД.
-    Возвращает список кандидатов, обогащенный ID из базы данных.
+    Возвращает список кандидатов, обогащенный ID кандидата и ID вакансии из базы данных.
+    Если `precompile`, после сохранения в фоне готовятся артефакты вакансии для собеседований.
     """
     try:
         # 1. Создаем вакансию
@@ -34,40 +70,118 @@ async def save_ranking_results(
         logging.info(f"Вакансия с ID {new_vacancy.id} добавлена в сессию.")
 
         # 2. Создаем кандидатов и добавляем их в сессию
-        candidates_to_create = []
-        for resume_data in scored_resumes:
-            if resume_data.get("score", -1) != -1:
-                candidate = Candidate(
-                    filename=resume_data.get("filename", "unknown"),
-                    resume_text=resume_data.get("resume_text", ""),
-                    initial_score=resume_data.get("score"),
-                    status="new",
-                    vacancy_id=new_vacancy.id
-                )
-                candidates_to_create.append((candidate, resume_data))
-                db.add(candidate)
-        
-        logging.info(f"{len(candidates_to_create)} кандидатов добавлено в сессию.")
+        candidates_to_create = _add_scored_candidates(db, new_vacancy.id, scored_resumes)
         await db.flush() # Получаем ID для всех кандидатов
 
         # 3. Обогащаем исходные данные ID из БД
         for candidate, resume_data in candidates_to_create:
             resume_data['id'] = candidate.id
+        # После коммита атрибуты объектов истекают, поэтому данные для индекса собираем заранее
+        vacancy_id = new_vacancy.id
+        for resume_data in scored_resumes:
+            resume_data['vacancy_id'] = vacancy_id
+        saved = [
+            (candidate.id, candidate.resume_text, parse_simhash(candidate.simhash))
+            for candidate, _ in candidates_to_create
+        ]
 
         # 4. Коммитим транзакцию
         await db.commit()
         logging.info("Транзакция по сохранению вакансии и кандидатов успешно завершена.")
-        
+
+        # 5. Дописываем новые записи в векторный индекс
+        await index_vacancy(vacancy_id, vacancy_text)
+        await _index_saved_candidates(saved)
+
+        # 6. Готовим выжимку, вопросы, теги и первую реплику интервьюера, не задерживая ответ
+        if precompile:
+            vacancy_compiler.schedule(vacancy_id)
+
         return scored_resumes
 
     except Exception as e:
         logging.error(f"Ошибка при сохранении результатов ранжирования в БД: {e}", exc_info=True)
         await db.rollback()
         # В случае ошибки возвращаем исходные данные без ID
+        for resume in scored_resumes:
+            resume['id'] = None
+            resume['vacancy_id'] = None
+        return scored_resumes
+
+async def append_candidates(
+    db: AsyncSession,
+    vacancy_id: int,
+    scored_resumes: List[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """
+    Атомарно добавляет успешно отскоренных кандидатов к существующей вакансии.
+    Возвращает список кандидатов, обогащенный ID из базы данных.
+    """
+    try:
+        candidates_to_create = _add_scored_candidates(db, vacancy_id, scored_resumes)
+        await db.flush()
+        for candidate, resume_data in candidates_to_create:
+            resume_data['id'] = candidate.id
+        saved = [
+            (candidate.id, candidate.resume_text, parse_simhash(candidate.simhash))
+            for candidate, _ in candidates_to_create
+        ]
+        await db.commit()
+        logging.info(f"К вакансии ID {vacancy_id} добавлено кандидатов: {len(saved)}.")
+        await _index_saved_candidates(saved)
+        return scored_resumes
+    except Exception as e:
+        logging.error(f"Ошибка при добавлении кандидатов к вакансии ID {vacancy_id}: {e}", exc_info=True)
+        await db.rollback()
         for resume in scored_resumes:
             resume['id'] = None
         return scored_resumes
 
+async def rerank_vacancy_candidates(
+    db: AsyncSession,
+    vacancy_id: int,
+    weights: Optional[Dict[str, Any]] = None,
+    save: bool = False
+) -> Optional[Dict[str, Any]]:
+    """
+    Переранжирует сохраненных кандидатов вакансии по новым весам без обращения к LLM.
+    Итог пересчитывается по подоценкам критериев; кандидаты без подоценок
+    (оцененные старой версией промпта или отсеянные предфильтром) сохраняют прежнюю оценку.
+
+    Returns:
+        Словарь с весами и отсортированным списком кандидатов или None, если вакансия не найдена.
+    """
+    vacancy = await db.get(Vacancy, vacancy_id)
+    if not vacancy:
+        return None
+    weights = weights or vacancy.weights_json or {}
+
+    result = await db.execute(select(Candidate).where(Candidate.vacancy_id == vacancy_id))
+    candidates = result.scalars().all()
+    new_scores = compute_weighted_scores([candidate.subscores_json for candidate in candidates], weights)
+
+    ranking = []
+    for candidate, new_score in zip(candidates, new_scores):
+        ranking.append({
+            "id": candidate.id,
+            "filename": candidate.filename,
+            "status": candidate.status,
+            "previous_score": candidate.initial_score,
+            "score": new_score if new_score is not None else candidate.initial_score,
+            "subscores": candidate.subscores_json,
+            "reranked": new_score is not None,
+        })
+        if save and new_score is not None:
+            candidate.initial_score = new_score
+
+    if save:
+        vacancy.weights_json = weights
+        await db.commit()
+        logging.info(f"Веса вакансии ID {vacancy_id} и оценки {sum(1 for item in ranking if item['reranked'])} кандидатов обновлены.")
+
+    ranking.sort(key=lambda item: item["score"] if item["score"] is not None else -1, reverse=True)
+    return {"vacancy_id": vacancy_id, "weights": weights, "ranking": ranking}
+
 async def save_interview_result(
     db: AsyncSession, 
     candidate_id: int, 
@@ -0,0 +1,239 @@
+"""
+Поиск почти дубликатов резюме на основе SimHash.
+
+Для каждого текста строится 64-битная сигнатура SimHash по шинглам из трех
+нормализованных слов. Тексты, сигнатуры которых различаются не более чем на
+`DEDUP_MAX_HAMMING` бит, считаются почти дубликатами (одно и то же резюме,
+пришедшее повторно или с разных площадок с мелкими правками).
+
+Для быстрого поиска сигнатура делится на `DEDUP_MAX_HAMMING + 1` полос (при
+пороге 3 — 4 полосы по 16 бит): если сигнатуры различаются не больше чем
+в d битах, хотя бы одна из d + 1 полос у них совпадает точно. Чем выше порог,
+тем уже полосы и тем больше кандидатов проверяется.
+"""
+
+import hashlib
+import logging
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import select
+
+from core.database import AsyncSessionFactory
+from core.schemas import Candidate, Vacancy
+from services.lexical_prefilter import tokenize
+from services.score_cache import normalize_text
+
+SIMHASH_BITS = 64
+SHINGLE_SIZE = 3
+
+
+def _feature_hash(feature: str) -> int:
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def simhash(text: str) -> Optional[int]:
+    """Возвращает 64-битную сигнатуру SimHash текста или None для пустого текста."""
+    tokens = tokenize(text)
+    if not tokens:
+        return None
+    if len(tokens) < SHINGLE_SIZE:
+        shingles = Counter(tokens)
+    else:
+        shingles = Counter(" ".join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1))
+
+    vector = [0] * SIMHASH_BITS
+    for shingle, weight in shingles.items():
+        digest = _feature_hash(shingle)
+        for bit in range(SIMHASH_BITS):
+            vector[bit] += weight if (digest >> bit) & 1 else -weight
+    return sum(1 << bit for bit, value in enumerate(vector) if value > 0)
+
+
+def format_simhash(signature: Optional[int]) -> Optional[str]:
+    """Представляет сигнатуру строкой для хранения в БД."""
+    return None if signature is None else f"{signature:016x}"
+
+
+def parse_simhash(value: Optional[str]) -> Optional[int]:
+    return int(value, 16) if value else None
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class SimHashIndex:
+    """Индекс сигнатур с поиском почти дубликатов по совпадающим полосам."""
+
+    def __init__(self, max_distance: int):
+        self.max_distance = max(0, max_distance)
+        # d + 1 полос почти равной ширины (не больше числа бит сигнатуры)
+        band_count = min(self.max_distance + 1, SIMHASH_BITS)
+        bounds = [SIMHASH_BITS * band // band_count for band in range(band_count + 1)]
+        self._band_slices: List[Tuple[int, int]] = [
+            (start, (1 << (stop - start)) - 1) for start, stop in zip(bounds, bounds[1:])
+        ]
+        self._bands: List[Dict[int, List[Tuple[Any, int]]]] = [defaultdict(list) for _ in range(band_count)]
+
+    def _band_keys(self, signature: int) -> List[int]:
+        return [(signature >> shift) & mask for shift, mask in self._band_slices]
+
+    def add(self, key: Any, signature: int) -> None:
+        for band, band_key in enumerate(self._band_keys(signature)):
+            self._bands[band][band_key].append((key, signature))
+
+    def find(self, signature: int) -> List[Tuple[Any, int]]:
+        """Возвращает пары (ключ, расстояние) для всех почти дубликатов, ближайшие первыми."""
+        found: Dict[Any, int] = {}
+        for band, band_key in enumerate(self._band_keys(signature)):
+            for key, candidate in self._bands[band].get(band_key, ()):
+                if key in found:
+                    continue
+                distance = hamming_distance(signature, candidate)
+                if distance <= self.max_distance:
+                    found[key] = distance
+        return sorted(found.items(), key=lambda item: item[1])
+
+    def clear(self) -> None:
+        for band in self._bands:
+            band.clear()
+
+
+def find_batch_duplicates(texts: Sequence[str], max_distance: int) -> Dict[int, int]:
+    """
+    Находит почти дубликаты внутри пакета.
+
+    Returns:
+        Словарь {индекс дубликата: индекс первого резюме группы}. Первое резюме
+        группы в словарь не входит — оно оценивается как обычно.
+    """
+    index = SimHashIndex(max_distance)
+    duplicate_of: Dict[int, int] = {}
+    for i, text in enumerate(texts):
+        signature = simhash(text)
+        if signature is None:
+            continue
+        matches = index.find(signature)
+        if matches:
+            duplicate_of[i] = matches[0][0]
+        else:
+            index.add(i, signature)
+    return duplicate_of
+
+
+class StoredResumeIndex:
+    """Индекс сигнатур резюме сохраненных кандидатов. Загружается из БД при первом обращении."""
+
+    def __init__(self):
+        self._index: Optional[SimHashIndex] = None
+
+    async def _ensure_loaded(self, max_distance: int) -> SimHashIndex:
+        if self._index is not None and self._index.max_distance == max_distance:
+            return self._index
+        index = SimHashIndex(max_distance)
+        async with AsyncSessionFactory() as session:
+            rows = (await session.execute(select(Candidate.id, Candidate.simhash, Candidate.resume_text))).all()
+        for row in rows:
+            # Для кандидатов, сохраненных до появления сигнатур, считаем ее на лету
+            signature = parse_simhash(row.simhash) if row.simhash else simhash(row.resume_text or "")
+            if signature is not None:
+                index.add(row.id, signature)
+        logging.info(f"[Dedup] Индекс сигнатур загружен: {len(rows)} кандидатов.")
+        self._index = index
+        return index
+
+    def add(self, candidate_id: int, signature: Optional[int]) -> None:
+        if self._index is not None and signature is not None:
+            self._index.add(candidate_id, signature)
+
+    def reset(self) -> None:
+        self._index = None
+
+    async def find_stored_duplicates(
+        self,
+        vacancy_text: str,
+        texts: Dict[int, str],
+        max_distance: int
+    ) -> Dict[int, List[Dict[str, Any]]]:
+        """
+        Ищет среди сохраненных кандидатов той же вакансии (по тексту) почти дубликаты резюме.
+
+        Сохраненная `initial_score` кандидата для переиспользования не годится: она могла
+        быть получена с другими критериями и весами, другим промптом, лексическим
+        предфильтром или пересчитана при переранжировании. Поэтому возвращаются тексты
+        резюме найденных кандидатов, а оценку вызывающий код берет из кэша скоринга
+        по ключу с текущими критериями, моделью и версией промпта.
+
+        Args:
+            vacancy_text: Текст вакансии; ищутся только кандидаты той же вакансии.
+            texts: Словарь {индекс резюме: текст}.
+            max_distance: Максимальное расстояние Хэмминга между сигнатурами.
+
+        Returns:
+            Словарь {индекс резюме: [{"candidate_id", "resume_text", "distance"}, ...]},
+            ближайшие совпадения первыми.
+        """
+        index = await self._ensure_loaded(max_distance)
+        matches: Dict[int, List[Tuple[int, int]]] = {}
+        for i, text in texts.items():
+            signature = simhash(text)
+            if signature is not None:
+                found = index.find(signature)
+                if found:
+                    matches[i] = found
+        if not matches:
+            return {}
+
+        candidate_ids = {candidate_id for found in matches.values() for candidate_id, _ in found}
+        async with AsyncSessionFactory() as session:
+            rows = (await session.execute(
+                select(Candidate.id, Candidate.resume_text, Vacancy.text)
+                .join(Vacancy, Candidate.vacancy_id == Vacancy.id)
+                .where(Candidate.id.in_(candidate_ids))
+            )).all()
+        normalized_vacancy = normalize_text(vacancy_text)
+        stored = {
+            row.id: row.resume_text for row in rows
+            if row.resume_text and normalize_text(row.text) == normalized_vacancy
+        }
+
+        result: Dict[int, List[Dict[str, Any]]] = {}
+        for i, found in matches.items():
+            duplicates = [
+                {"candidate_id": candidate_id, "resume_text": stored[candidate_id], "distance": distance}
+                for candidate_id, distance in found
+                if candidate_id in stored
+            ]
+            if duplicates:
+                result[i] = duplicates
+        return result
+
+
+def collect_duplicate_groups(results: Sequence[Dict[str, Any]], key: str) -> List[Dict[str, Any]]:
+    """
+    Собирает группы дубликатов из результатов скоринга для отчета.
+
+    Args:
+        results: Результаты скоринга с полями `duplicate_of` / `duplicate_of_candidate`.
+        key: Поле результата, идентифицирующее резюме (например, 'filename' или 'id').
+    """
+    groups: Dict[Tuple[str, Any], Dict[str, Any]] = {}
+    for result in results:
+        if result.get("duplicate_of") is not None:
+            group = groups.setdefault(
+                ("batch", result["duplicate_of"]),
+                {"representative": result["duplicate_of"], "duplicates": []}
+            )
+            group["duplicates"].append(result.get(key))
+        elif result.get("duplicate_of_candidate") is not None:
+            group = groups.setdefault(
+                ("stored", result["duplicate_of_candidate"]),
+                {"stored_candidate_id": result["duplicate_of_candidate"], "duplicates": []}
+            )
+            group["duplicates"].append(result.get(key))
+    return list(groups.values())
+
+
+# Индекс сигнатур сохраненных кандидатов для всего приложения
+stored_resume_index = StoredResumeIndex()
@@ -0,0 +1,119 @@
+"""
+Синхронные парсеры документов.
+
+Модуль намеренно не зависит от FastAPI и остального приложения: его функции
+выполняются в дочерних процессах пула парсинга (`services/parsing_pool.py`),
+которые импортируют только этот модуль.
+"""
+
+import io
+import logging
+import time
+from typing import Any, Dict, Optional
+
+# --- Библиотеки для парсинга ---
+import docx
+import pypdf
+from striprtf.striprtf import rtf_to_text
+
+# Версия парсеров: входит в ключ кэша извлеченного текста (services/text_cache.py).
+# Увеличивайте при любом изменении, влияющем на извлекаемый текст.
+PARSER_VERSION = "3"
+# Разделитель страниц PDF в извлеченном тексте (по нему нормализатор находит колонтитулы)
+PAGE_BREAK = "\f"
+
+
+def parse_pdf_pages(
+    content: bytes,
+    start: int = 0,
+    stop: Optional[int] = None,
+    char_budget: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Извлекает текст страниц PDF из диапазона [start, stop), каждую страницу — один раз.
+
+    Args:
+        content: Содержимое PDF файла.
+        start: Индекс первой страницы.
+        stop: Индекс страницы, на которой остановиться (None — до конца документа).
+        char_budget: Прекратить разбор, как только собрано столько символов (None — без ограничения).
+
+    Returns:
+        Словарь с общим числом страниц документа (`page_count`) и списком
+        `pages` из кортежей (индекс страницы, текст, время разбора в секундах).
+    """
+    reader = pypdf.PdfReader(io.BytesIO(content))
+    page_count = len(reader.pages)
+    stop = page_count if stop is None else min(stop, page_count)
+    pages, collected = [], 0
+    for index in range(start, stop):
+        started = time.perf_counter()
+        text = reader.pages[index].extract_text() or ""
+        pages.append((index, text, time.perf_counter() - started))
+        collected += len(text)
+        if char_budget and collected >= char_budget:
+            break
+    return {"page_count": page_count, "pages": pages}
+
+def join_pdf_pages(page_texts) -> str:
+    """Собирает текст документа из текстов страниц, разделяя их PAGE_BREAK (пустые страницы пропускаются)."""
+    return PAGE_BREAK.join(text + "\n" for text in page_texts if text)
+
+def _parse_pdf_sync(content: bytes) -> str:
+    """Синхронно парсит содержимое PDF файла целиком."""
+    return join_pdf_pages(text for _, text, _ in parse_pdf_pages(content)["pages"])
+
+def _parse_docx_sync(content: bytes) -> str:
+    """Синхронно парсит содержимое DOCX файла."""
+    doc_stream = io.BytesIO(content)
+    doc = docx.Document(doc_stream)
+    full_text = [p.text for p in doc.paragraphs]
+    for table in doc.tables:
+        for row in table.rows:
+            # Объединенная ячейка повторяется в row.cells для каждой занятой ею колонки
+            cells, seen = [], []
+            for cell in row.cells:
+                if cell._tc not in seen:
+                    seen.append(cell._tc)
+                    cells.append(cell.text.strip())
+            full_text.append(" | ".join(cell for cell in cells if cell))
+    return "\n".join(full_text)
+
+def _parse_rtf_sync(content: bytes) -> str:
+    """Синхронно парсит содержимое RTF файла."""
+    return rtf_to_text(content.decode("utf-8", errors="ignore"))
+
+def _parse_plain_sync(content: bytes) -> str:
+    """Декодирует простой текстовый файл."""
+    return content.decode("utf-8", errors="ignore")
+
+
+# Парсеры по расширению файла
+PARSERS = {
+    ".pdf": _parse_pdf_sync,
+    ".docx": _parse_docx_sync,
+    ".rtf": _parse_rtf_sync,
+    ".txt": _parse_plain_sync,
+    ".md": _parse_plain_sync,
+}
+
+
+def init_parser_process(memory_limit_mb: int) -> None:
+    """Инициализатор дочернего процесса: ограничивает адресное пространство процесса."""
+    if memory_limit_mb <= 0:
+        return
+    try:
+        import resource
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, ValueError, OSError) as e:
+        # Например, на Windows модуля resource нет — работаем без ограничения
+        logging.warning(f"[Parsing] Не удалось установить лимит памяти процесса парсинга: {e}")
+
+
+def parse_document(suffix: str, content: bytes) -> str:
+    """Точка входа для дочернего процесса: извлекает текст документа по расширению."""
+    parser = PARSERS.get(suffix)
+    if parser is None:
+        raise ValueError(f"Файл с расширением {suffix} не поддерживается.")
+    return parser(content)
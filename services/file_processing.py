@@ -1,88 +1,83 @@
+import asyncio
 import logging
 import os
 import tempfile
-import io
-import asyncio
-from typing import Union
+from typing import List, Optional, Union
 from pathlib import Path
 
 from fastapi import UploadFile
 import aiofiles
 
-# --- Библиотеки для парсинга ---
-import docx
-import pypdf
-from striprtf.striprtf import rtf_to_text
-
-# --- Синхронные "воркеры" для CPU-bound операций ---
-
-def _parse_pdf_sync(content: bytes) -> str:
-    """Синхронно парсит содержимое PDF файла."""
-    pdf_stream = io.BytesIO(content)
-    reader = pypdf.PdfReader(pdf_stream)
-    text = "".join(page.extract_text() + "\n" for page in reader.pages if page.extract_text())
-    return text
-
-def _parse_docx_sync(content: bytes) -> str:
-    """Синхронно парсит содержимое DOCX файла."""
-    doc_stream = io.BytesIO(content)
-    doc = docx.Document(doc_stream)
-    full_text = [p.text for p in doc.paragraphs]
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                full_text.append(cell.text)
-    return "\n".join(full_text)
+from core.config import settings
+from services.parsing_pool import parsing_pool, ParseResult
+from services.text_cache import hash_content, text_cache
+from services.text_normalization import text_normalizer
+from services.document_parsers import PAGE_BREAK
 
-def _parse_rtf_sync(content: str) -> str:
-    """Синхронно парсит содержимое RTF файла."""
-    return rtf_to_text(content)
+# Размер блока при чтении загруженного файла
+UPLOAD_CHUNK_SIZE = 1024 * 1024
 
 
 # --- Асинхронная логика парсинга файлов ---
+# CPU-bound парсинг выполняется в пуле процессов (services/parsing_pool.py)
+
+def _normalize(text: str, label: str) -> str:
+    """Очищает извлеченный текст перед использованием в промптах (services/text_normalization.py)."""
+    if not settings.TEXT_NORMALIZATION_ENABLED:
+        return text.replace(PAGE_BREAK, "\n")
+    return text_normalizer.normalize(text, label).text
+
+async def _parse_cached(suffix: str, content: bytes, label: str = "") -> str:
+    """
+    Парсит документ в пуле процессов и нормализует текст, переиспользуя
+    результат для ранее загруженного файла с тем же содержимым.
+    """
+    if not text_cache.enabled:
+        return _normalize(await parsing_pool.parse(suffix, content), label)
+    content_hash = await hash_content(content)
+    cached = await text_cache.get(content_hash)
+    if cached is not None:
+        return cached
+    text = _normalize(await parsing_pool.parse(suffix, content), label)
+    # Пустой результат не кэшируем: это может быть сбой парсера, а не пустой документ
+    if text.strip():
+        await text_cache.put(content_hash, text)
+    return text
 
-async def _extract_text_from_pdf(file_path: Union[str, Path]) -> str:
-    """Асинхронно читает PDF и выносит парсинг в отдельный поток."""
+async def _extract_with_pool(file_path: Union[str, Path], suffix: str, label: str) -> str:
+    """Асинхронно читает файл и парсит его в пуле процессов."""
     try:
         async with aiofiles.open(file_path, 'rb') as f:
             content = await f.read()
-        # Выполняем блокирующую операцию в отдельном потоке
-        return await asyncio.to_thread(_parse_pdf_sync, content)
+        return await _parse_cached(suffix, content, Path(file_path).name)
     except Exception as e:
-        logging.error(f"Ошибка при обработке PDF {file_path}: {e}")
+        logging.error(f"Ошибка при обработке {label} {file_path}: {e}")
         return ""
 
+async def _extract_text_from_pdf(file_path: Union[str, Path]) -> str:
+    """Асинхронно читает PDF и выносит парсинг в пул процессов."""
+    return await _extract_with_pool(file_path, ".pdf", "PDF")
+
 async def _extract_text_from_docx(file_path: Union[str, Path]) -> str:
-    """Асинхронно читает DOCX и выносит парсинг в отдельный поток."""
-    try:
-        async with aiofiles.open(file_path, 'rb') as f:
-            content = await f.read()
-        # Выполняем блокирующую операцию в отдельном потоке
-        return await asyncio.to_thread(_parse_docx_sync, content)
-    except Exception as e:
-        logging.error(f"Ошибка при обработке DOCX {file_path}: {e}")
-        return ""
+    """Асинхронно читает DOCX и выносит парсинг в пул процессов."""
+    return await _extract_with_pool(file_path, ".docx", "DOCX")
 
 async def _extract_text_from_rtf(file_path: Union[str, Path]) -> str:
-    """Асинхронно читает RTF и выносит парсинг в отдельный поток."""
-    try:
-        async with aiofiles.open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-            content = await f.read()
-        # Выполняем блокирующую операцию в отдельном потоке
-        return await asyncio.to_thread(_parse_rtf_sync, content)
-    except Exception as e:
-        logging.error(f"Ошибка при обработке RTF {file_path}: {e}")
-        return ""
+    """Асинхронно читает RTF и выносит парсинг в пул процессов."""
+    return await _extract_with_pool(file_path, ".rtf", "RTF")
 
 async def _extract_text_from_plain(file_path: Union[str, Path]) -> str:
     """Асинхронно извлекает текст из простого текстового файла."""
     try:
         async with aiofiles.open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-            return await f.read()
+            return _normalize(await f.read(), Path(file_path).name)
     except Exception as e:
         logging.error(f"Ошибка при асинхронном чтении текстового файла {file_path}: {e}")
         return ""
 
+# Форматы, которые не требуют парсинга и декодируются в основном процессе
+PLAIN_TEXT_SUFFIXES = {".txt", ".md"}
+
 # Словарь диспетчеризации теперь содержит асинхронные функции
 EXTRACTORS = {
     ".pdf": _extract_text_from_pdf,
@@ -103,8 +98,115 @@ async def extract_text_from_file(file_path: Union[str, Path]) -> str:
     logging.warning(f"Файл с расширением {path.suffix.lower()} не поддерживается.")
     return ""
 
+async def extract_texts_from_files(file_paths: List[Union[str, Path]]) -> List[ParseResult]:
+    """
+    Пакетно извлекает текст из нескольких файлов, распределяя парсинг по ядрам.
+    В отличие от extract_text_from_file, возвращает причину ошибки для каждого файла.
+    """
+    items, results = [], []
+    for file_path in file_paths:
+        path = Path(file_path)
+        suffix = path.suffix.lower()
+        if suffix not in EXTRACTORS:
+            results.append(ParseResult(error=f"Файл с расширением {suffix} не поддерживается."))
+            continue
+        try:
+            async with aiofiles.open(path, 'rb') as f:
+                items.append((len(results), path, await f.read()))
+            results.append(None)
+        except Exception as e:
+            results.append(ParseResult(error=f"Не удалось прочитать файл: {e}"))
+
+    async def _parse(path: Path, content: bytes) -> ParseResult:
+        try:
+            if path.suffix.lower() in PLAIN_TEXT_SUFFIXES:
+                return ParseResult(text=_normalize(content.decode("utf-8", errors="ignore"), path.name))
+            return ParseResult(text=await _parse_cached(path.suffix.lower(), content, path.name))
+        except MemoryError:
+            return ParseResult(error="Превышен лимит памяти при парсинге файла.")
+        except Exception as e:
+            return ParseResult(error=str(e) or type(e).__name__)
+
+    parsed = await asyncio.gather(*(_parse(path, content) for _, path, content in items))
+    for (position, _, _), result in zip(items, parsed):
+        results[position] = result
+    return results
+
+# --- Прием загрузок без временных файлов ---
+
+async def read_upload_bytes(upload_file: UploadFile, max_bytes: Optional[int] = None) -> bytes:
+    """
+    Читает загруженный файл блоками из буфера загрузки (SpooledTemporaryFile).
+    Прерывает чтение, как только размер превышает max_bytes, чтобы большие
+    загрузки не занимали память целиком.
+    """
+    max_bytes = max_bytes or settings.PARSER_MAX_FILE_MB * 1024 * 1024
+    chunks, size = [], 0
+    try:
+        while True:
+            chunk = await upload_file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise ValueError(f"Файл превышает допустимый размер {max_bytes // (1024 * 1024)} МБ.")
+            chunks.append(chunk)
+    finally:
+        await upload_file.close()
+    return b"".join(chunks)
+
+async def parse_document_bytes(filename: str, content: bytes) -> str:
+    """
+    Извлекает текст из содержимого файла в памяти без записи на диск.
+
+    Raises:
+        ValueError: если формат не поддерживается.
+    """
+    suffix = Path(filename or "").suffix.lower()
+    if suffix not in EXTRACTORS:
+        raise ValueError(f"Файл с расширением {suffix} не поддерживается.")
+    if suffix in PLAIN_TEXT_SUFFIXES:
+        return _normalize(bytes(content).decode("utf-8", errors="ignore"), filename)
+    return await _parse_cached(suffix, content, filename)
+
+async def extract_text_from_upload(upload_file: UploadFile) -> str:
+    """Извлекает текст из загруженного файла. При ошибке возвращает пустую строку."""
+    try:
+        content = await read_upload_bytes(upload_file)
+        return await parse_document_bytes(upload_file.filename, content)
+    except Exception as e:
+        logging.error(f"Ошибка при обработке загруженного файла {upload_file.filename}: {e}")
+        return ""
+
+async def extract_texts_from_uploads(upload_files: List[UploadFile]) -> List[ParseResult]:
+    """
+    Пакетно извлекает текст из загруженных файлов без временных файлов.
+    Файлы читаются по очереди (пиковая память ограничена размером пакета),
+    а парсятся параллельно в пуле процессов.
+    """
+    async def _parse(filename: str, content: bytes) -> ParseResult:
+        try:
+            return ParseResult(text=await parse_document_bytes(filename, content))
+        except Exception as e:
+            return ParseResult(error=str(e) or type(e).__name__)
+
+    tasks = []
+    for upload_file in upload_files:
+        try:
+            content = await read_upload_bytes(upload_file)
+        except Exception as e:
+            tasks.append(asyncio.sleep(0, result=ParseResult(error=f"Не удалось прочитать файл: {e}")))
+            continue
+        # Парсинг уже прочитанных файлов идет, пока читаются следующие
+        tasks.append(asyncio.ensure_future(_parse(upload_file.filename, content)))
+    return list(await asyncio.gather(*tasks))
+
 async def save_upload_file_tmp(upload_file: UploadFile) -> str:
-    """Асинхронно сохраняет загруженный файл во временный файл."""
+    """
+    Асинхронно сохраняет загруженный файл во временный файл.
+    Нужен только парсерам, которым требуется путь к файлу; для извлечения текста
+    используйте extract_text_from_upload / extract_texts_from_uploads.
+    """
     try:
         suffix = Path(upload_file.filename).suffix
         # Используем синхронный tempfile для получения уникального имени, но запись делаем асинхронно
@@ -112,8 +214,8 @@ async def save_upload_file_tmp(upload_file: UploadFile) -> str:
             tmp_path = tmp.name
         
         async with aiofiles.open(tmp_path, 'wb') as out_file:
-            content = await upload_file.read()
-            await out_file.write(content)
+            while chunk := await upload_file.read(UPLOAD_CHUNK_SIZE):
+                await out_file.write(chunk)
         
         return tmp_path
     finally:
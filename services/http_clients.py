@@ -0,0 +1,100 @@
+"""
+Общие HTTP-клиенты приложения с пулами keep-alive соединений.
+
+Вместо нового клиента (и нового TCP/TLS-рукопожатия) на каждый запрос
+все обращения к LLM-провайдерам и доставка вебхуков идут через именованные
+клиенты реестра: `ollama`, `openai`, `webhooks`. Лимиты пулов задаются
+настройками `HTTP_POOL_*`; HTTP/2 включается, если установлен пакет `h2`.
+
+Клиенты создаются при первом обращении и закрываются при остановке
+приложения (lifespan в main.py).
+"""
+
+import importlib.util
+import logging
+from collections import Counter
+from typing import Any, Dict
+
+import httpx
+
+from core.config import settings
+
+# Таймауты клиентов: ответы LLM ограничиваются таймаутами вызывающего кода, поэтому без таймаута чтения
+CLIENT_TIMEOUTS = {
+    "ollama": httpx.Timeout(None, connect=10.0),
+    "openai": httpx.Timeout(None, connect=10.0),
+    "webhooks": httpx.Timeout(30.0),
+}
+DEFAULT_TIMEOUT = httpx.Timeout(30.0)
+
+
+class HttpClientRegistry:
+    """Реестр именованных httpx.AsyncClient с общими настройками пулов соединений."""
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._requests: Counter = Counter()
+
+    @property
+    def http2_enabled(self) -> bool:
+        return settings.HTTP_CLIENT_HTTP2 and importlib.util.find_spec("h2") is not None
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        """Возвращает общий клиент с указанным именем, создавая его при первом обращении."""
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            client = self._create(name)
+            self._clients[name] = client
+        return client
+
+    def _create(self, name: str) -> httpx.AsyncClient:
+        async def count_request(request: httpx.Request) -> None:
+            self._requests[name] += 1
+
+        logging.info(f"[HTTP] Создан клиент '{name}' (HTTP/2: {'да' if self.http2_enabled else 'нет'}).")
+        return httpx.AsyncClient(
+            http2=self.http2_enabled,
+            timeout=CLIENT_TIMEOUTS.get(name, DEFAULT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.HTTP_POOL_MAX_KEEPALIVE,
+                keepalive_expiry=settings.HTTP_POOL_KEEPALIVE_EXPIRY,
+            ),
+            event_hooks={"request": [count_request]},
+        )
+
+    async def aclose(self) -> None:
+        """Закрывает все клиенты и их соединения."""
+        for name, client in list(self._clients.items()):
+            try:
+                await client.aclose()
+            except Exception as e:
+                logging.error(f"[HTTP] Ошибка при закрытии клиента '{name}': {e}")
+        self._clients.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает загрузку пулов соединений для метрик."""
+        clients = {}
+        for name in sorted(set(self._clients) | set(self._requests)):
+            client = self._clients.get(name)
+            # Публичного API для состояния пула у httpx нет, поэтому читаем пул httpcore напрямую
+            pool = getattr(getattr(client, "_transport", None), "_pool", None)
+            connections = list(getattr(pool, "connections", []) or [])
+            idle = sum(1 for connection in connections if connection.is_idle())
+            clients[name] = {
+                "open": client is not None and not client.is_closed,
+                "requests": self._requests[name],
+                "connections": len(connections),
+                "active_connections": len(connections) - idle,
+                "idle_connections": idle,
+            }
+        return {
+            "http2": self.http2_enabled,
+            "max_connections": settings.HTTP_POOL_MAX_CONNECTIONS,
+            "max_keepalive_connections": settings.HTTP_POOL_MAX_KEEPALIVE,
+            "clients": clients,
+        }
+
+
+# Единый реестр HTTP-клиентов для всего приложения
+http_clients = HttpClientRegistry()
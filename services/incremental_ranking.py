@@ -0,0 +1,67 @@
+"""
+Инкрементальное ранжирование: добавление новых резюме к существующей вакансии.
+
+Оцениваются только новые резюме — с текстом вакансии и весами, сохраненными
+в БД. Уже оцененные кандидаты не отправляются в LLM: общий рейтинг
+пересчитывается по сохраненным подоценкам, поэтому стоимость запроса
+пропорциональна числу новых резюме.
+"""
+
+import logging
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.schemas import Vacancy
+from services.candidate_service import append_candidates, rerank_vacancy_candidates
+from services.dedup import collect_duplicate_groups
+from services.scoring_service import score_resumes, sort_scored_resumes
+
+
+async def rank_new_resumes(
+    db: AsyncSession,
+    vacancy_id: int,
+    resumes: List[Dict[str, Any]],
+    prefilter: Optional[bool] = None,
+    batch: Optional[bool] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Оценивает новые резюме для сохраненной вакансии и объединяет их с текущим рейтингом.
+
+    Args:
+        db: Сессия БД.
+        vacancy_id: ID существующей вакансии.
+        resumes: Список словарей с ключами 'filename' и 'text'.
+        prefilter: Включить лексический предфильтр BM25 (по умолчанию из настроек).
+        batch: Оценивать несколько резюме одним запросом (по умолчанию из настроек).
+
+    Returns:
+        Словарь с оценками новых резюме (`added`), обновленным рейтингом всех кандидатов
+        вакансии (`ranking`) и группами дубликатов или None, если вакансия не найдена.
+    """
+    vacancy = await db.get(Vacancy, vacancy_id)
+    if not vacancy:
+        return None
+    vacancy_text, weights = vacancy.text, vacancy.weights_json or {}
+
+    logging.info(f"[Инкрементальное ранжирование] Вакансия ID {vacancy_id}: оценка {len(resumes)} новых резюме.")
+    to_score = [{"id": resume["filename"], "text": resume["text"]} for resume in resumes]
+    scored = await score_resumes(vacancy_text, to_score, weights=weights, prefilter=prefilter, batch=batch)
+
+    new_resumes = []
+    for resume, score_data in zip(resumes, scored):
+        score_data["filename"] = resume["filename"]
+        score_data["resume_text"] = resume["text"]
+        new_resumes.append(score_data)
+    added = await append_candidates(db, vacancy_id, new_resumes)
+
+    merged = await rerank_vacancy_candidates(db, vacancy_id)
+    added = sort_scored_resumes([
+        {key: value for key, value in item.items() if key != "resume_text"} for item in added
+    ])
+    return {
+        "vacancy_id": vacancy_id,
+        "added": added,
+        "ranking": merged["ranking"] if merged else [],
+        "duplicate_groups": collect_duplicate_groups(added, "filename"),
+    }
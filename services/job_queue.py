@@ -0,0 +1,208 @@
+"""
+Персистентная очередь фоновых задач Webhook API.
+
+Каждая задача сохраняется в таблицу `jobs` до постановки в очередь, поэтому
+не теряется при перезапуске: при старте приложения задачи в статусе
+`queued` и прерванные задачи в статусе `running` снова ставятся в очередь
+(пока не исчерпан лимит попыток `JOB_MAX_ATTEMPTS`).
+
+Задачи выполняет пул из `JOB_WORKERS` асинхронных воркеров. Каждый воркер
+работает со своими сессиями БД и не зависит от сессии HTTP-запроса,
+в котором задача была создана.
+"""
+
+import asyncio
+import datetime
+import logging
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Type
+
+from pydantic import BaseModel
+from sqlalchemy import func, select, update
+
+from core.config import settings
+from core.database import AsyncSessionFactory
+from core.schemas import Job
+from core import models
+from api import schemas as api_schemas
+from services import api_webhook_service, webhook_service
+from services.llm_limits import bulk_llm_work
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+# Тип задачи -> (модель запроса, обработчик). Обработчик возвращает результат задачи.
+JobHandler = Callable[[Any], Awaitable[Optional[Dict[str, Any]]]]
+JOB_HANDLERS: Dict[str, Tuple[Type[BaseModel], JobHandler]] = {
+    "rank_resumes_v1": (api_schemas.WebhookRankRequest, api_webhook_service.process_ranking_request_v1),
+    "append_resumes": (api_schemas.WebhookAppendResumesRequest, api_webhook_service.process_append_resumes_request),
+    "interview_simulation": (api_schemas.WebhookInterviewRequest, api_webhook_service.process_interview_simulation_request),
+    "build_vacancy": (api_schemas.WebhookBuildVacancyRequest, api_webhook_service.process_vacancy_build_request),
+    "add_vacancy": (api_schemas.WebhookAddVacancyRequest, api_webhook_service.process_add_vacancy_request),
+    "generate_tags": (api_schemas.WebhookGenerateTagsRequest, api_webhook_service.process_tag_generation_request),
+    "rank_resumes": (models.WebhookRankRequest, webhook_service.process_ranking_request),
+    "analyze_interview": (models.WebhookAnalysisRequest, webhook_service.process_analysis_request),
+}
+
+
+def serialize_job(job: Job, include_result: bool = False) -> Dict[str, Any]:
+    """Преобразует задачу в словарь для ответа API."""
+    data = {
+        "job_id": job.id,
+        "job_type": job.job_type,
+        "status": job.status,
+        "attempts": job.attempts,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+    if include_result:
+        data["result"] = job.result_json
+    return data
+
+
+class JobQueue:
+    """Очередь задач поверх таблицы `jobs` с пулом асинхронных воркеров."""
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self.completed = 0
+        self.failed = 0
+
+    async def submit(self, job_type: str, request: BaseModel) -> str:
+        """Сохраняет задачу в БД и ставит ее в очередь. Возвращает ID задачи."""
+        if job_type not in JOB_HANDLERS:
+            raise ValueError(f"Неизвестный тип задачи: {job_type}")
+        job_id = uuid.uuid4().hex
+        async with AsyncSessionFactory() as session:
+            session.add(Job(
+                id=job_id,
+                job_type=job_type,
+                status=JOB_QUEUED,
+                payload_json=request.model_dump(mode="json")
+            ))
+            await session.commit()
+        if self._queue is not None:
+            self._queue.put_nowait(job_id)
+        logging.info(f"[Jobs] Задача {job_id} ({job_type}) поставлена в очередь.")
+        return job_id
+
+    async def start(self, worker_count: Optional[int] = None) -> None:
+        """Восстанавливает незавершенные задачи и запускает воркеров."""
+        self._queue = asyncio.Queue()
+        for job_id in await self._recover_pending_jobs():
+            self._queue.put_nowait(job_id)
+        worker_count = worker_count or settings.JOB_WORKERS
+        self._workers = [asyncio.create_task(self._worker(i)) for i in range(worker_count)]
+        logging.info(f"[Jobs] Запущено воркеров: {worker_count}, задач в очереди: {self._queue.qsize()}.")
+
+    async def stop(self) -> None:
+        """Останавливает воркеров. Прерванные задачи будут продолжены при следующем запуске."""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def _recover_pending_jobs(self) -> List[str]:
+        """Возвращает ID задач, которые нужно выполнить после перезапуска."""
+        async with AsyncSessionFactory() as session:
+            # Задачи, прерванные остановкой приложения, исчерпавшие лимит попыток, завершаем с ошибкой
+            await session.execute(
+                update(Job)
+                .where(Job.status == JOB_RUNNING, Job.attempts >= settings.JOB_MAX_ATTEMPTS)
+                .values(
+                    status=JOB_FAILED,
+                    error="Превышено число попыток выполнения задачи.",
+                    finished_at=datetime.datetime.utcnow()
+                )
+            )
+            await session.execute(update(Job).where(Job.status == JOB_RUNNING).values(status=JOB_QUEUED))
+            result = await session.execute(
+                select(Job.id).where(Job.status == JOB_QUEUED).order_by(Job.created_at)
+            )
+            job_ids = list(result.scalars().all())
+            await session.commit()
+        if job_ids:
+            logging.info(f"[Jobs] Восстановлено незавершенных задач: {len(job_ids)}.")
+        return job_ids
+
+    async def _worker(self, worker_id: int) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run_job(job_id)
+            except Exception as e:
+                logging.error(f"[Jobs] Воркер {worker_id}: сбой обработки задачи {job_id}: {e}", exc_info=True)
+            finally:
+                self._queue.task_done()
+
+    async def _run_job(self, job_id: str) -> None:
+        async with AsyncSessionFactory() as session:
+            job = await session.get(Job, job_id)
+            if job is None or job.status != JOB_QUEUED:
+                return
+            job.status = JOB_RUNNING
+            job.attempts = (job.attempts or 0) + 1
+            job.started_at = datetime.datetime.utcnow()
+            job_type, payload = job.job_type, job.payload_json
+            await session.commit()
+
+        logging.info(f"[Jobs] Выполнение задачи {job_id} ({job_type}).")
+        result, error = None, None
+        try:
+            request_model, handler = JOB_HANDLERS[job_type]
+            # Фоновые задачи ждут места в лимите LLM без срока и пропускают интерактивные запросы вперед
+            with bulk_llm_work():
+                result = await handler(request_model.model_validate(payload))
+        except asyncio.CancelledError:
+            # Приложение останавливается: задача останется в статусе running и будет восстановлена
+            raise
+        except Exception as e:
+            error = str(e) or type(e).__name__
+
+        async with AsyncSessionFactory() as session:
+            job = await session.get(Job, job_id)
+            job.status = JOB_FAILED if error else JOB_COMPLETED
+            job.result_json = result
+            job.error = error
+            job.finished_at = datetime.datetime.utcnow()
+            await session.commit()
+
+        if error:
+            self.failed += 1
+            logging.error(f"[Jobs] Задача {job_id} завершилась с ошибкой: {error}")
+        else:
+            self.completed += 1
+            logging.info(f"[Jobs] Задача {job_id} выполнена.")
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        async with AsyncSessionFactory() as session:
+            return await session.get(Job, job_id)
+
+    async def list_jobs(self, status: Optional[str] = None, limit: int = 50) -> List[Job]:
+        async with AsyncSessionFactory() as session:
+            query = select(Job).order_by(Job.created_at.desc()).limit(limit)
+            if status:
+                query = query.where(Job.status == status)
+            return list((await session.execute(query)).scalars().all())
+
+    async def stats(self) -> Dict[str, Any]:
+        """Возвращает счетчики очереди для метрик."""
+        async with AsyncSessionFactory() as session:
+            result = await session.execute(select(Job.status, func.count()).group_by(Job.status))
+            by_status = {status: count for status, count in result.all()}
+        return {
+            "workers": len(self._workers),
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "by_status": by_status,
+            "completed_since_start": self.completed,
+            "failed_since_start": self.failed,
+        }
+
+
+# Единая очередь задач для всего приложения
+job_queue = JobQueue()
@@ -0,0 +1,133 @@
+"""
+Лексический предфильтр резюме на основе BM25.
+
+Перед дорогим скорингом через LLM по текстам резюме пакета строится
+инвертированный индекс в памяти, и каждое резюме оценивается по BM25
+относительно текста вакансии. В LLM отправляются только лучшие резюме,
+остальные получают дешевую лексическую оценку.
+"""
+
+import math
+import re
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+# Русские слова сильно изменяются по падежам, поэтому вместо полноценного
+# стемминга обрезаем длинные токены до общего префикса
+STEM_LENGTH = 6
+
+TOKEN_PATTERN = re.compile(r"[a-zа-яё0-9][a-zа-яё0-9+#]*")
+
+STOP_WORDS = {
+    "и", "в", "во", "на", "с", "со", "по", "для", "от", "до", "из", "за", "к", "о", "об",
+    "не", "а", "но", "или", "что", "как", "это", "мы", "вы", "мой", "наш", "ваш", "у",
+    "the", "and", "or", "of", "to", "in", "on", "for", "with", "a", "an", "is", "are", "be",
+}
+
+
+def iter_terms(text: str) -> Iterator[Tuple[str, str]]:
+    """Отдает пары (нормализованный терм, исходное слово) для текста."""
+    for token in TOKEN_PATTERN.findall((text or "").lower()):
+        if len(token) < 2 or token in STOP_WORDS:
+            continue
+        yield token[:STEM_LENGTH], token
+
+
+def tokenize(text: str) -> List[str]:
+    """Разбивает текст на нормализованные токены для лексического поиска."""
+    return [term for term, _ in iter_terms(text)]
+
+
+class BM25Index:
+    """Инвертированный индекс с ранжированием Okapi BM25."""
+
+    def __init__(self, documents: List[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, List[tuple]] = defaultdict(list)
+        self.doc_lengths: List[int] = []
+        # Исходное написание терма для отображения пользователю
+        self.surface_forms: Dict[str, str] = {}
+
+        for doc_id, text in enumerate(documents):
+            term_counts = Counter()
+            for term, surface in iter_terms(text):
+                term_counts[term] += 1
+                self.surface_forms.setdefault(term, surface)
+            self.doc_lengths.append(sum(term_counts.values()))
+            for term, tf in term_counts.items():
+                self.postings[term].append((doc_id, tf))
+
+        self.doc_count = len(documents)
+        self.avg_doc_length = (sum(self.doc_lengths) / self.doc_count) if self.doc_count else 0.0
+
+    def idf(self, term: str) -> float:
+        df = len(self.postings.get(term, ()))
+        return math.log(1 + (self.doc_count - df + 0.5) / (df + 0.5))
+
+    def score(self, query: str) -> List[float]:
+        """Возвращает BM25-оценку каждого документа относительно запроса."""
+        scores = [0.0] * self.doc_count
+        if not self.doc_count or not self.avg_doc_length:
+            return scores
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = self.idf(term)
+            for doc_id, tf in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / self.avg_doc_length)
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+    def matched_terms(self, query: str, doc_id: int, limit: int = 5) -> List[str]:
+        """Возвращает наиболее значимые термы запроса, найденные в документе."""
+        weights = []
+        for term in set(tokenize(query)):
+            for posting_doc_id, tf in self.postings.get(term, ()):
+                if posting_doc_id == doc_id:
+                    weights.append((self.idf(term) * tf, term))
+                    break
+        return [self.surface_forms.get(term, term) for _, term in sorted(weights, reverse=True)[:limit]]
+
+
+@dataclass
+class PrefilterResult:
+    """Результат предфильтрации пакета резюме."""
+    selected: Set[int] = field(default_factory=set)
+    lexical_scores: List[float] = field(default_factory=list)
+    normalized_scores: List[float] = field(default_factory=list)
+    index: Optional[BM25Index] = None
+
+
+def prefilter_resumes(
+    vacancy_text: str,
+    resume_texts: List[str],
+    top_n: int,
+    min_score_ratio: Optional[float] = None
+) -> PrefilterResult:
+    """
+    Отбирает резюме для скоринга через LLM.
+
+    Args:
+        vacancy_text: Текст вакансии (используется как запрос).
+        resume_texts: Тексты резюме пакета.
+        top_n: Сколько лучших по BM25 резюме отправить в LLM.
+        min_score_ratio: Дополнительно отправить в LLM все резюме, чья оценка
+            не ниже этой доли от максимальной в пакете (опционально).
+
+    Returns:
+        Индексы отобранных резюме и их лексические оценки.
+    """
+    index = BM25Index(resume_texts)
+    scores = index.score(vacancy_text)
+    max_score = max(scores, default=0.0)
+    normalized = [score / max_score if max_score > 0 else 0.0 for score in scores]
+
+    ranked = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
+    selected = set(ranked[:top_n])
+    if min_score_ratio is not None:
+        selected.update(i for i, ratio in enumerate(normalized) if ratio >= min_score_ratio)
+
+    return PrefilterResult(selected=selected, lexical_scores=scores, normalized_scores=normalized, index=index)
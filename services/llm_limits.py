@@ -0,0 +1,310 @@
+"""
+Адаптивное ограничение числа одновременных запросов к LLM-провайдерам.
+
+Для каждого провайдера создается собственный ограничитель. Его лимит
+подстраивается по задержке ответов (AIMD): пока задержка близка к базовой
+(минимальной за последние `LLM_LATENCY_WINDOW_SECONDS` секунд), лимит растет
+на единицу за «окно» запросов, а при росте задержки в `LLM_LATENCY_TOLERANCE`
+раз, таймауте или ошибке — умножается на `LLM_LIMIT_BACKOFF`. Начальный
+лимит берется из `LLM_CONCURRENCY_LIMITS`.
+
+Для потоковых ответов задержкой считается время до первого фрагмента
+(см. `mark_first_token`): оно отражает очередь на сервере и мало зависит
+от длины ответа.
+
+Запросы сверх лимита ждут в очереди. Интерактивные запросы (собеседования,
+генерация по запросу пользователя) обслуживаются первыми, но ждут не дольше
+`LLM_QUEUE_TIMEOUT` секунд, а при очереди длиннее `LLM_QUEUE_MAX_DEPTH`
+сразу получают `LLMOverloadedError` (в HTTP API — ответ 429). Массовая
+работа (скоринг резюме, фоновые задачи) ждет без срока и не отклоняется.
+
+Вложенные вызовы для того же провайдера (например, цепочка внутри уже
+занятого скорингом слота) повторно место не занимают.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import logging
+import math
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, Optional, Tuple
+
+from core.config import settings
+
+# Лимит для провайдеров, не указанных в настройках
+DEFAULT_PROVIDER_CONCURRENCY = 4
+# Сколько последних замеров задержки хранится для расчета базовой задержки
+LATENCY_SAMPLES = 200
+# Коэффициент сглаживания средней задержки
+LATENCY_EWMA_ALPHA = 0.2
+
+
+class LLMOverloadedError(Exception):
+    """Провайдер LLM перегружен: очередь переполнена или срок ожидания места истек."""
+
+    def __init__(self, provider: str, reason: str, retry_after: int):
+        super().__init__(f"LLM-провайдер '{provider}' перегружен: {reason}. Повторите через {retry_after} с.")
+        self.provider = provider
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class LLMSlot:
+    """Занятое место в лимите провайдера на время одного запроса."""
+
+    def __init__(self, provider: str):
+        self.provider = provider
+        self.started = time.perf_counter()
+        self.first_token_at: Optional[float] = None
+
+    def mark_first_token(self) -> None:
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+
+    @property
+    def latency(self) -> float:
+        return (self.first_token_at or time.perf_counter()) - self.started
+
+
+# Слот, занятый текущей задачей (для вложенных вызовов и отметки первого фрагмента)
+_current_slot: contextvars.ContextVar[Optional[LLMSlot]] = contextvars.ContextVar("llm_slot", default=None)
+# Массовая работа: ждет места без срока и пропускает интерактивные запросы вперед
+_bulk_work: contextvars.ContextVar[bool] = contextvars.ContextVar("llm_bulk_work", default=False)
+
+
+class AdaptiveLimiter:
+    """Ограничитель одновременных запросов к провайдеру с адаптивным лимитом и очередью."""
+
+    def __init__(self, provider: str, initial_limit: int):
+        self.provider = provider
+        self.min_limit = max(1, settings.LLM_LIMIT_MIN)
+        self.max_limit = max(self.min_limit, math.ceil(initial_limit * settings.LLM_LIMIT_MAX_MULTIPLIER))
+        self.limit = float(min(max(initial_limit, self.min_limit), self.max_limit))
+        self.in_flight = 0
+        self._interactive: Deque[asyncio.Future] = deque()
+        self._bulk: Deque[asyncio.Future] = deque()
+        # (время замера, задержка) за последние LLM_LATENCY_WINDOW_SECONDS секунд
+        self._samples: Deque[Tuple[float, float]] = deque(maxlen=LATENCY_SAMPLES)
+        self._last_decrease = 0.0
+        self.avg_latency: Optional[float] = None
+        self.requests = 0
+        self.failures = 0
+        self.rejected = 0
+        self.queue_timeouts = 0
+        self.increases = 0
+        self.decreases = 0
+        self.queued = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.max_queue_depth = 0
+
+    @property
+    def capacity(self) -> int:
+        return int(self.limit)
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._interactive) + len(self._bulk)
+
+    def _retry_after(self) -> int:
+        """Оценка времени (в секундах), за которое очередь успеет продвинуться."""
+        latency = self.avg_latency or 1.0
+        return max(1, math.ceil(latency * (self.queue_depth + 1) / self.capacity))
+
+    def _wake(self) -> None:
+        """Передает освободившиеся места ожидающим: сначала интерактивным, затем массовым."""
+        while self.in_flight < self.capacity:
+            waiters = self._interactive or self._bulk
+            if not waiters:
+                return
+            waiter = waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    async def _acquire(self, bulk: bool) -> None:
+        if self.in_flight < self.capacity and not self.queue_depth:
+            self.in_flight += 1
+            return
+        if not bulk and len(self._interactive) >= settings.LLM_QUEUE_MAX_DEPTH:
+            self.rejected += 1
+            logging.warning(f"[LLMLimit] {self.provider}: очередь переполнена ({len(self._interactive)}), запрос отклонен.")
+            raise LLMOverloadedError(self.provider, "очередь запросов переполнена", self._retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        waiters = self._bulk if bulk else self._interactive
+        waiters.append(waiter)
+        self.queued += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        started = time.perf_counter()
+        try:
+            if bulk:
+                await waiter
+            else:
+                await asyncio.wait_for(waiter, settings.LLM_QUEUE_TIMEOUT)
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # Место уже было передано этому запросу — возвращаем его следующему в очереди
+                self.in_flight -= 1
+                self._wake()
+            else:
+                with contextlib.suppress(ValueError):
+                    waiters.remove(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                self.queue_timeouts += 1
+                logging.warning(f"[LLMLimit] {self.provider}: место в лимите не освободилось за {settings.LLM_QUEUE_TIMEOUT:.0f} с.")
+                raise LLMOverloadedError(self.provider, "истек срок ожидания в очереди", self._retry_after()) from None
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+    def _release(self, latency: float, ok: bool) -> None:
+        # Лимит растет, только если он действительно был исчерпан
+        saturated = self.in_flight >= self.capacity or self.queue_depth > 0
+        self.in_flight -= 1
+        self._adapt(latency, ok, saturated)
+        self._wake()
+
+    def _adapt(self, latency: float, ok: bool, saturated: bool) -> None:
+        now = time.monotonic()
+        if ok:
+            self._samples.append((now, latency))
+            self.avg_latency = latency if self.avg_latency is None else (
+                LATENCY_EWMA_ALPHA * latency + (1 - LATENCY_EWMA_ALPHA) * self.avg_latency
+            )
+        while self._samples and now - self._samples[0][0] > settings.LLM_LATENCY_WINDOW_SECONDS:
+            self._samples.popleft()
+        if not settings.LLM_ADAPTIVE_LIMITS_ENABLED:
+            return
+
+        baseline = self.baseline_latency
+        congested = not ok or (baseline is not None and latency > baseline * settings.LLM_LATENCY_TOLERANCE)
+        if congested:
+            # Не чаще одного снижения за время запроса: запросы одной волны перегрузки не снижают лимит каскадом
+            if now - self._last_decrease >= latency and self.limit > self.min_limit:
+                previous = self.limit
+                self.limit = max(self.min_limit, self.limit * settings.LLM_LIMIT_BACKOFF)
+                self._last_decrease = now
+                self.decreases += 1
+                logging.info(f"[LLMLimit] {self.provider}: лимит снижен {previous:.1f} -> {self.limit:.1f} "
+                             f"(задержка {latency:.2f} с, базовая {baseline or 0:.2f} с, ошибка: {not ok}).")
+        elif saturated and self.limit < self.max_limit:
+            # +1 место за каждые `limit` успешных запросов
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self.increases += 1
+
+    @property
+    def baseline_latency(self) -> Optional[float]:
+        return min(latency for _, latency in self._samples) if self._samples else None
+
+    @contextlib.asynccontextmanager
+    async def slot(self, bulk: Optional[bool] = None) -> AsyncIterator[LLMSlot]:
+        """
+        Занимает место в лимите провайдера на время запроса.
+
+        Args:
+            bulk: Массовая работа — ждет без срока после интерактивных запросов
+                (по умолчанию определяется контекстом, см. `bulk_llm_work`).
+
+        Raises:
+            LLMOverloadedError: Интерактивный запрос не дождался места или очередь переполнена.
+        """
+        held = _current_slot.get()
+        if held is not None and held.provider == self.provider:
+            yield held
+            return
+
+        await self._acquire(_bulk_work.get() if bulk is None else bulk)
+        self.requests += 1
+        current = LLMSlot(self.provider)
+        token = _current_slot.set(current)
+        # None — запрос отменен (например, клиент отключился): о перегрузке провайдера это не говорит
+        ok: Optional[bool] = None
+        try:
+            yield current
+            ok = True
+        except Exception:
+            ok = False
+            self.failures += 1
+            raise
+        finally:
+            # Слот мог освобождаться в другом контексте (закрытие генератора потокового ответа)
+            with contextlib.suppress(ValueError):
+                _current_slot.reset(token)
+            if ok is None:
+                self.in_flight -= 1
+                self._wake()
+            else:
+                self._release(current.latency, ok)
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает состояние ограничителя для метрик."""
+        baseline = self.baseline_latency
+        return {
+            "limit": round(self.limit, 2),
+            "min_limit": self.min_limit,
+            "max_limit": self.max_limit,
+            "in_flight": self.in_flight,
+            "queue_depth": {"interactive": len(self._interactive), "bulk": len(self._bulk)},
+            "max_queue_depth": self.max_queue_depth,
+            "requests": self.requests,
+            "failures": self.failures,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "queue_timeouts": self.queue_timeouts,
+            "avg_wait_ms": round(self.wait_seconds / self.queued * 1000, 1) if self.queued else 0.0,
+            "max_wait_ms": round(self.max_wait_seconds * 1000, 1),
+            "avg_latency_ms": round(self.avg_latency * 1000, 1) if self.avg_latency is not None else None,
+            "baseline_latency_ms": round(baseline * 1000, 1) if baseline is not None else None,
+            "increases": self.increases,
+            "decreases": self.decreases,
+        }
+
+
+_provider_limiters: Dict[str, AdaptiveLimiter] = {}
+
+
+def get_provider_limiter(provider: str) -> AdaptiveLimiter:
+    """Возвращает (создавая при необходимости) ограничитель для указанного провайдера."""
+    limiter = _provider_limiters.get(provider)
+    if limiter is None:
+        initial = max(1, settings.LLM_CONCURRENCY_LIMITS.get(provider, DEFAULT_PROVIDER_CONCURRENCY))
+        limiter = AdaptiveLimiter(provider, initial)
+        _provider_limiters[provider] = limiter
+        logging.info(f"Лимит одновременных запросов к провайдеру '{provider}': {initial} "
+                     f"(адаптивный: {settings.LLM_ADAPTIVE_LIMITS_ENABLED}, от {limiter.min_limit} до {limiter.max_limit}).")
+    return limiter
+
+
+def llm_slot(provider: str, bulk: Optional[bool] = None):
+    """Занимает место в лимите провайдера на время запроса (см. `AdaptiveLimiter.slot`)."""
+    return get_provider_limiter(provider).slot(bulk)
+
+
+def mark_first_token() -> None:
+    """Отмечает получение первого фрагмента потокового ответа в слоте текущего запроса."""
+    current = _current_slot.get()
+    if current is not None:
+        current.mark_first_token()
+
+
+@contextlib.contextmanager
+def bulk_llm_work() -> Iterator[None]:
+    """Помечает запросы к LLM внутри блока как массовую работу (фоновые задачи)."""
+    token = _bulk_work.set(True)
+    try:
+        yield
+    finally:
+        _bulk_work.reset(token)
+
+
+def limiter_stats() -> Dict[str, Any]:
+    """Возвращает состояние ограничителей всех провайдеров для метрик."""
+    return {
+        "adaptive": settings.LLM_ADAPTIVE_LIMITS_ENABLED,
+        "providers": {provider: limiter.stats() for provider, limiter in _provider_limiters.items()},
+    }
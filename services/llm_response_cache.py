@@ -0,0 +1,252 @@
+"""
+Персистентный кэш ответов детерминированных цепочек LLM.
+
+Генерация вопросов, выжимка технических требований, теги и описание
+вакансии многократно вызываются с одним и тем же текстом вакансии
+(например, выжимка — при каждом старте голосового собеседования).
+Ответы таких цепочек кэшируются в два уровня: LRU в памяти процесса
+и таблица `llm_response_cache` основной базы SQLite.
+
+Ключ — SHA-256 от имени цепочки, версии промпта (хэш шаблона), модели
+с параметрами генерации и входных данных. Кэшируются только цепочки из
+`LLM_CACHE_CHAINS`; записи старше `LLM_CACHE_TTL_SECONDS` не отдаются,
+а сверх `LLM_CACHE_MAX_ENTRIES` вытесняются самые давно использованные.
+
+Одинаковые одновременные вызовы (с тем же ключом) объединяются в один
+запрос к LLM (см. services/single_flight.py) — и для кэшируемых цепочек,
+и для остальных, если включено `LLM_COALESCING_ENABLED`.
+
+Ошибки кэша никогда не прерывают вызов цепочки: они только логируются.
+"""
+
+import datetime
+import hashlib
+import json
+import logging
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import delete, func, select, update
+
+from core.config import settings
+from core.database import AsyncSessionFactory
+from core.schemas import LLMResponseCacheEntry
+from services.single_flight import SingleFlight
+
+# Через сколько записей в кэш запускать очистку устаревших и лишних записей
+EVICTION_EVERY_N_WRITES = 100
+
+
+def chain_prompt_version(chain) -> str:
+    """Версия промпта цепочки — хэш шаблона: при изменении промпта старые ответы перестают совпадать."""
+    template = getattr(chain.prompt, "template", None) or repr(chain.prompt)
+    return hashlib.sha256(template.encode("utf-8")).hexdigest()[:16]
+
+
+def chain_model_signature(chain) -> str:
+    """Модель цепочки вместе с параметрами, влияющими на ответ."""
+    llm = chain.llm
+    model = getattr(llm, "model", None) or getattr(llm, "model_name", None) or type(llm).__name__
+    return f"{model}|t={getattr(llm, 'temperature', None)}|f={getattr(llm, 'format', None)}"
+
+
+def build_llm_cache_key(chain_name: str, prompt_version: str, model_signature: str, inputs: Dict[str, Any]) -> str:
+    """Строит контентный ключ кэша для вызова цепочки."""
+    inputs_json = json.dumps(inputs, ensure_ascii=False, sort_keys=True, default=str)
+    parts = [chain_name, prompt_version, model_signature, inputs_json]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """Двухуровневый кэш ответов цепочек LLM (память + таблица `llm_response_cache`)."""
+
+    def __init__(self):
+        # Ключ -> (ответ, время создания записи)
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self.memory_hits: Counter = Counter()
+        self.db_hits: Counter = Counter()
+        self.misses: Counter = Counter()
+        self.writes = 0
+        self.evictions = 0
+        # Объединение одинаковых одновременных вызовов цепочек
+        self.single_flight = SingleFlight("llm")
+
+    def is_enabled_for(self, chain_name: str) -> bool:
+        return settings.LLM_CACHE_ENABLED and chain_name in settings.LLM_CACHE_CHAINS
+
+    def _expiry_threshold(self) -> datetime.datetime:
+        return datetime.datetime.utcnow() - datetime.timedelta(seconds=settings.LLM_CACHE_TTL_SECONDS)
+
+    async def apredict(self, chain_name: str, chain, **inputs: Any) -> str:
+        """
+        Возвращает ответ цепочки из кэша или вызывает `chain.apredict` и сохраняет ответ.
+        Одновременные вызовы с теми же входными данными ждут один общий запрос к LLM.
+
+        Args:
+            chain_name: Имя цепочки из `LLM_CACHE_CHAINS` ('question_gen', 'vacancy_tech_summary', ...).
+            chain: Цепочка LLMChain.
+            **inputs: Входные переменные промпта.
+        """
+        cache_enabled = self.is_enabled_for(chain_name)
+        if not cache_enabled and not settings.LLM_COALESCING_ENABLED:
+            return await chain.apredict(**inputs)
+
+        prompt_version, model_signature = chain_prompt_version(chain), chain_model_signature(chain)
+        key = build_llm_cache_key(chain_name, prompt_version, model_signature, inputs)
+        if cache_enabled:
+            cached = await self.get(key, chain_name)
+            if cached is not None:
+                return cached
+
+        async def call_chain() -> str:
+            response = await chain.apredict(**inputs)
+            # Пустые ответы не кэшируем: это скорее сбой модели, чем результат
+            if cache_enabled and response and response.strip():
+                await self.put(key, chain_name, response, prompt_version, model_signature)
+            return response
+
+        if not settings.LLM_COALESCING_ENABLED:
+            return await call_chain()
+        return await self.single_flight.run(key, call_chain)
+
+    async def get(self, key: str, chain_name: str) -> Optional[str]:
+        """Ищет ответ сначала в памяти, затем в БД."""
+        entry = self._memory.get(key)
+        if entry is not None:
+            if time.time() - entry[1] < settings.LLM_CACHE_TTL_SECONDS:
+                self._memory.move_to_end(key)
+                self.memory_hits[chain_name] += 1
+                logging.info(f"[LLMCache] {chain_name}: ответ найден в памяти.")
+                return entry[0]
+            del self._memory[key]
+
+        found = None
+        try:
+            async with AsyncSessionFactory() as session:
+                row = (await session.execute(
+                    select(LLMResponseCacheEntry.response_text, LLMResponseCacheEntry.created_at)
+                    .where(LLMResponseCacheEntry.cache_key == key)
+                    .where(LLMResponseCacheEntry.created_at >= self._expiry_threshold())
+                )).first()
+                if row is not None:
+                    found = row
+                    await session.execute(
+                        update(LLMResponseCacheEntry)
+                        .where(LLMResponseCacheEntry.cache_key == key)
+                        .values(
+                            hit_count=LLMResponseCacheEntry.hit_count + 1,
+                            last_accessed_at=datetime.datetime.utcnow()
+                        )
+                    )
+                    await session.commit()
+        except Exception as e:
+            logging.error(f"[LLMCache] Ошибка чтения кэша ответов LLM: {e}", exc_info=True)
+
+        if found is None:
+            self.misses[chain_name] += 1
+            return None
+        self.db_hits[chain_name] += 1
+        # Время создания берем из БД, чтобы TTL записи в памяти не продлевался
+        created = found.created_at.replace(tzinfo=datetime.timezone.utc).timestamp()
+        self._remember(key, found.response_text, created)
+        logging.info(f"[LLMCache] {chain_name}: ответ найден в БД.")
+        return found.response_text
+
+    def _remember(self, key: str, response: str, created: float) -> None:
+        self._memory[key] = (response, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > settings.LLM_CACHE_MEMORY_ENTRIES:
+            self._memory.popitem(last=False)
+
+    async def put(self, key: str, chain_name: str, response: str, prompt_version: str, model_signature: str) -> None:
+        """Сохраняет (или перезаписывает) ответ цепочки в памяти и в БД."""
+        self._remember(key, response, time.time())
+        try:
+            async with AsyncSessionFactory() as session:
+                now = datetime.datetime.utcnow()
+                await session.merge(LLMResponseCacheEntry(
+                    cache_key=key,
+                    chain_name=chain_name,
+                    model_name=model_signature,
+                    prompt_version=prompt_version,
+                    response_text=response,
+                    hit_count=0,
+                    created_at=now,
+                    last_accessed_at=now
+                ))
+                await session.commit()
+            self.writes += 1
+        except Exception as e:
+            logging.error(f"[LLMCache] Ошибка записи в кэш ответов LLM: {e}", exc_info=True)
+            return
+
+        if self.writes % EVICTION_EVERY_N_WRITES == 0:
+            await self.evict()
+
+    async def evict(self) -> int:
+        """Удаляет устаревшие записи и вытесняет самые давно использованные сверх лимита."""
+        removed = 0
+        try:
+            async with AsyncSessionFactory() as session:
+                expired = await session.execute(
+                    delete(LLMResponseCacheEntry).where(LLMResponseCacheEntry.created_at < self._expiry_threshold())
+                )
+                removed += expired.rowcount or 0
+
+                total = await session.scalar(select(func.count()).select_from(LLMResponseCacheEntry))
+                overflow = (total or 0) - settings.LLM_CACHE_MAX_ENTRIES
+                if overflow > 0:
+                    oldest = (
+                        select(LLMResponseCacheEntry.cache_key)
+                        .order_by(LLMResponseCacheEntry.last_accessed_at.asc())
+                        .limit(overflow)
+                    )
+                    lru = await session.execute(
+                        delete(LLMResponseCacheEntry).where(LLMResponseCacheEntry.cache_key.in_(oldest))
+                    )
+                    removed += lru.rowcount or 0
+                await session.commit()
+        except Exception as e:
+            logging.error(f"[LLMCache] Ошибка очистки кэша ответов LLM: {e}", exc_info=True)
+            return 0
+
+        self.evictions += removed
+        if removed:
+            logging.info(f"[LLMCache] Удалено записей из кэша ответов LLM: {removed}.")
+        return removed
+
+    def clear_memory(self) -> None:
+        """Очищает уровень кэша в памяти процесса."""
+        self._memory.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает счетчики кэша (в целом и по цепочкам) для метрик."""
+        chains = {}
+        for chain_name in sorted(set(self.memory_hits) | set(self.db_hits) | set(self.misses)):
+            hits = self.memory_hits[chain_name] + self.db_hits[chain_name]
+            lookups = hits + self.misses[chain_name]
+            chains[chain_name] = {
+                "memory_hits": self.memory_hits[chain_name],
+                "db_hits": self.db_hits[chain_name],
+                "misses": self.misses[chain_name],
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            }
+        hits = sum(self.memory_hits.values()) + sum(self.db_hits.values())
+        lookups = hits + sum(self.misses.values())
+        return {
+            "enabled": settings.LLM_CACHE_ENABLED,
+            "cached_chains": list(settings.LLM_CACHE_CHAINS),
+            "memory_entries": len(self._memory),
+            "hits": hits,
+            "misses": lookups - hits,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "writes": self.writes,
+            "evictions": self.evictions,
+            "coalescing": {"enabled": settings.LLM_COALESCING_ENABLED, **self.single_flight.stats()},
+            "chains": chains,
+        }
+
+
+# Единый экземпляр кэша ответов LLM для всего приложения
+llm_response_cache = LLMResponseCache()
@@ -0,0 +1,201 @@
+"""
+Пул серверов Ollama: балансировка запросов между несколькими хостами.
+
+Если в `OLLAMA_BACKENDS` (или для отдельных моделей в `OLLAMA_MODEL_BACKENDS`)
+указано несколько адресов, каждый запрос PooledChatOllama отправляется
+на исправный сервер с наименьшим числом выполняющихся запросов
+(относительно его лимита `OLLAMA_BACKEND_MAX_CONCURRENCY`). Если все
+серверы загружены до лимита, запрос ждет освобождения места.
+
+Исправность проверяется периодически (GET /api/tags раз в
+`OLLAMA_HEALTH_CHECK_INTERVAL` секунд) и по результатам запросов: после
+`OLLAMA_EJECT_AFTER_FAILURES` ошибок подряд сервер исключается из
+балансировки и возвращается в нее после первой успешной проверки.
+
+Без настроенных серверов пул отключен, и запросы идут на `base_url` модели.
+"""
+
+import asyncio
+import contextlib
+import logging
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+from core.config import settings
+from services.http_clients import http_clients
+
+HEALTH_CHECK_TIMEOUT = 5.0
+
+
+class OllamaBackend:
+    """Один сервер Ollama и его состояние."""
+
+    def __init__(self, url: str, max_concurrency: int):
+        self.url = url.rstrip("/")
+        self.max_concurrency = max_concurrency
+        self.outstanding = 0
+        self.healthy = True
+        self.consecutive_failures = 0
+        # Модели сервера по данным последней проверки (None — проверки еще не было)
+        self.models: Optional[Set[str]] = None
+        self.requests = 0
+        self.failures = 0
+        self.ejections = 0
+        self.busy_seconds = 0.0
+        self.last_check: Optional[float] = None
+
+    def serves(self, model: str) -> bool:
+        return self.models is None or model in self.models or f"{model}:latest" in self.models
+
+    @property
+    def load(self) -> float:
+        return self.outstanding / self.max_concurrency
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "max_concurrency": self.max_concurrency,
+            "requests": self.requests,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+            "ejections": self.ejections,
+            "avg_request_seconds": round(self.busy_seconds / self.requests, 3) if self.requests else 0.0,
+            "models": sorted(self.models) if self.models is not None else None,
+        }
+
+
+class OllamaBackendPool:
+    """Выбирает сервер Ollama для запроса и следит за исправностью серверов."""
+
+    def __init__(self):
+        self._backends: Dict[str, OllamaBackend] = {}
+        self._condition: Optional[asyncio.Condition] = None
+        self._health_task: Optional[asyncio.Task] = None
+        for url in self._configured_urls():
+            self._backends[url.rstrip("/")] = OllamaBackend(url, settings.OLLAMA_BACKEND_MAX_CONCURRENCY)
+
+    @staticmethod
+    def _configured_urls() -> List[str]:
+        urls = list(settings.OLLAMA_BACKENDS)
+        for model_urls in settings.OLLAMA_MODEL_BACKENDS.values():
+            urls.extend(url for url in model_urls if url not in urls)
+        return urls
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._backends)
+
+    def backends_for(self, model: str) -> List[OllamaBackend]:
+        """
+        Серверы, за которыми закреплена модель (по умолчанию — общий список).
+        Пустой список — модель в балансировке не участвует и запросы к ней идут на `base_url`.
+        """
+        urls = settings.OLLAMA_MODEL_BACKENDS.get(model) or settings.OLLAMA_BACKENDS
+        return [self._backends[url.rstrip("/")] for url in urls]
+
+    def candidates(self, model: str, exclude: Optional[Set[str]] = None) -> List[OllamaBackend]:
+        """Серверы модели, которые еще не пробовали и на которых модель есть по данным последней проверки."""
+        exclude = exclude or set()
+        return [b for b in self.backends_for(model) if b.url not in exclude and b.serves(model)]
+
+    def _pick(self, candidates: List[OllamaBackend], model: str) -> Optional[OllamaBackend]:
+        healthy = [b for b in candidates if b.healthy]
+        if not healthy and candidates:
+            # Все серверы исключены: пробуем их, а не отказываем сразу — проверка могла отстать
+            logging.warning(f"[Ollama] Нет исправных серверов для модели {model}, пробую исключенные.")
+            healthy = candidates
+        free = [b for b in healthy if b.outstanding < b.max_concurrency]
+        if not free:
+            return None
+        return min(free, key=lambda b: (b.load, b.requests))
+
+    @contextlib.asynccontextmanager
+    async def acquire(self, model: str, exclude: Optional[Set[str]] = None) -> AsyncIterator[OllamaBackend]:
+        """Занимает место на наименее загруженном исправном сервере на время запроса."""
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        async with self._condition:
+            while True:
+                # Список моделей серверов обновляется проверками, поэтому сверяем его при каждом пробуждении
+                candidates = self.candidates(model, exclude)
+                if not candidates:
+                    raise RuntimeError(f"Нет доступных серверов Ollama с моделью {model}.")
+                backend = self._pick(candidates, model)
+                if backend is not None:
+                    break
+                await self._condition.wait()
+            backend.outstanding += 1
+            backend.requests += 1
+        started = time.perf_counter()
+        try:
+            yield backend
+        finally:
+            backend.busy_seconds += time.perf_counter() - started
+            async with self._condition:
+                backend.outstanding -= 1
+                self._condition.notify_all()
+
+    def record_success(self, backend: OllamaBackend) -> None:
+        backend.consecutive_failures = 0
+
+    def record_failure(self, backend: OllamaBackend, error: Exception) -> None:
+        """Учитывает ошибку запроса; после серии ошибок сервер исключается из балансировки."""
+        backend.failures += 1
+        backend.consecutive_failures += 1
+        if backend.healthy and backend.consecutive_failures >= settings.OLLAMA_EJECT_AFTER_FAILURES:
+            backend.healthy = False
+            backend.ejections += 1
+            logging.error(f"[Ollama] Сервер {backend.url} исключен из балансировки после ошибок: {error}")
+
+    async def check(self, backend: OllamaBackend) -> bool:
+        """Проверяет сервер запросом списка моделей и обновляет его состояние."""
+        try:
+            response = await http_clients.get("ollama").get(f"{backend.url}/api/tags", timeout=HEALTH_CHECK_TIMEOUT)
+            response.raise_for_status()
+            backend.models = {model.get("name") for model in response.json().get("models", [])}
+            ok = True
+        except Exception as e:
+            logging.warning(f"[Ollama] Проверка сервера {backend.url} не пройдена: {e}")
+            ok = False
+        backend.last_check = time.time()
+        if ok and not backend.healthy:
+            logging.info(f"[Ollama] Сервер {backend.url} снова в балансировке.")
+        if ok:
+            backend.consecutive_failures = 0
+        elif backend.healthy:
+            backend.ejections += 1
+        backend.healthy = ok
+        if ok and self._condition is not None:
+            async with self._condition:
+                self._condition.notify_all()
+        return ok
+
+    async def _health_loop(self) -> None:
+        while True:
+            await asyncio.gather(*(self.check(backend) for backend in self._backends.values()))
+            await asyncio.sleep(settings.OLLAMA_HEALTH_CHECK_INTERVAL)
+
+    def start(self) -> None:
+        """Запускает периодическую проверку серверов."""
+        if self.enabled and self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_loop())
+            logging.info(f"[Ollama] Балансировка между серверами: {', '.join(self._backends)}.")
+
+    async def stop(self) -> None:
+        """Останавливает проверку серверов."""
+        if self._health_task is not None:
+            self._health_task.cancel()
+            await asyncio.gather(self._health_task, return_exceptions=True)
+            self._health_task = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает состояние серверов для метрик."""
+        return {
+            "enabled": self.enabled,
+            "backends": {url: backend.stats() for url, backend in self._backends.items()},
+        }
+
+
+# Единый пул серверов Ollama для всего приложения
+ollama_backends = OllamaBackendPool()
@@ -0,0 +1,249 @@
+"""
+Пул процессов для парсинга документов.
+
+Парсинг PDF/DOCX/RTF — CPU-bound работа под GIL, поэтому в потоках пакет
+документов обрабатывается фактически на одном ядре. Пул распределяет файлы
+по `PARSER_WORKERS` процессам, перезапускает каждый процесс после
+`PARSER_MAX_TASKS_PER_CHILD` задач (защита от утечек памяти в парсерах;
+в Python 3.10, где у ProcessPoolExecutor нет `max_tasks_per_child`, после
+`PARSER_WORKERS * PARSER_MAX_TASKS_PER_CHILD` задач заменяется весь пул),
+ограничивает память процесса (`PARSER_MEMORY_LIMIT_MB`) и размер файла
+(`PARSER_MAX_FILE_MB`).
+
+Таймаут на файл жесткий: если парсер завис, процессы пула принудительно
+завершаются и пул пересоздается; остальные файлы, которые обрабатывались
+в этот момент, повторно отправляются в новый пул.
+
+PDF разбирается постранично в пределах бюджета `PDF_MAX_PAGES` /
+`PDF_MAX_CHARS`: первый процесс разбирает первые `PDF_PAGES_PER_TASK` страниц
+и сообщает их общее число; если бюджет не исчерпан, остальные страницы
+делятся между процессами пула. Каждой части передается весь файл, поэтому
+PDF меньше `PDF_SPLIT_MIN_KB` разбираются одним процессом. Таймаут действует
+на каждую часть документа.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from core.config import settings
+from services.document_parsers import init_parser_process, join_pdf_pages, parse_document, parse_pdf_pages
+
+
+class ParsingTimeoutError(Exception):
+    """Парсинг файла не уложился в отведенное время."""
+
+
+@dataclass
+class ParseResult:
+    """Результат парсинга одного файла."""
+    text: str = ""
+    error: Optional[str] = None
+
+
+class ParsingPool:
+    """Пул процессов парсинга с жестким таймаутом на файл."""
+
+    def __init__(self):
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # Число задач, отправленных в текущий пул (для замены пула в Python 3.10)
+        self._submitted = 0
+        self._restart_lock: Optional[asyncio.Lock] = None
+        self.parsed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.restarts = 0
+        self.pdf_pages_parsed = 0
+        self.pdf_pages_skipped = 0
+        self.pdf_page_seconds = 0.0
+        self.pdf_slowest_page_seconds = 0.0
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        kwargs: Dict[str, Any] = {}
+        if sys.version_info >= (3, 11):
+            kwargs["max_tasks_per_child"] = settings.PARSER_MAX_TASKS_PER_CHILD
+        return ProcessPoolExecutor(
+            max_workers=settings.PARSER_WORKERS,
+            # spawn: дочерние процессы не наследуют состояние веб-сервера (модели, соединения)
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_parser_process,
+            initargs=(settings.PARSER_MEMORY_LIMIT_MB,),
+            **kwargs,
+        )
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if (
+            self._executor is not None
+            and sys.version_info < (3, 11)
+            and self._submitted >= settings.PARSER_WORKERS * settings.PARSER_MAX_TASKS_PER_CHILD
+        ):
+            # Выполняющиеся и уже отправленные задачи старый пул доделает, новые пойдут в новый
+            self._executor.shutdown(wait=False)
+            self._executor = None
+            logging.info("[Parsing] Пул процессов парсинга заменен после лимита задач.")
+        if self._executor is None:
+            self._executor = self._create_executor()
+            self._submitted = 0
+        self._submitted += 1
+        return self._executor
+
+    async def _restart(self, executor: ProcessPoolExecutor) -> None:
+        """Принудительно завершает процессы пула и, если это текущий пул, создает новый."""
+        if self._restart_lock is None:
+            self._restart_lock = asyncio.Lock()
+        async with self._restart_lock:
+            if executor is self._executor:
+                self._executor = None
+                self.restarts += 1
+                logging.warning("[Parsing] Пул процессов парсинга перезапущен.")
+            # У ProcessPoolExecutor нет публичного способа прервать выполняющуюся задачу,
+            # поэтому завершаем его процессы напрямую. Пул мог уже быть пересоздан другой
+            # задачей или заменен после лимита задач — тогда повторное завершение безвредно
+            for process in list((getattr(executor, "_processes", None) or {}).values()):
+                process.kill()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def parse(self, suffix: str, content: bytes, timeout: Optional[float] = None) -> str:
+        """
+        Извлекает текст документа в отдельном процессе.
+
+        Raises:
+            ParsingTimeoutError: если парсинг не уложился в таймаут.
+            ValueError: если файл слишком большой или формат не поддерживается.
+        """
+        try:
+            text = await self._parse(suffix, content, timeout)
+        except Exception:
+            self.failed += 1
+            raise
+        self.parsed += 1
+        return text
+
+    async def _parse(self, suffix: str, content: bytes, timeout: Optional[float]) -> str:
+        max_bytes = settings.PARSER_MAX_FILE_MB * 1024 * 1024
+        if len(content) > max_bytes:
+            raise ValueError(f"Файл превышает допустимый размер {settings.PARSER_MAX_FILE_MB} МБ.")
+        if suffix == ".pdf":
+            return await self._parse_pdf(content, timeout)
+        return await self._run(parse_document, suffix, bytes(content), timeout=timeout)
+
+    async def _run(self, func: Callable[..., Any], *args: Any, timeout: Optional[float] = None) -> Any:
+        """Выполняет функцию в пуле процессов с жестким таймаутом."""
+        timeout = timeout or settings.PARSER_FILE_TIMEOUT
+        loop = asyncio.get_running_loop()
+
+        # Одна повторная попытка, если пул был перезапущен из-за чужого зависшего файла
+        for attempt in range(2):
+            executor = self._get_executor()
+            try:
+                future = loop.run_in_executor(executor, func, *args)
+                return await asyncio.wait_for(future, timeout=timeout)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                await self._restart(executor)
+                raise ParsingTimeoutError(f"Превышено время парсинга файла ({timeout:.0f} с).")
+            except BrokenProcessPool:
+                await self._restart(executor)
+                if attempt == 1:
+                    raise
+        raise BrokenProcessPool("Пул процессов парсинга недоступен.")
+
+    async def _parse_pdf(self, content: bytes, timeout: Optional[float]) -> str:
+        """Разбирает PDF в пределах бюджета страниц и символов, деля страницы между процессами."""
+        content = bytes(content)
+        max_pages = settings.PDF_MAX_PAGES or None
+        max_chars = settings.PDF_MAX_CHARS or None
+        pages_per_task = max(1, settings.PDF_PAGES_PER_TASK)
+        split = len(content) >= settings.PDF_SPLIT_MIN_KB * 1024
+        started = time.perf_counter()
+
+        if split:
+            first_stop = min(pages_per_task, max_pages) if max_pages else pages_per_task
+        else:
+            # Небольшой файл дешевле разобрать целиком, чем передавать его байты в каждую часть
+            first_stop = max_pages
+        first = await self._run(parse_pdf_pages, content, 0, first_stop, max_chars, timeout=timeout)
+        page_count, pages = first["page_count"], list(first["pages"])
+        page_limit = min(page_count, max_pages) if max_pages else page_count
+
+        collected = sum(len(text) for _, text, _ in pages)
+        # Остальные страницы нужны, только если первая часть не исчерпала бюджет символов
+        if split and first_stop < page_limit and not (max_chars and collected >= max_chars):
+            ranges = [(start, min(start + pages_per_task, page_limit))
+                      for start in range(first_stop, page_limit, pages_per_task)]
+            # Каждой части передаем остаток бюджета: больше текста, чем осталось, одной части не нужно
+            remaining = max_chars - collected if max_chars else None
+            parts = await asyncio.gather(*(
+                self._run(parse_pdf_pages, content, start, stop, remaining, timeout=timeout)
+                for start, stop in ranges
+            ))
+            for part in parts:
+                pages.extend(part["pages"])
+
+        # Собираем текст по порядку страниц, пока не исчерпан бюджет символов
+        page_texts, collected = [], 0
+        for _, text, _ in sorted(pages, key=lambda page: page[0]):
+            if max_chars and collected + len(text) > max_chars:
+                page_texts.append(text[:max_chars - collected])
+                break
+            page_texts.append(text)
+            collected += len(text)
+
+        self._record_pdf_timing(pages, page_count, time.perf_counter() - started)
+        return join_pdf_pages(page_texts)
+
+    def _record_pdf_timing(self, pages: Sequence[Tuple[int, str, float]], page_count: int, elapsed: float) -> None:
+        """Учитывает время разбора страниц PDF в метриках и логирует самые медленные страницы."""
+        self.pdf_pages_parsed += len(pages)
+        self.pdf_pages_skipped += page_count - len(pages)
+        page_seconds = [seconds for _, _, seconds in pages]
+        self.pdf_page_seconds += sum(page_seconds)
+        self.pdf_slowest_page_seconds = max([self.pdf_slowest_page_seconds, *page_seconds])
+        slowest = sorted(pages, key=lambda page: page[2], reverse=True)[:3]
+        logging.info(
+            f"[Parsing] PDF: разобрано страниц {len(pages)} из {page_count} за {elapsed:.2f} с; "
+            "самые медленные: " + ", ".join(f"стр. {index + 1} — {seconds:.3f} с" for index, _, seconds in slowest)
+        )
+
+    async def parse_many(self, items: Sequence[Tuple[str, bytes]]) -> List[ParseResult]:
+        """Параллельно парсит несколько файлов. items — пары (расширение, содержимое)."""
+        async def _safe_parse(suffix: str, content: bytes) -> ParseResult:
+            try:
+                return ParseResult(text=await self.parse(suffix, content))
+            except MemoryError:
+                return ParseResult(error="Превышен лимит памяти при парсинге файла.")
+            except Exception as e:
+                return ParseResult(error=str(e) or type(e).__name__)
+
+        return await asyncio.gather(*(_safe_parse(suffix, content) for suffix, content in items))
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        """Возвращает счетчики пула для метрик."""
+        return {
+            "workers": settings.PARSER_WORKERS,
+            "parsed": self.parsed,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "restarts": self.restarts,
+            "pdf": {
+                "pages_parsed": self.pdf_pages_parsed,
+                "pages_skipped": self.pdf_pages_skipped,
+                "avg_page_seconds": round(self.pdf_page_seconds / self.pdf_pages_parsed, 4) if self.pdf_pages_parsed else 0.0,
+                "slowest_page_seconds": round(self.pdf_slowest_page_seconds, 4),
+            },
+        }
+
+
+# Единый пул парсинга для всего приложения
+parsing_pool = ParsingPool()
@@ -0,0 +1,123 @@
+"""
+ChatOllama поверх общего пула HTTP-соединений.
+
+Стандартный ChatOllama из langchain_community открывает новую
+aiohttp-сессию (и новое TCP-соединение) на каждый асинхронный вызов.
+PooledChatOllama отправляет те же запросы через общий httpx-клиент `ollama`
+из services/http_clients.py, переиспользуя keep-alive соединения.
+
+Если настроено несколько серверов Ollama (services/ollama_backends.py),
+каждый запрос уходит на наименее загруженный исправный сервер; при ошибке
+соединения до начала ответа запрос повторяется на другом сервере.
+
+Каждый запрос занимает место в адаптивном лимите провайдера `ollama`
+(services/llm_limits.py); время до первого фрагмента ответа служит
+для лимита замером задержки.
+"""
+
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+import httpx
+from langchain_community.chat_models import ChatOllama
+from langchain_community.llms.ollama import OllamaEndpointNotFoundError
+
+from services.http_clients import http_clients
+from services.llm_limits import llm_slot, mark_first_token
+from services.ollama_backends import ollama_backends
+
+
+class OllamaServerError(ValueError):
+    """Ошибка сервера Ollama (HTTP 5xx): запрос можно повторить на другом сервере."""
+
+
+class PooledChatOllama(ChatOllama):
+    """ChatOllama, выполняющий асинхронные запросы через общий пул соединений."""
+
+    async def _acreate_stream(
+        self,
+        api_url: str,
+        payload: Any,
+        stop: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[str]:
+        # Параметры запроса собираются так же, как в базовой реализации
+        if self.stop is not None and stop is not None:
+            raise ValueError("`stop` found in both the input and default params.")
+        elif self.stop is not None:
+            stop = self.stop
+
+        params = self._default_params
+        for key in self._default_params:
+            if key in kwargs:
+                params[key] = kwargs[key]
+        if "options" in kwargs:
+            params["options"] = kwargs["options"]
+        else:
+            params["options"] = {
+                **params["options"],
+                "stop": stop,
+                **{k: v for k, v in kwargs.items() if k not in self._default_params},
+            }
+
+        if payload.get("messages"):
+            request_payload = {"messages": payload.get("messages", []), **params}
+        else:
+            request_payload = {"prompt": payload.get("prompt"), "images": payload.get("images", []), **params}
+
+        request_kwargs: Dict[str, Any] = {}
+        if self.timeout is not None:
+            request_kwargs["timeout"] = self.timeout
+        # httpx понимает только кортеж (логин, пароль); вызываемые auth в стиле requests не поддерживаются
+        if isinstance(self.auth, tuple):
+            request_kwargs["auth"] = self.auth
+
+        async with llm_slot("ollama"):
+            async for line in self._route(api_url, request_payload, request_kwargs):
+                yield line
+
+    async def _route(self, api_url: str, request_payload: Dict[str, Any], request_kwargs: Dict[str, Any]) -> AsyncIterator[str]:
+        # Без серверов для этой модели запрос идет на адрес по умолчанию
+        if not ollama_backends.backends_for(self.model):
+            async for line in self._stream_lines(api_url, request_payload, request_kwargs):
+                yield line
+            return
+
+        # Путь запроса сохраняется, меняется только сервер
+        path = api_url[len(self.base_url.rstrip("/")):] if api_url.startswith(self.base_url) else "/api/chat"
+        tried: Set[str] = set()
+        while True:
+            async with ollama_backends.acquire(self.model, exclude=tried) as backend:
+                started = False
+                try:
+                    async for line in self._stream_lines(backend.url + path, request_payload, request_kwargs):
+                        started = True
+                        yield line
+                    ollama_backends.record_success(backend)
+                    return
+                except (httpx.TransportError, OllamaServerError) as e:
+                    ollama_backends.record_failure(backend, e)
+                    tried.add(backend.url)
+                    # Ответ уже начал передаваться или других серверов нет — повторять нельзя
+                    if started or not ollama_backends.candidates(self.model, tried):
+                        raise
+                    logging.warning(f"[Ollama] Ошибка сервера {backend.url}: {e}. Повторяю запрос на другом сервере.")
+
+    async def _stream_lines(self, url: str, request_payload: Dict[str, Any], request_kwargs: Dict[str, Any]) -> AsyncIterator[str]:
+        async with http_clients.get("ollama").stream(
+            "POST",
+            url,
+            headers={"Content-Type": "application/json", **(self.headers if isinstance(self.headers, dict) else {})},
+            json=request_payload,
+            **request_kwargs,
+        ) as response:
+            if response.status_code != 200:
+                if response.status_code == 404:
+                    raise OllamaEndpointNotFoundError("Ollama call failed with status code 404.")
+                detail = (await response.aread()).decode("utf-8", errors="ignore")
+                error_type = OllamaServerError if response.status_code >= 500 else ValueError
+                raise error_type(f"Ollama call failed with status code {response.status_code}. Details: {detail}")
+            async for line in response.aiter_lines():
+                if line:
+                    mark_first_token()
+                    yield line
@@ -0,0 +1,127 @@
+"""
+Отбор разделов резюме в пределах бюджета токенов.
+
+Длинные резюме раздувают промпты скоринга, анализа интервью и симуляции,
+а небольшие модели Ollama заметно замедляются с ростом контекста. Если
+резюме не помещается в бюджет цепочки (`RESUME_TOKEN_BUDGETS`), оно
+делится на разделы по заголовкам (опыт, навыки, образование, ...), каждый
+раздел оценивается по BM25 относительно текста вакансии, и в промпт
+попадают самые релевантные разделы в исходном порядке. Шапка резюме
+(текст до первого заголовка: имя, должность, контакты) сохраняется всегда.
+"""
+
+import logging
+import re
+from dataclasses import dataclass
+from typing import List, Optional
+
+from core.config import settings
+from services.batch_scoring import CHARS_PER_TOKEN, estimate_tokens
+from services.lexical_prefilter import BM25Index
+
+# Заголовки разделов резюме и их канонические имена
+SECTION_HEADINGS = {
+    "summary": ("о себе", "обо мне", "summary", "profile", "about me", "цель", "objective"),
+    "experience": ("опыт работы", "опыт", "трудовая деятельность", "места работы", "experience",
+                   "work experience", "employment", "professional experience"),
+    "projects": ("проекты", "projects", "портфолио", "portfolio"),
+    "skills": ("навыки", "ключевые навыки", "профессиональные навыки", "технологии", "стек",
+               "стек технологий", "skills", "technical skills", "technologies", "tech stack"),
+    "education": ("образование", "education"),
+    "courses": ("курсы", "повышение квалификации", "сертификаты", "courses", "certifications", "certificates"),
+    "languages": ("языки", "знание языков", "languages"),
+    "contacts": ("контакты", "контактная информация", "contacts", "contact information"),
+    "additional": ("дополнительная информация", "дополнительно", "additional information", "hobbies", "хобби"),
+}
+HEADER_SECTION = "header"
+
+_HEADING_PATTERN = re.compile(
+    r"^\s*(?:[#*•\-\d.]+\s*)?(" + "|".join(
+        sorted((re.escape(heading) for headings in SECTION_HEADINGS.values() for heading in headings),
+               key=len, reverse=True)
+    ) + r")\s*[:.]?\s*$",
+    re.IGNORECASE
+)
+_HEADING_NAMES = {heading: name for name, headings in SECTION_HEADINGS.items() for heading in headings}
+
+# Раздел, урезанный под остаток бюджета, имеет смысл, только если от него останется хотя бы столько токенов
+MIN_PARTIAL_SECTION_TOKENS = 60
+
+
+@dataclass
+class ResumeSection:
+    """Раздел резюме."""
+    name: str
+    text: str
+    position: int
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.text)
+
+
+def split_sections(resume_text: str) -> List[ResumeSection]:
+    """Делит резюме на разделы по строкам-заголовкам. Текст до первого заголовка — раздел 'header'."""
+    sections: List[ResumeSection] = []
+    name, lines = HEADER_SECTION, []
+    for line in (resume_text or "").split("\n"):
+        match = _HEADING_PATTERN.match(line) if len(line) <= 60 else None
+        if match:
+            if any(part.strip() for part in lines):
+                sections.append(ResumeSection(name, "\n".join(lines).strip(), len(sections)))
+            name, lines = _HEADING_NAMES[match.group(1).lower()], [line.strip()]
+        else:
+            lines.append(line)
+    if any(part.strip() for part in lines):
+        sections.append(ResumeSection(name, "\n".join(lines).strip(), len(sections)))
+    return sections
+
+
+def get_resume_token_budget(chain: str) -> int:
+    """Бюджет токенов на текст резюме для цепочки (0 — без ограничения)."""
+    return settings.RESUME_TOKEN_BUDGETS.get(chain, 0)
+
+
+def fit_resume_to_budget(resume_text: str, vacancy_text: str, chain: str, budget: Optional[int] = None) -> str:
+    """
+    Сокращает резюме до самых релевантных вакансии разделов, если оно не помещается в бюджет.
+
+    Args:
+        resume_text: Полный текст резюме.
+        vacancy_text: Текст вакансии — запрос для оценки релевантности разделов.
+        chain: Имя цепочки из `RESUME_TOKEN_BUDGETS` ('resume_scorer', 'analyst', 'simulation').
+        budget: Явный бюджет в токенах (по умолчанию из настроек цепочки).
+    """
+    budget = get_resume_token_budget(chain) if budget is None else budget
+    if not budget or not resume_text or estimate_tokens(resume_text) <= budget:
+        return resume_text
+
+    sections = split_sections(resume_text)
+    header = [section for section in sections if section.name == HEADER_SECTION]
+    body = [section for section in sections if section.name != HEADER_SECTION]
+    relevance = BM25Index([section.text for section in body]).score(vacancy_text) if body else []
+
+    selected: List[ResumeSection] = []
+    remaining = budget
+    # Шапка идет первой в любом случае, остальные разделы — по убыванию релевантности
+    ranked = header + [body[i] for i in sorted(range(len(body)), key=lambda i: relevance[i], reverse=True)]
+    for section in ranked:
+        if section.tokens <= remaining:
+            selected.append(section)
+            remaining -= section.tokens
+        elif remaining >= MIN_PARTIAL_SECTION_TOKENS:
+            cut = section.text[:remaining * CHARS_PER_TOKEN].rsplit("\n", 1)[0]
+            selected.append(ResumeSection(section.name, cut + "\n[...]", section.position))
+            remaining = 0
+
+    kept = {section.position for section in selected}
+    omitted = [section.text.split("\n", 1)[0] for section in sections if section.position not in kept]
+    parts = [section.text for section in sorted(selected, key=lambda section: section.position)]
+    if omitted:
+        parts.append("[Опущены разделы, не относящиеся к вакансии: " + "; ".join(omitted) + "]")
+    fitted = "\n\n".join(parts)
+    logging.info(
+        f"[Разделы резюме] {chain}: ~{estimate_tokens(resume_text)} → ~{estimate_tokens(fitted)} токенов, "
+        f"оставлено разделов {len(selected)} из {len(sections)}."
+    )
+    return fitted
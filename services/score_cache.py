@@ -0,0 +1,168 @@
+"""
+Персистентный кэш оценок резюме.
+
+Ключ кэша — SHA-256 от нормализованного текста вакансии, текста резюме,
+канонического JSON критериев оценки, имени модели и версии промпта скоринга. Записи
+хранятся в таблице `score_cache` основной базы SQLite. Устаревшие записи
+(старше `SCORE_CACHE_TTL_SECONDS`) не отдаются и удаляются при очистке,
+а при превышении `SCORE_CACHE_MAX_ENTRIES` вытесняются самые давно
+использованные записи.
+
+Ошибки кэша никогда не прерывают скоринг: они только логируются.
+"""
+
+import datetime
+import hashlib
+import json
+import logging
+from typing import Any, Dict, Iterable, Optional
+
+from sqlalchemy import delete, func, select, update
+
+from core.config import settings
+from core.database import AsyncSessionFactory
+from core.schemas import ScoreCacheEntry
+
+# Через сколько записей в кэш запускать очистку устаревших и лишних записей
+EVICTION_EVERY_N_WRITES = 100
+
+
+def normalize_text(text: str) -> str:
+    """Нормализует текст для ключа кэша: схлопывает пробельные символы."""
+    return " ".join((text or "").split())
+
+
+def build_score_cache_key(
+    vacancy_text: str,
+    resume_text: str,
+    criteria: Optional[Dict[str, Any]],
+    model_name: str,
+    prompt_version: str
+) -> str:
+    """Строит контентный ключ кэша для пары вакансия-резюме."""
+    criteria_json = json.dumps(criteria or {}, ensure_ascii=False, sort_keys=True)
+    parts = [normalize_text(vacancy_text), normalize_text(resume_text), criteria_json, model_name, prompt_version]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class ScoreCache:
+    """Кэш оценок резюме поверх таблицы `score_cache` с подсчетом попаданий."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return settings.SCORE_CACHE_ENABLED
+
+    def _expiry_threshold(self) -> datetime.datetime:
+        return datetime.datetime.utcnow() - datetime.timedelta(seconds=settings.SCORE_CACHE_TTL_SECONDS)
+
+    async def get_many(self, keys: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Возвращает словарь {ключ: результат} для найденных и не устаревших записей."""
+        keys = list(set(keys))
+        if not self.enabled or not keys:
+            return {}
+        try:
+            async with AsyncSessionFactory() as session:
+                result = await session.execute(
+                    select(ScoreCacheEntry.cache_key, ScoreCacheEntry.result_json)
+                    .where(ScoreCacheEntry.cache_key.in_(keys))
+                    .where(ScoreCacheEntry.created_at >= self._expiry_threshold())
+                )
+                found = {row.cache_key: row.result_json for row in result}
+                if found:
+                    await session.execute(
+                        update(ScoreCacheEntry)
+                        .where(ScoreCacheEntry.cache_key.in_(list(found)))
+                        .values(
+                            hit_count=ScoreCacheEntry.hit_count + 1,
+                            last_accessed_at=datetime.datetime.utcnow()
+                        )
+                    )
+                    await session.commit()
+        except Exception as e:
+            logging.error(f"[ScoreCache] Ошибка чтения кэша оценок: {e}", exc_info=True)
+            found = {}
+
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        if found:
+            logging.info(f"[ScoreCache] Найдено в кэше: {len(found)} из {len(keys)}.")
+        return found
+
+    async def put(self, key: str, result: Dict[str, Any], model_name: str, prompt_version: str) -> None:
+        """Сохраняет (или перезаписывает) оценку в кэше."""
+        if not self.enabled:
+            return
+        try:
+            async with AsyncSessionFactory() as session:
+                now = datetime.datetime.utcnow()
+                await session.merge(ScoreCacheEntry(
+                    cache_key=key,
+                    result_json=result,
+                    model_name=model_name,
+                    prompt_version=prompt_version,
+                    hit_count=0,
+                    created_at=now,
+                    last_accessed_at=now
+                ))
+                await session.commit()
+            self.writes += 1
+        except Exception as e:
+            logging.error(f"[ScoreCache] Ошибка записи в кэш оценок: {e}", exc_info=True)
+            return
+
+        if self.writes % EVICTION_EVERY_N_WRITES == 0:
+            await self.evict()
+
+    async def evict(self) -> int:
+        """Удаляет устаревшие записи и вытесняет самые давно использованные сверх лимита."""
+        removed = 0
+        try:
+            async with AsyncSessionFactory() as session:
+                expired = await session.execute(
+                    delete(ScoreCacheEntry).where(ScoreCacheEntry.created_at < self._expiry_threshold())
+                )
+                removed += expired.rowcount or 0
+
+                total = await session.scalar(select(func.count()).select_from(ScoreCacheEntry))
+                overflow = (total or 0) - settings.SCORE_CACHE_MAX_ENTRIES
+                if overflow > 0:
+                    oldest = (
+                        select(ScoreCacheEntry.cache_key)
+                        .order_by(ScoreCacheEntry.last_accessed_at.asc())
+                        .limit(overflow)
+                    )
+                    lru = await session.execute(
+                        delete(ScoreCacheEntry).where(ScoreCacheEntry.cache_key.in_(oldest))
+                    )
+                    removed += lru.rowcount or 0
+                await session.commit()
+        except Exception as e:
+            logging.error(f"[ScoreCache] Ошибка очистки кэша оценок: {e}", exc_info=True)
+            return 0
+
+        self.evictions += removed
+        if removed:
+            logging.info(f"[ScoreCache] Удалено записей из кэша оценок: {removed}.")
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает счетчики кэша для метрик."""
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "writes": self.writes,
+            "evictions": self.evictions,
+        }
+
+
+# Единый экземпляр кэша для всего приложения
+score_cache = ScoreCache()
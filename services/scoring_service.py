@@ -0,0 +1,511 @@
+"""
+Сервис конкурентного скоринга резюме.
+
+Оценивает пакет резюме параллельно, соблюдая лимит одновременных запросов
+к LLM-провайдеру, таймаут на каждое резюме и изоляцию ошибок: сбой одного
+резюме не влияет на остальные.
+"""
+
+import asyncio
+import heapq
+import logging
+import time
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
+
+from core.config import settings
+from core.models import ResumeScoreOutput
+from services.ai_services import resume_scorer_chain, resume_batch_scorer_chain, apredict_json
+from services.llm_limits import llm_slot
+from services.score_cache import score_cache, build_score_cache_key
+from services.lexical_prefilter import prefilter_resumes
+from services.weighted_scoring import criteria_for_prompt, serialize_criteria, apply_weighted_score
+from services.dedup import find_batch_duplicates, stored_resume_index
+from services.resume_sections import fit_resume_to_budget, get_resume_token_budget
+from services.batch_scoring import (
+    estimate_tokens, make_label, format_resumes_block, pack_batches, parse_batch_response
+)
+from prompts.ranking_prompts import (
+    RESUME_SCORER_PROMPT_VERSION, RESUME_BATCH_SCORER_PROMPT, RESUME_BATCH_SCORER_PROMPT_VERSION
+)
+
+# resume_scorer_chain работает через Ollama
+SCORING_PROVIDER = "ollama"
+
+
+def build_error_result(summary: str) -> Dict[str, Any]:
+    """Формирует результат скоринга для резюме, которое не удалось оценить."""
+    return {
+        "score": -1,
+        "summary": summary,
+        "keywords": ["ОШИБКА"],
+    }
+
+
+def build_lexical_result(normalized_score: float, matched_terms: List[str]) -> Dict[str, Any]:
+    """Формирует дешевую лексическую оценку для резюме, отсеянного предфильтром."""
+    return {
+        "score": round(settings.PREFILTER_LEXICAL_SCORE_CAP * normalized_score),
+        "summary": "Резюме отсеяно лексическим фильтром (BM25) и не оценивалось ИИ.",
+        "keywords": matched_terms,
+        "prefiltered": True,
+    }
+
+
+def build_stored_duplicate_result(candidate_id: int, cached_result: Dict[str, Any]) -> Dict[str, Any]:
+    """Формирует результат для резюме, совпавшего с ранее оцененным ИИ кандидатом той же вакансии."""
+    result = {
+        "score": cached_result["score"],
+        "summary": f"Почти дубликат ранее оцененного кандидата ID {candidate_id}: оценка переиспользована без обращения к ИИ.",
+        "keywords": [],
+        "duplicate_of_candidate": candidate_id,
+    }
+    if cached_result.get("subscores"):
+        result["subscores"] = cached_result["subscores"]
+    return result
+
+
+def sort_scored_resumes(scored_resumes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Сортирует результаты скоринга по убыванию оценки."""
+    return sorted(scored_resumes, key=lambda x: x.get('score', 0), reverse=True)
+
+
+async def _score_single_resume(
+    vacancy_text: str,
+    resume: Dict[str, Any],
+    criteria_json: str,
+    position: str,
+    provider: str,
+    timeout: float,
+    cache_key: Optional[str] = None,
+    prompt_version: str = RESUME_SCORER_PROMPT_VERSION
+) -> Dict[str, Any]:
+    """Оценивает одно резюме. Никогда не выбрасывает исключений."""
+    resume_id = resume.get("id")
+    resume_text = resume.get("text")
+
+    if not resume_text:
+        logging.warning(f"[Скоринг {position}] Пустой текст для резюме ID: {resume_id}. Пропуск.")
+        return build_error_result("Ошибка: Текст резюме пуст.")
+
+    try:
+        # Скоринг — массовая работа: ждет места в лимите без срока, таймаут считается с начала запроса
+        async with llm_slot(provider, bulk=True):
+            logging.info(f"[Скоринг {position}] Отправка резюме ID: {resume_id} в LLM...")
+            score_data = await asyncio.wait_for(
+                apredict_json(
+                    "resume_scorer",
+                    resume_scorer_chain,
+                    ResumeScoreOutput,
+                    vacancy_text=vacancy_text,
+                    resume_text=resume_text,
+                    criteria_json=criteria_json
+                ),
+                timeout=timeout
+            )
+        logging.info(f"[Скоринг {position}] Резюме ID: {resume_id} успешно оценено.")
+        if cache_key:
+            await score_cache.put(cache_key, score_data, settings.LLM_ANALYST_MODEL, prompt_version)
+        return score_data
+    except asyncio.TimeoutError:
+        error_summary = f"Ошибка анализа ИИ: превышено время ожидания ответа ({timeout:.0f} с)."
+        logging.error(f"[Скоринг {position}] Таймаут при обработке резюме ID: {resume_id}.")
+        return build_error_result(error_summary)
+    except Exception as e:
+        error_summary = f"Ошибка анализа ИИ: {e}"
+        logging.error(f"[Скоринг {position}] Сбой обработки резюме ID: {resume_id}. Причина: {error_summary}", exc_info=True)
+        return build_error_result(error_summary)
+
+
+async def _score_batch(
+    vacancy_text: str,
+    batch: List[Tuple[int, Dict[str, Any]]],
+    criteria_json: str,
+    total: int,
+    provider: str,
+    timeout: float,
+    cache_keys: List[Optional[str]],
+    prompt_version: str
+) -> List[Tuple[int, Dict[str, Any]]]:
+    """
+    Оценивает пакет резюме одним запросом к LLM. Никогда не выбрасывает исключений.
+
+    Корректные записи ответа принимаются сразу. Резюме, для которых ответ
+    отсутствует или поврежден, делятся пополам и оцениваются повторно,
+    пока пакет не сократится до одного резюме — оно оценивается обычным промптом.
+
+    Returns:
+        Пары (индекс резюме во входном списке, результат скоринга).
+    """
+    if len(batch) == 1:
+        index, resume = batch[0]
+        score_data = await _score_single_resume(
+            vacancy_text, resume, criteria_json, f"{index + 1}/{total}", provider, timeout,
+            cache_keys[index], prompt_version
+        )
+        return [(index, score_data)]
+
+    labeled = {make_label(index): (index, resume) for index, resume in batch}
+    position = ", ".join(labeled)
+    parsed: Dict[str, Dict[str, Any]] = {}
+    try:
+        async with llm_slot(provider, bulk=True):
+            logging.info(f"[Скоринг пакета {position}] Отправка {len(batch)} резюме в LLM одним запросом...")
+            data = await asyncio.wait_for(
+                apredict_json(
+                    "resume_batch_scorer",
+                    resume_batch_scorer_chain,
+                    vacancy_text=vacancy_text,
+                    resumes_block=format_resumes_block([(index, resume["text"]) for index, resume in batch]),
+                    criteria_json=criteria_json
+                ),
+                timeout=timeout * len(batch)
+            )
+        parsed = parse_batch_response(data, list(labeled))
+    except asyncio.TimeoutError:
+        logging.error(f"[Скоринг пакета {position}] Таймаут при обработке пакета.")
+    except Exception as e:
+        logging.error(f"[Скоринг пакета {position}] Некорректный ответ модели: {e}")
+
+    results = []
+    for label, score_data in parsed.items():
+        index, _ = labeled[label]
+        if cache_keys[index]:
+            await score_cache.put(cache_keys[index], score_data, settings.LLM_ANALYST_MODEL, prompt_version)
+        results.append((index, score_data))
+
+    missing = [item for label, item in labeled.items() if label not in parsed]
+    if missing:
+        logging.warning(f"[Скоринг пакета {position}] Нет корректной оценки для {len(missing)} резюме, повторная оценка частями.")
+        middle = max(1, len(missing) // 2)
+        halves = [part for part in (missing[:middle], missing[middle:]) if part]
+        for sub_results in await asyncio.gather(*(
+            _score_batch(vacancy_text, part, criteria_json, total, provider, timeout, cache_keys, prompt_version)
+            for part in halves
+        )):
+            results.extend(sub_results)
+    return results
+
+
+async def iter_scored_resumes(
+    vacancy_text: str,
+    resumes: List[Dict[str, Any]],
+    weights: Optional[Dict[str, Any]] = None,
+    provider: str = SCORING_PROVIDER,
+    timeout: Optional[float] = None,
+    prefilter: Optional[bool] = None,
+    batch: Optional[bool] = None,
+    dedup: Optional[bool] = None
+) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Конкурентно оценивает резюме и отдает результаты по мере готовности.
+
+    Args:
+        vacancy_text: Текст вакансии.
+        resumes: Список словарей, где каждый словарь содержит 'id' и 'text' резюме.
+        weights: Веса критериев оценки (опционально).
+        provider: Имя LLM-провайдера, лимит которого нужно соблюдать.
+        timeout: Таймаут на одно резюме в секундах (по умолчанию из настроек).
+        prefilter: Включить лексический предфильтр BM25 (по умолчанию из настроек).
+        batch: Оценивать несколько резюме одним запросом (по умолчанию из настроек).
+        dedup: Оценивать почти дубликаты один раз (по умолчанию из настроек). Результат
+            дубликата внутри пакета содержит `duplicate_of` (id первого резюме группы),
+            а совпавшего с сохраненным кандидатом — `duplicate_of_candidate`.
+
+    Yields:
+        Пары (индекс резюме во входном списке, результат скоринга).
+    """
+    criteria_json = serialize_criteria(weights)
+    timeout = timeout or settings.RESUME_SCORING_TIMEOUT
+    total = len(resumes)
+    if batch is None:
+        batch = settings.RESUME_BATCH_SCORING_ENABLED
+    prompt_version = f"batch-{RESUME_BATCH_SCORER_PROMPT_VERSION}" if batch else RESUME_SCORER_PROMPT_VERSION
+    # Оценка зависит от того, какие разделы резюме попали в промпт, поэтому бюджет входит в ключ кэша
+    resume_budget = get_resume_token_budget("resume_scorer")
+    if resume_budget:
+        prompt_version += f"-s{resume_budget}"
+
+    # Повторные оценки той же пары вакансия-резюме берем из кэша без обращения к LLM.
+    # Подоценки не зависят от весов, поэтому в ключ входят только описания критериев.
+    criteria = criteria_for_prompt(weights)
+    cache_keys = [
+        build_score_cache_key(vacancy_text, resume["text"], criteria, settings.LLM_ANALYST_MODEL, prompt_version)
+        if resume.get("text") else None
+        for resume in resumes
+    ]
+
+    # Почти дубликаты внутри пакета оцениваем один раз: результат первого резюме группы копируется остальным
+    if dedup is None:
+        dedup = settings.DEDUP_ENABLED
+    duplicate_of: Dict[int, int] = {}
+    if dedup:
+        duplicate_of = find_batch_duplicates(
+            [resume.get("text") or "" for resume in resumes], settings.DEDUP_MAX_HAMMING
+        )
+    members: Dict[int, List[int]] = {}
+    for duplicate, representative in duplicate_of.items():
+        members.setdefault(representative, []).append(duplicate)
+
+    cached = await score_cache.get_many(
+        key for i, key in enumerate(cache_keys) if key and i not in duplicate_of
+    )
+
+    # Резюме, совпавшие с уже оцененными кандидатами той же вакансии, получают их оценку.
+    # Оценка берется из кэша по тексту сохраненного кандидата, поэтому переиспользуется
+    # только результат ИИ с теми же критериями, моделью и версией промпта
+    stored_results: Dict[int, Dict[str, Any]] = {}
+    if dedup:
+        try:
+            matches = await stored_resume_index.find_stored_duplicates(
+                vacancy_text,
+                {
+                    i: resume["text"] for i, resume in enumerate(resumes)
+                    if cache_keys[i] and cache_keys[i] not in cached and i not in duplicate_of
+                },
+                settings.DEDUP_MAX_HAMMING
+            )
+            stored_keys = {
+                match["candidate_id"]: build_score_cache_key(
+                    vacancy_text, match["resume_text"], criteria, settings.LLM_ANALYST_MODEL, prompt_version
+                )
+                for found in matches.values() for match in found
+            }
+            stored_cached = await score_cache.get_many(stored_keys.values())
+            for i, found in matches.items():
+                for match in found:
+                    cached_result = stored_cached.get(stored_keys[match["candidate_id"]])
+                    if cached_result is not None:
+                        stored_results[i] = build_stored_duplicate_result(match["candidate_id"], cached_result)
+                        break
+        except Exception as e:
+            logging.error(f"[Скоринг] Ошибка поиска дубликатов среди сохраненных кандидатов: {e}", exc_info=True)
+    if duplicate_of or stored_results:
+        logging.info(
+            f"[Скоринг] Почти дубликаты: {len(duplicate_of)} внутри пакета, "
+            f"{len(stored_results)} среди сохраненных кандидатов."
+        )
+    skipped = set(duplicate_of) | set(stored_results)
+
+    # Резюме, отсеянные предфильтром, получают лексическую оценку вместо вызова LLM
+    lexical_results: Dict[int, Dict[str, Any]] = {}
+    if prefilter is None:
+        prefilter = settings.PREFILTER_ENABLED
+    if prefilter and total > settings.PREFILTER_MIN_BATCH:
+        texts = [resume.get("text") or "" for resume in resumes]
+        filtered = prefilter_resumes(
+            vacancy_text, texts, settings.PREFILTER_TOP_N, settings.PREFILTER_MIN_SCORE_RATIO
+        )
+        for i, key in enumerate(cache_keys):
+            if key and key not in cached and i not in filtered.selected and i not in skipped:
+                lexical_results[i] = build_lexical_result(
+                    filtered.normalized_scores[i], filtered.index.matched_terms(vacancy_text, i)
+                )
+        logging.info(f"[Скоринг] Предфильтр BM25: в LLM отправлено {total - len(lexical_results)} из {total} резюме.")
+
+    async def _indexed(index: int, resume: Dict[str, Any]) -> List[Tuple[int, Dict[str, Any]]]:
+        position = f"{index + 1}/{total}"
+        score_data = await _score_single_resume(
+            vacancy_text, resume, criteria_json, position, provider, timeout, cache_keys[index], prompt_version
+        )
+        return [(index, score_data)]
+
+    def _with_duplicates(index: int, score_data: Dict[str, Any]) -> List[Tuple[int, Dict[str, Any]]]:
+        pairs = [(index, score_data)]
+        for member in members.get(index, ()):
+            label = resumes[index].get("id") or resumes[index].get("filename") or index
+            pairs.append((member, {**score_data, "duplicate_of": label}))
+        return pairs
+
+    def _fit(resume: Dict[str, Any]) -> Dict[str, Any]:
+        # В LLM отправляются только самые релевантные вакансии разделы длинных резюме
+        if not resume.get("text"):
+            return resume
+        return {**resume, "text": fit_resume_to_budget(resume["text"], vacancy_text, "resume_scorer")}
+
+    pending = [
+        (i, _fit(resume)) for i, resume in enumerate(resumes)
+        if cache_keys[i] not in cached and i not in lexical_results and i not in skipped
+    ]
+    prompt_resumes = dict(pending)
+    if batch:
+        # Пустые резюме не попадают в пакеты и сразу получают ошибку через одиночный путь
+        batchable = [(i, resume) for i, resume in pending if resume.get("text")]
+        overhead = estimate_tokens(RESUME_BATCH_SCORER_PROMPT) + estimate_tokens(vacancy_text) + estimate_tokens(criteria_json)
+        batches = pack_batches(
+            [(i, resume["text"]) for i, resume in batchable],
+            overhead, settings.RESUME_BATCH_TOKEN_BUDGET, settings.RESUME_BATCH_MAX_SIZE
+        )
+        tasks = [
+            asyncio.ensure_future(_score_batch(
+                vacancy_text, [(i, prompt_resumes[i]) for i, _ in packed], criteria_json, total,
+                provider, timeout, cache_keys, prompt_version
+            ))
+            for packed in batches
+        ]
+        tasks += [asyncio.ensure_future(_indexed(i, resume)) for i, resume in pending if not resume.get("text")]
+        logging.info(f"[Скоринг] Пакетный режим: {len(batchable)} резюме упакованы в {len(batches)} запросов к LLM.")
+    else:
+        tasks = [asyncio.ensure_future(_indexed(i, resume)) for i, resume in pending]
+    try:
+        for i, key in enumerate(cache_keys):
+            if key in cached and i not in duplicate_of:
+                for pair in _with_duplicates(i, apply_weighted_score(dict(cached[key]), weights)):
+                    yield pair
+        for i, stored_result in stored_results.items():
+            for pair in _with_duplicates(i, apply_weighted_score(stored_result, weights)):
+                yield pair
+        for i, lexical_result in lexical_results.items():
+            for pair in _with_duplicates(i, lexical_result):
+                yield pair
+        for future in asyncio.as_completed(tasks):
+            for index, score_data in await future:
+                for pair in _with_duplicates(index, apply_weighted_score(score_data, weights)):
+                    yield pair
+    finally:
+        # Если потребитель прервал итерацию (например, клиент отключился), отменяем оставшиеся запросы
+        for task in tasks:
+            task.cancel()
+
+
+async def score_resumes(
+    vacancy_text: str,
+    resumes: List[Dict[str, Any]],
+    weights: Optional[Dict[str, Any]] = None,
+    provider: str = SCORING_PROVIDER,
+    timeout: Optional[float] = None,
+    prefilter: Optional[bool] = None,
+    batch: Optional[bool] = None
+) -> List[Dict[str, Any]]:
+    """
+    Конкурентно оценивает список резюме относительно вакансии.
+
+    Args:
+        vacancy_text: Текст вакансии.
+        resumes: Список словарей, где каждый словарь содержит 'id' и 'text' резюме.
+        weights: Веса критериев оценки (опционально).
+        provider: Имя LLM-провайдера, лимит которого нужно соблюдать.
+        timeout: Таймаут на одно резюме в секундах (по умолчанию из настроек).
+        prefilter: Включить лексический предфильтр BM25 (по умолчанию из настроек).
+        batch: Оценивать несколько резюме одним запросом (по умолчанию из настроек).
+
+    Returns:
+        Список результатов скоринга в том же порядке, что и входные резюме.
+    """
+    scored_resumes: List[Optional[Dict[str, Any]]] = [None] * len(resumes)
+    async for index, score_data in iter_scored_resumes(vacancy_text, resumes, weights, provider, timeout, prefilter, batch):
+        scored_resumes[index] = score_data
+    return scored_resumes
+
+
+class LiveTopK:
+    """Поддерживает актуальный топ-K результатов по мере поступления оценок."""
+
+    def __init__(self, k: int):
+        self.k = max(1, k)
+        self._heap: List[Tuple[float, int, Dict[str, Any]]] = []
+        self._counter = 0
+
+    def add(self, result: Dict[str, Any]) -> bool:
+        """Добавляет результат. Возвращает True, если состав топа изменился."""
+        score = result.get("score", 0)
+        if not isinstance(score, (int, float)):
+            score = 0
+        self._counter += 1
+        entry = (score, -self._counter, result)
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+            return True
+        if score > self._heap[0][0]:
+            heapq.heapreplace(self._heap, entry)
+            return True
+        return False
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Возвращает текущий топ, отсортированный по убыванию оценки."""
+        return [result for _, _, result in sorted(self._heap, reverse=True)]
+
+
+async def stream_ranking_events(
+    vacancy_text: str,
+    resumes: List[Dict[str, Any]],
+    weights: Optional[Dict[str, Any]] = None,
+    top_k: Optional[int] = None,
+    top_k_interval: Optional[float] = None,
+    prefilter: Optional[bool] = None,
+    batch: Optional[bool] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Оценивает резюме и отдает события ранжирования по мере готовности.
+
+    События:
+        - {"event": "result", "index", "scored", "total", "result"} — оценка одного резюме.
+          В результат попадают все поля входного резюме, кроме 'text'.
+        - {"event": "top_k", "scored", "total", "top"} — обновленный топ-K. Отправляется,
+          когда состав топа изменился, но не чаще, чем раз в `top_k_interval` секунд;
+          после последнего резюме отправляется всегда (если были изменения).
+
+    Args:
+        vacancy_text: Текст вакансии.
+        resumes: Список словарей с ключом 'text' и произвольными метаданными.
+        weights: Веса критериев оценки (опционально).
+        top_k: Размер топа (по умолчанию из настроек).
+        top_k_interval: Минимальный интервал между событиями топа в секундах.
+        prefilter: Включить лексический предфильтр BM25 (по умолчанию из настроек).
+        batch: Оценивать несколько резюме одним запросом (по умолчанию из настроек).
+    """
+    top_k = top_k or settings.RANKING_STREAM_TOP_K
+    top_k_interval = settings.RANKING_STREAM_TOPK_INTERVAL if top_k_interval is None else top_k_interval
+    tracker = LiveTopK(top_k)
+    total = len(resumes)
+    scored = 0
+    pending_top_update = False
+    last_top_emit = 0.0
+
+    async for index, score_data in iter_scored_resumes(vacancy_text, resumes, weights, prefilter=prefilter, batch=batch):
+        scored += 1
+        meta = {key: value for key, value in resumes[index].items() if key != "text"}
+        result = {**meta, **score_data}
+        yield {"event": "result", "index": index, "scored": scored, "total": total, "result": result}
+
+        pending_top_update = tracker.add(result) or pending_top_update
+        now = time.monotonic()
+        if pending_top_update and (scored == total or now - last_top_emit >= top_k_interval):
+            pending_top_update = False
+            last_top_emit = now
+            yield {"event": "top_k", "scored": scored, "total": total, "top": tracker.snapshot()}
+
+
+async def score_and_sort_resumes(
+    vacancy_text: str,
+    resumes: List[Dict],
+    weights: Optional[Dict[str, Any]] = None,
+    prefilter: Optional[bool] = None,
+    batch: Optional[bool] = None
+) -> List[Dict]:
+    """
+    Асинхронно оценивает список резюме относительно вакансии и сортирует их.
+    Обрабатывает ошибки для каждого резюме индивидуально.
+
+    Args:
+        vacancy_text: Текст вакансии.
+        resumes: Список словарей, где каждый словарь содержит 'id' и 'text' резюме.
+        weights: Веса критериев оценки (опционально).
+        prefilter: Включить лексический предфильтр BM25 (по умолчанию из настроек).
+        batch: Оценивать несколько резюме одним запросом (по умолчанию из настроек).
+
+    Returns:
+        Отсортированный список словарей с результатами скоринга.
+    """
+    resumes = [
+        {"id": resume_data.get("id", f"unknown_{i}"), "text": resume_data.get("text")}
+        for i, resume_data in enumerate(resumes, 1)
+    ]
+    scored = await score_resumes(vacancy_text, resumes, weights=weights, prefilter=prefilter, batch=batch)
+
+    scored_resumes = []
+    for resume_data, score_data in zip(resumes, scored):
+        score_data["id"] = resume_data["id"]
+        score_data["filename"] = resume_data["id"] # Для обратной совместимости с UI
+        scored_resumes.append(score_data)
+
+    return sort_scored_resumes(scored_resumes)
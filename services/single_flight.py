@@ -0,0 +1,61 @@
+"""
+Объединение одинаковых одновременных запросов (single-flight).
+
+Когда вакансия публикуется, десятки кандидатов почти одновременно
+начинают собеседование, и каждое начало вызывает одну и ту же цепочку
+LLM с одним и тем же текстом. Пока первый запрос выполняется, кэш еще
+пуст, поэтому все они уходят в Ollama. SingleFlight выполняет работу
+один раз на ключ: остальные вызовы с тем же ключом ждут результат
+уже выполняющейся задачи.
+
+Работа выполняется отдельной задачей: отмена одного из ожидающих
+(например, отключение WebSocket) не прерывает ее для остальных.
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+
+class SingleFlight:
+    """Выполняет не более одной задачи на ключ одновременно; остальные вызовы ждут ее результат."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Возвращает результат `factory()` для ключа, запуская работу, только если она еще не выполняется.
+
+        Исключение задачи получают все ожидающие ее вызовы.
+        """
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.create_task(factory())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+            logging.info(f"[SingleFlight] {self.name}: запрос объединен с уже выполняющимся.")
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # Исключение уже получено ожидающими; без этого вызова asyncio предупреждает о непрочитанном исключении
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает счетчики объединения запросов для метрик."""
+        calls = self.leaders + self.coalesced
+        return {
+            "executed": self.leaders,
+            "coalesced": self.coalesced,
+            "coalesced_share": round(self.coalesced / calls, 4) if calls else 0.0,
+            "in_flight": len(self._in_flight),
+        }
@@ -0,0 +1,189 @@
+"""
+Потоковая озвучка ответов ИИ-интервьюера в голосовых WebSocket-сессиях.
+
+Раньше ответ интервьюера целиком генерировался LLM, затем целиком
+синтезировался Silero и только потом отправлялся клиенту: кандидат слышал
+тишину на все время генерации и синтеза. Теперь токены LLM читаются
+потоком и режутся на предложения; каждое готовое предложение сразу
+синтезируется и отправляется клиенту, пока LLM продолжает генерировать
+следующие. Время до первого звука — примерно время генерации и синтеза
+одного предложения.
+
+Протокол сообщений клиенту:
+- `{"type": "audio_chunk", "data": <WAV в base64>, "text": <предложение>}` — очередной фрагмент речи;
+- `{"type": "text", "sender": "Interviewer", "data": <полный ответ>}` — после окончания генерации;
+- `{"type": "audio_end"}` — все фрагменты отправлены.
+"""
+
+import asyncio
+import logging
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+from fastapi import WebSocket
+
+from core.config import settings
+from services.voice_processing import silero_tts_instance, text_to_speech
+
+# Граница предложения: знак конца предложения, за которым следует пробел, или перевод строки
+_SENTENCE_END = re.compile(r"(?<=[.!?…])[\"»)\]]*\s+|\n+")
+# Точка, за которой может идти продолжение предложения: инициалы и сокращения вида "т.е.", "г."
+_ABBREVIATION = re.compile(r"(?:\b\w{1,2}\.)$")
+
+
+class SentenceSplitter:
+    """Накапливает токены LLM и выдает законченные предложения."""
+
+    def __init__(self, min_chars: Optional[int] = None, max_chars: Optional[int] = None):
+        self.min_chars = settings.VOICE_SENTENCE_MIN_CHARS if min_chars is None else min_chars
+        self.max_chars = settings.VOICE_SENTENCE_MAX_CHARS if max_chars is None else max_chars
+        self._buffer = ""
+
+    def feed(self, token: str) -> List[str]:
+        """Добавляет токен и возвращает предложения, которые уже можно озвучивать."""
+        self._buffer += token
+        sentences = []
+        start = 0
+        for match in _SENTENCE_END.finditer(self._buffer):
+            candidate = self._buffer[start:match.start()].strip()
+            # Короткие фрагменты и сокращения присоединяются к следующему предложению
+            if len(candidate) < self.min_chars or ("\n" not in match.group() and _ABBREVIATION.search(candidate)):
+                continue
+            sentences.append(candidate)
+            start = match.end()
+        self._buffer = self._buffer[start:]
+        # Слишком длинный фрагмент без границы предложения режем по последней запятой или пробелу
+        while len(self._buffer) > self.max_chars:
+            head = self._buffer[:self.max_chars]
+            cut = max(head.rfind(", "), head.rfind("; "), head.rfind(": "))
+            cut = cut + 1 if cut > 0 else head.rfind(" ")
+            if cut <= 0:
+                cut = self.max_chars
+            sentences.append(self._buffer[:cut].strip())
+            self._buffer = self._buffer[cut:].lstrip()
+        return [sentence for sentence in sentences if sentence]
+
+    def flush(self) -> List[str]:
+        """Возвращает остаток текста после окончания генерации."""
+        rest, self._buffer = self._buffer.strip(), ""
+        return [rest] if rest else []
+
+
+class SpeechStreamStats:
+    """Счетчики потоковой озвучки для метрик."""
+
+    def __init__(self):
+        self.replies = 0
+        self.sentences = 0
+        self.first_audio_seconds = 0.0
+        self.total_seconds = 0.0
+
+    def record(self, sentences: int, first_audio: Optional[float], total: float) -> None:
+        self.replies += 1
+        self.sentences += sentences
+        self.first_audio_seconds += first_audio if first_audio is not None else total
+        self.total_seconds += total
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает среднее время до первого звука и до конца ответа."""
+        return {
+            "enabled": settings.VOICE_STREAMING_ENABLED,
+            "replies": self.replies,
+            "sentences": self.sentences,
+            "avg_first_audio_seconds": round(self.first_audio_seconds / self.replies, 3) if self.replies else 0.0,
+            "avg_reply_seconds": round(self.total_seconds / self.replies, 3) if self.replies else 0.0,
+        }
+
+
+# Единые счетчики потоковой озвучки для всего приложения
+speech_stream_stats = SpeechStreamStats()
+
+
+async def _generate_sentences(session_chain, inputs: Dict[str, str], queue: asyncio.Queue) -> str:
+    """Читает ответ LLM потоком токенов и кладет в очередь готовые предложения."""
+    parts = []
+    try:
+        if settings.VOICE_STREAMING_ENABLED:
+            splitter = SentenceSplitter()
+            prompt = session_chain.prompt.format_prompt(**inputs)
+            async for chunk in session_chain.llm.astream(prompt):
+                token = getattr(chunk, "content", chunk)
+                if not token:
+                    continue
+                parts.append(token)
+                for sentence in splitter.feed(token):
+                    await queue.put(sentence)
+            for sentence in splitter.flush():
+                await queue.put(sentence)
+        else:
+            reply = await session_chain.apredict(**inputs)
+            parts.append(reply)
+            if reply.strip():
+                await queue.put(reply.strip())
+    finally:
+        # Сигнал потребителю, что предложений больше не будет
+        await queue.put(None)
+    return "".join(parts).strip()
+
+
+async def _prepared_sentences(text: str, queue: asyncio.Queue) -> str:
+    """Кладет в очередь предложения уже готового текста."""
+    try:
+        splitter = SentenceSplitter()
+        for sentence in splitter.feed(text) + splitter.flush():
+            await queue.put(sentence)
+    finally:
+        await queue.put(None)
+    return text.strip()
+
+
+async def speak_interviewer_reply(websocket: WebSocket, session_chain, human_input: str, chat_history: str) -> str:
+    """
+    Генерирует ответ интервьюера и озвучивает его по предложениям по мере генерации.
+
+    Синтез речи предложения идет параллельно с генерацией следующих предложений.
+    Отправляет клиенту фрагменты `audio_chunk`, полный текст ответа и `audio_end`.
+
+    Returns:
+        Полный текст ответа интервьюера.
+    """
+    inputs = {"human_input": human_input, "chat_history": chat_history}
+    return await _speak(websocket, lambda queue: _generate_sentences(session_chain, inputs, queue))
+
+
+async def speak_text(websocket: WebSocket, text: str) -> str:
+    """Озвучивает готовый текст (например, подготовленную первую реплику) по предложениям."""
+    return await _speak(websocket, lambda queue: _prepared_sentences(text, queue))
+
+
+async def _speak(websocket: WebSocket, produce) -> str:
+    started = time.perf_counter()
+    first_audio: Optional[float] = None
+    sentences = 0
+    queue: asyncio.Queue = asyncio.Queue()
+    generator = asyncio.create_task(produce(queue))
+    try:
+        while True:
+            sentence = await queue.get()
+            if sentence is None:
+                break
+            audio_b64 = await text_to_speech(sentence, silero_tts_instance)
+            if not audio_b64:
+                continue
+            await websocket.send_json({"type": "audio_chunk", "data": audio_b64, "text": sentence})
+            sentences += 1
+            if first_audio is None:
+                first_audio = time.perf_counter() - started
+                logging.info(f"[Голос] Первый фрагмент речи отправлен через {first_audio:.2f} с.")
+        reply = await generator
+    finally:
+        if not generator.done():
+            generator.cancel()
+
+    await websocket.send_json({"type": "text", "sender": "Interviewer", "data": reply})
+    await websocket.send_json({"type": "audio_end"})
+    total = time.perf_counter() - started
+    speech_stream_stats.record(sentences, first_audio, total)
+    logging.info(f"[Голос] Ответ озвучен за {total:.2f} с ({sentences} фрагм.).")
+    return reply
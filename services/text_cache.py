@@ -0,0 +1,198 @@
+"""
+Кэш извлеченного из документов текста.
+
+Ключ — SHA-256 от исходных байтов файла и версия парсеров (`PARSER_VERSION`
+вместе с бюджетом разбора PDF и режимом нормализации), поэтому повторная загрузка того же файла
+(через /upload-resume, /rank-resumes или Webhook API) не запускает
+pypdf/python-docx. Записи хранятся в таблице
+`extracted_text_cache` в виде UTF-8, сжатого zstd; перед БД стоит LRU-кэш
+в памяти на `TEXT_CACHE_MEMORY_ENTRIES` записей. При превышении
+`TEXT_CACHE_MAX_ENTRIES` из БД вытесняются самые давно использованные записи.
+
+Ошибки кэша никогда не прерывают извлечение текста: они только логируются.
+"""
+
+import asyncio
+import datetime
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import zstandard
+from sqlalchemy import delete, func, select, update
+
+from core.config import settings
+from core.database import AsyncSessionFactory
+from core.schemas import ExtractedTextCacheEntry
+from services.document_parsers import PARSER_VERSION
+
+# Через сколько записей в кэш запускать вытеснение лишних записей из БД
+EVICTION_EVERY_N_WRITES = 100
+# Файлы крупнее этого размера хэшируются в отдельном потоке, чтобы не блокировать event loop
+HASH_IN_THREAD_MIN_BYTES = 256 * 1024
+
+
+async def hash_content(content: bytes) -> str:
+    """Возвращает SHA-256 содержимого файла."""
+    if len(content) >= HASH_IN_THREAD_MIN_BYTES:
+        # hashlib отпускает GIL на больших буферах
+        return await asyncio.to_thread(lambda: hashlib.sha256(content).hexdigest())
+    return hashlib.sha256(content).hexdigest()
+
+
+def parser_cache_version() -> str:
+    """Версия извлечения текста: версия парсеров, бюджет разбора PDF и режим нормализации, от которых зависит текст."""
+    normalized = "n" if settings.TEXT_NORMALIZATION_ENABLED else "r"
+    return f"{PARSER_VERSION}:{settings.PDF_MAX_PAGES}:{settings.PDF_MAX_CHARS}:{normalized}"
+
+
+class ExtractedTextCache:
+    """Двухуровневый кэш текста документов: LRU в памяти и таблица `extracted_text_cache`."""
+
+    def __init__(self):
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self.bytes_saved = 0
+
+    @property
+    def enabled(self) -> bool:
+        return settings.TEXT_CACHE_ENABLED
+
+    def _remember(self, content_hash: str, text: str) -> None:
+        self._memory[content_hash] = text
+        self._memory.move_to_end(content_hash)
+        while len(self._memory) > settings.TEXT_CACHE_MEMORY_ENTRIES:
+            self._memory.popitem(last=False)
+
+    async def get(self, content_hash: str) -> Optional[str]:
+        """Возвращает закэшированный текст документа или None."""
+        if not self.enabled:
+            return None
+        text = self._memory.get(content_hash)
+        if text is not None:
+            self._memory.move_to_end(content_hash)
+            self.memory_hits += 1
+            return text
+
+        version = parser_cache_version()
+        try:
+            async with AsyncSessionFactory() as session:
+                compressed = await session.scalar(
+                    select(ExtractedTextCacheEntry.text_zstd)
+                    .where(ExtractedTextCacheEntry.content_hash == content_hash)
+                    .where(ExtractedTextCacheEntry.parser_version == version)
+                )
+                if compressed is not None:
+                    await session.execute(
+                        update(ExtractedTextCacheEntry)
+                        .where(ExtractedTextCacheEntry.content_hash == content_hash)
+                        .where(ExtractedTextCacheEntry.parser_version == version)
+                        .values(
+                            hit_count=ExtractedTextCacheEntry.hit_count + 1,
+                            last_accessed_at=datetime.datetime.utcnow()
+                        )
+                    )
+                    await session.commit()
+            if compressed is not None:
+                text = zstandard.ZstdDecompressor().decompress(compressed).decode("utf-8")
+        except Exception as e:
+            logging.error(f"[TextCache] Ошибка чтения кэша текста: {e}", exc_info=True)
+            text = None
+
+        if text is None:
+            self.misses += 1
+            return None
+        self.db_hits += 1
+        self._remember(content_hash, text)
+        return text
+
+    async def put(self, content_hash: str, text: str) -> None:
+        """Сохраняет извлеченный текст в памяти и в БД."""
+        if not self.enabled:
+            return
+        self._remember(content_hash, text)
+        try:
+            raw = text.encode("utf-8")
+            compressed = zstandard.ZstdCompressor(level=settings.TEXT_CACHE_ZSTD_LEVEL).compress(raw)
+            async with AsyncSessionFactory() as session:
+                now = datetime.datetime.utcnow()
+                await session.merge(ExtractedTextCacheEntry(
+                    content_hash=content_hash,
+                    parser_version=parser_cache_version(),
+                    text_zstd=compressed,
+                    text_size=len(raw),
+                    compressed_size=len(compressed),
+                    hit_count=0,
+                    created_at=now,
+                    last_accessed_at=now
+                ))
+                await session.commit()
+            self.writes += 1
+            self.bytes_saved += len(raw) - len(compressed)
+        except Exception as e:
+            logging.error(f"[TextCache] Ошибка записи в кэш текста: {e}", exc_info=True)
+            return
+
+        if self.writes % EVICTION_EVERY_N_WRITES == 0:
+            await self.evict()
+
+    async def evict(self) -> int:
+        """Удаляет записи старых версий парсеров и вытесняет самые давно использованные сверх лимита."""
+        removed = 0
+        try:
+            async with AsyncSessionFactory() as session:
+                outdated = await session.execute(
+                    delete(ExtractedTextCacheEntry).where(ExtractedTextCacheEntry.parser_version != parser_cache_version())
+                )
+                removed += outdated.rowcount or 0
+
+                total = await session.scalar(select(func.count()).select_from(ExtractedTextCacheEntry))
+                overflow = (total or 0) - settings.TEXT_CACHE_MAX_ENTRIES
+                if overflow > 0:
+                    oldest = (
+                        select(ExtractedTextCacheEntry.content_hash)
+                        .order_by(ExtractedTextCacheEntry.last_accessed_at.asc())
+                        .limit(overflow)
+                    )
+                    lru = await session.execute(
+                        delete(ExtractedTextCacheEntry).where(ExtractedTextCacheEntry.content_hash.in_(oldest))
+                    )
+                    removed += lru.rowcount or 0
+                await session.commit()
+        except Exception as e:
+            logging.error(f"[TextCache] Ошибка очистки кэша текста: {e}", exc_info=True)
+            return 0
+
+        self.evictions += removed
+        if removed:
+            logging.info(f"[TextCache] Удалено записей из кэша текста: {removed}.")
+        return removed
+
+    def clear_memory(self) -> None:
+        self._memory.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает счетчики кэша для метрик."""
+        hits = self.memory_hits + self.db_hits
+        lookups = hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "parser_version": parser_cache_version(),
+            "memory_entries": len(self._memory),
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "writes": self.writes,
+            "evictions": self.evictions,
+            "compression_bytes_saved": self.bytes_saved,
+        }
+
+
+# Единый кэш извлеченного текста для всего приложения
+text_cache = ExtractedTextCache()
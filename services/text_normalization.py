@@ -0,0 +1,165 @@
+"""
+Нормализация извлеченного текста перед отправкой в LLM.
+
+Текст из PDF/DOCX содержит много «мусора», который попадает в каждый промпт:
+колонтитулы и номера страниц, переносы слов, повторяющиеся строки и ячейки
+таблиц, цепочки пробелов. Каждый токен промпта стоит времени и денег, поэтому
+между извлечением текста и промптами текст очищается:
+
+- склеиваются слова, разорванные переносом на конце строки;
+- схлопываются пробельные символы и пустые строки;
+- удаляются повторы строк (подряд — любые, по всему тексту — длинные);
+- из PDF удаляются колонтитулы, повторяющиеся на большинстве страниц, и номера страниц
+  (страницы разделены символом `PAGE_BREAK`, см. services/document_parsers.py).
+
+Функции модуля не зависят от остального приложения и могут выполняться
+в процессах пула парсинга.
+"""
+
+import logging
+import math
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Sequence
+
+from services.batch_scoring import estimate_tokens
+from services.document_parsers import PAGE_BREAK
+
+# Сколько строк в начале и в конце страницы проверять на колонтитулы
+EDGE_LINES = 2
+# Колонтитулом считается строка, повторяющаяся на такой доле страниц (но не менее чем на 3)
+BOILERPLATE_PAGE_SHARE = 0.5
+BOILERPLATE_MIN_PAGES = 3
+# Повторы по всему тексту удаляются только для строк не короче этого (короткие строки — навыки, даты — повторяются законно)
+GLOBAL_DEDUP_MIN_CHARS = 25
+
+_INVISIBLE_CHARS = re.compile("[\u00ad\u200b\u200c\u200d\u2060\ufeff]")
+_SPACES = re.compile(r"[ \t\f\v\u00a0\u2000-\u200a\u202f\u205f\u3000]+")
+_HYPHENATED_BREAK = re.compile(r"(?<=[^\W\d_])-[ \t]*\n[ \t]*(?=[a-zа-яё])")
+_PAGE_NUMBER = re.compile(r"^[-–—\s]*(?:(?:стр\.?|страница|page|p\.)\s*)?(\d+)(?:\s*(?:/|из|of)\s*(\d+))?[-–—\s]*$", re.IGNORECASE)
+_PAGE_REFERENCE = re.compile(r"(?:стр\.?|страница|page|p\.)\s*\d+", re.IGNORECASE)
+_DIGITS = re.compile(r"\d+")
+
+
+@dataclass
+class NormalizedText:
+    """Результат нормализации документа."""
+    text: str
+    tokens_before: int
+    tokens_after: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+
+def _boilerplate_key(line: str) -> str:
+    key = _SPACES.sub(" ", line).strip().lower()
+    # Номер страницы внутри колонтитула меняется, поэтому такие строки сравниваем без цифр
+    return _DIGITS.sub("#", key) if _PAGE_REFERENCE.search(key) else key
+
+
+def _is_page_number(line: str, page_count: int) -> bool:
+    """
+    Строка — номер страницы («3», «- 3 -», «стр. 3 из 5»). Число больше числа страниц
+    документа (например, год «2019» из колонки дат резюме) номером страницы не считается.
+    """
+    match = _PAGE_NUMBER.match(line)
+    if not match:
+        return False
+    number = int(match.group(1))
+    total = int(match.group(2)) if match.group(2) else page_count
+    return 1 <= number <= total
+
+
+def strip_page_boilerplate(pages: Sequence[str]) -> List[str]:
+    """
+    Удаляет из страниц PDF номера страниц и колонтитулы — строки в начале
+    или в конце страницы, повторяющиеся на большинстве страниц документа.
+    На первой странице колонтитул остается: там он часто содержит имя кандидата.
+    """
+    page_lines = [page.split("\n") for page in pages]
+
+    def edge_indexes(lines: List[str]) -> List[int]:
+        filled = [i for i, line in enumerate(lines) if line.strip()]
+        return sorted(set(filled[:EDGE_LINES] + filled[-EDGE_LINES:]))
+
+    boilerplate = set()
+    threshold = max(BOILERPLATE_MIN_PAGES, math.ceil(len(pages) * BOILERPLATE_PAGE_SHARE))
+    if len(pages) >= threshold:
+        counts: Dict[str, int] = {}
+        for lines in page_lines:
+            for key in {_boilerplate_key(lines[i]) for i in edge_indexes(lines)}:
+                counts[key] = counts.get(key, 0) + 1
+        boilerplate = {key for key, count in counts.items() if count >= threshold}
+
+    cleaned = []
+    for page_index, lines in enumerate(page_lines):
+        drop = {
+            i for i in edge_indexes(lines)
+            if _is_page_number(lines[i], len(pages)) or (page_index > 0 and _boilerplate_key(lines[i]) in boilerplate)
+        }
+        cleaned.append("\n".join(line for i, line in enumerate(lines) if i not in drop))
+    return cleaned
+
+
+def clean_text(text: str) -> str:
+    """Удаляет колонтитулы, склеивает переносы, схлопывает пробелы и пустые строки, удаляет повторы строк."""
+    text = _INVISIBLE_CHARS.sub("", (text or "").replace("\r\n", "\n").replace("\r", "\n"))
+    if PAGE_BREAK in text:
+        text = "\n".join(strip_page_boilerplate(text.split(PAGE_BREAK)))
+    text = _HYPHENATED_BREAK.sub("", text)
+
+    lines, seen = [], set()
+    previous = None
+    for raw_line in text.split("\n"):
+        line = _SPACES.sub(" ", raw_line).strip()
+        if not line:
+            # Не более одной пустой строки подряд
+            if lines and lines[-1]:
+                lines.append("")
+            continue
+        key = line.casefold()
+        if key == previous or (len(line) >= GLOBAL_DEDUP_MIN_CHARS and key in seen):
+            continue
+        previous = key
+        seen.add(key)
+        lines.append(line)
+    return "\n".join(lines).strip()
+
+
+class TextNormalizer:
+    """Нормализует тексты документов и считает сэкономленные токены."""
+
+    def __init__(self):
+        self.documents = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+
+    def normalize(self, text: str, label: str = "") -> NormalizedText:
+        """Очищает текст документа и логирует, сколько токенов сэкономлено."""
+        cleaned = clean_text(text)
+        result = NormalizedText(cleaned, estimate_tokens(text), estimate_tokens(cleaned))
+        self.documents += 1
+        self.tokens_before += result.tokens_before
+        self.tokens_after += result.tokens_after
+        logging.info(
+            f"[Normalize] {label or 'документ'}: ~{result.tokens_before} → ~{result.tokens_after} токенов "
+            f"(сэкономлено ~{result.tokens_saved})."
+        )
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает счетчики нормализации для метрик."""
+        saved = self.tokens_before - self.tokens_after
+        return {
+            "documents": self.documents,
+            "tokens_before": self.tokens_before,
+            "tokens_after": self.tokens_after,
+            "tokens_saved": saved,
+            "saved_share": round(saved / self.tokens_before, 4) if self.tokens_before else 0.0,
+        }
+
+
+# Единый нормализатор для всего приложения
+text_normalizer = TextNormalizer()
@@ -0,0 +1,285 @@
+"""
+Подготовка («компиляция») артефактов вакансии при ее создании.
+
+Перед первой репликой голосового собеседования интервьюеру нужны выжимка
+технических требований, вопросы по вакансии, готовый промпт и сама первая
+реплика — это 2–3 запроса к LLM на каждую сессию. Для сохраненной
+вакансии все это готовится один раз сразу после создания и хранится
+в таблице `vacancies`; сессии по этой вакансии начинаются без обращений
+к LLM. Заодно готовятся теги вакансии.
+
+Артефакты помечены версией промптов и моделей (`ARTIFACTS_VERSION`):
+после их изменения артефакты считаются устаревшими и готовятся заново
+(при старте приложения — для последних `VACANCY_PRECOMPILE_BACKFILL_LIMIT` вакансий).
+"""
+
+import asyncio
+import datetime
+import hashlib
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Set, Tuple
+
+from sqlalchemy import or_, select
+
+from core.config import settings
+from core.database import AsyncSessionFactory
+from core.schemas import Vacancy
+from prompts.interview_prompts import (
+    INTERVIEWER_SYSTEM_PROMPT,
+    INTERVIEW_PLAN,
+    CANDIDATE_INFO_BLOCK,
+    RECOMMENDED_QUESTIONS_BLOCK,
+    QUESTION_GEN_PROMPT,
+    VACANCY_TECH_SUMMARY_PROMPT,
+    OPENING_HUMAN_INPUT
+)
+from prompts.tag_prompts import TAG_CLOUD_PROMPT_TEMPLATE
+from services.ai_services import (
+    create_llm_chain,
+    interviewer_llm,
+    question_gen_chain,
+    vacancy_tech_summary_chain,
+    summarize_vacancy_tech_requirements
+)
+from services.api_ai_services import generate_tags_for_vacancy
+from services.llm_limits import bulk_llm_work
+from services.llm_response_cache import llm_response_cache
+from services.single_flight import SingleFlight
+
+# Версия артефактов: меняется при изменении промптов или моделей, которыми они готовятся
+ARTIFACTS_VERSION = hashlib.sha256("\x1f".join([
+    INTERVIEWER_SYSTEM_PROMPT, INTERVIEW_PLAN, CANDIDATE_INFO_BLOCK, RECOMMENDED_QUESTIONS_BLOCK,
+    QUESTION_GEN_PROMPT, VACANCY_TECH_SUMMARY_PROMPT, TAG_CLOUD_PROMPT_TEMPLATE, OPENING_HUMAN_INPUT,
+    settings.LLM_INTERVIEWER_MODEL, settings.LLM_QUESTION_GEN_MODEL, settings.LLM_ANALYST_MODEL,
+]).encode("utf-8")).hexdigest()[:16]
+
+
+def _escape_braces(text: str) -> str:
+    if not text:
+        return ""
+    return text.replace("{", "{{").replace("}", "}}")
+
+
+def build_interviewer_template(vacancy_text: str, resume_text: Optional[str], generated_questions: Optional[str]) -> str:
+    """Собирает шаблон промпта интервьюера с переменными {chat_history} и {human_input}."""
+    logging.info(f"vacancy_text: {vacancy_text!r}")
+    logging.info(f"resume_text: {resume_text!r}")
+    logging.info(f"generated_questions: {generated_questions!r}")
+
+    # Экранируем фигурные скобки в пользовательских данных
+    safe_resume_text = _escape_braces(resume_text)
+    safe_vacancy_text = _escape_braces(vacancy_text)
+    safe_generated_questions = _escape_braces(generated_questions)
+
+    final_candidate_block = CANDIDATE_INFO_BLOCK.format(candidate_profile=safe_resume_text) if resume_text else ""
+    final_questions_block = RECOMMENDED_QUESTIONS_BLOCK.format(generated_questions=safe_generated_questions) if generated_questions else ""
+
+    template = (
+        f"{INTERVIEWER_SYSTEM_PROMPT}\n"
+        f"{final_candidate_block}\n"
+        f"{final_questions_block}\n\n"
+        f"Вот описание вакансии, на которую претендует кандидат:\n{safe_vacancy_text}\n\n"
+        f"Ты должен провести собеседование строго по следующему плану:\n{INTERVIEW_PLAN}\n\n"
+        "Текущий диалог:\n{chat_history}\nКандидат: {human_input}\nТвой следующий вопрос:"
+    )
+    return template
+
+
+@dataclass
+class VacancyArtifacts:
+    """Подготовленные артефакты вакансии."""
+    tech_summary: str
+    generated_questions: str
+    tags: str
+    interviewer_prompt_prefix: str
+    opening_question: str
+
+    def matches_questions(self, generated_questions: Optional[str]) -> bool:
+        """Готовый промпт подходит сессии, если клиент не передал свои вопросы или передал те же."""
+        return not generated_questions or generated_questions.strip() == (self.generated_questions or "").strip()
+
+
+class VacancyCompiler:
+    """Готовит артефакты вакансий и отдает их сессиям собеседования."""
+
+    def __init__(self):
+        self._single_flight = SingleFlight("vacancy_compile")
+        # Ссылки на фоновые задачи, чтобы их не собрал сборщик мусора
+        self._tasks: Set[asyncio.Task] = set()
+        self.compiled = 0
+        self.failed = 0
+        self.sessions_precompiled = 0
+        self.sessions_live = 0
+
+    async def build_artifacts(self, vacancy_text: str, generated_questions: Optional[str] = None) -> VacancyArtifacts:
+        """Генерирует артефакты вакансии: выжимку, вопросы и теги — параллельно, затем промпт и первую реплику."""
+        async def tags_or_empty() -> str:
+            try:
+                return await generate_tags_for_vacancy(vacancy_text)
+            except Exception:
+                # Теги не нужны для собеседования, поэтому их сбой не отменяет подготовку
+                return ""
+
+        async def questions() -> str:
+            if generated_questions:
+                return generated_questions
+            return await llm_response_cache.apredict("question_gen", question_gen_chain, vacancy_text=vacancy_text)
+
+        tech_summary, questions_text, tags = await asyncio.gather(
+            llm_response_cache.apredict("vacancy_tech_summary", vacancy_tech_summary_chain, vacancy_text=vacancy_text),
+            questions(),
+            tags_or_empty()
+        )
+        prefix = build_interviewer_template(tech_summary, None, questions_text)
+        opening_question = await create_llm_chain(interviewer_llm, prefix).apredict(
+            human_input=OPENING_HUMAN_INPUT, chat_history=""
+        )
+        return VacancyArtifacts(tech_summary, questions_text, tags, prefix, opening_question.strip())
+
+    async def compile(self, vacancy_id: int) -> Optional[VacancyArtifacts]:
+        """Готовит и сохраняет артефакты вакансии. Одновременные вызовы для одной вакансии объединяются."""
+        return await self._single_flight.run(str(vacancy_id), lambda: self._compile(vacancy_id))
+
+    async def _compile(self, vacancy_id: int) -> Optional[VacancyArtifacts]:
+        try:
+            async with AsyncSessionFactory() as session:
+                vacancy = await session.get(Vacancy, vacancy_id)
+                if vacancy is None:
+                    logging.warning(f"[Вакансии] Вакансия ID {vacancy_id} не найдена, подготовка пропущена.")
+                    return None
+                vacancy_text, generated_questions = vacancy.text, vacancy.generated_questions
+
+            started = datetime.datetime.utcnow()
+            artifacts = await self.build_artifacts(vacancy_text, generated_questions)
+
+            async with AsyncSessionFactory() as session:
+                vacancy = await session.get(Vacancy, vacancy_id)
+                if vacancy is None:
+                    return None
+                vacancy.tech_summary = artifacts.tech_summary
+                vacancy.generated_questions = artifacts.generated_questions
+                vacancy.tags = artifacts.tags
+                vacancy.interviewer_prompt_prefix = artifacts.interviewer_prompt_prefix
+                vacancy.opening_question = artifacts.opening_question
+                vacancy.artifacts_version = ARTIFACTS_VERSION
+                vacancy.compiled_at = datetime.datetime.utcnow()
+                await session.commit()
+        except Exception as e:
+            self.failed += 1
+            logging.error(f"[Вакансии] Не удалось подготовить артефакты вакансии ID {vacancy_id}: {e}", exc_info=True)
+            return None
+
+        self.compiled += 1
+        seconds = (datetime.datetime.utcnow() - started).total_seconds()
+        logging.info(f"[Вакансии] Артефакты вакансии ID {vacancy_id} подготовлены за {seconds:.1f} с.")
+        return artifacts
+
+    def schedule(self, vacancy_id: int) -> None:
+        """Запускает подготовку артефактов вакансии в фоне, не задерживая ответ на запрос."""
+        if not settings.VACANCY_PRECOMPILE_ENABLED:
+            return
+        # Фоновая подготовка уступает место в лимите LLM интерактивным запросам
+        with bulk_llm_work():
+            task = asyncio.create_task(self.compile(vacancy_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def backfill(self) -> int:
+        """Готовит артефакты последних вакансий, у которых их нет или они устарели."""
+        if not settings.VACANCY_PRECOMPILE_ENABLED or settings.VACANCY_PRECOMPILE_BACKFILL_LIMIT <= 0:
+            return 0
+        try:
+            async with AsyncSessionFactory() as session:
+                result = await session.execute(
+                    select(Vacancy.id)
+                    .where(or_(Vacancy.artifacts_version.is_(None), Vacancy.artifacts_version != ARTIFACTS_VERSION))
+                    .order_by(Vacancy.created_at.desc())
+                    .limit(settings.VACANCY_PRECOMPILE_BACKFILL_LIMIT)
+                )
+                vacancy_ids = list(result.scalars().all())
+        except Exception as e:
+            logging.error(f"[Вакансии] Не удалось найти неподготовленные вакансии: {e}", exc_info=True)
+            return 0
+        if vacancy_ids:
+            logging.info(f"[Вакансии] Подготовка артефактов для {len(vacancy_ids)} вакансий...")
+        # По одной вакансии, чтобы не занимать LLM целиком
+        compiled = 0
+        for vacancy_id in vacancy_ids:
+            if await self.compile(vacancy_id) is not None:
+                compiled += 1
+        return compiled
+
+    def schedule_backfill(self) -> None:
+        """Запускает догоняющую подготовку артефактов в фоне."""
+        with bulk_llm_work():
+            task = asyncio.create_task(self.backfill())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def get_artifacts(self, vacancy_id: Optional[int], vacancy_text: str) -> Optional[VacancyArtifacts]:
+        """
+        Возвращает актуальные артефакты вакансии по ID или, если ID не передан, по тексту вакансии.
+        Артефакты старой версии или подготовленные для другого текста не возвращаются.
+        """
+        try:
+            async with AsyncSessionFactory() as session:
+                query = select(Vacancy).where(Vacancy.artifacts_version == ARTIFACTS_VERSION)
+                if vacancy_id is not None:
+                    query = query.where(Vacancy.id == int(vacancy_id))
+                else:
+                    query = query.where(Vacancy.text == vacancy_text)
+                vacancy = (await session.execute(query.order_by(Vacancy.id.desc()).limit(1))).scalar_one_or_none()
+        except Exception as e:
+            logging.error(f"[Вакансии] Ошибка чтения артефактов вакансии: {e}", exc_info=True)
+            return None
+        if vacancy is None or vacancy.text != vacancy_text or not vacancy.opening_question:
+            return None
+        return VacancyArtifacts(
+            vacancy.tech_summary or "",
+            vacancy.generated_questions or "",
+            vacancy.tags or "",
+            vacancy.interviewer_prompt_prefix or "",
+            vacancy.opening_question
+        )
+
+    async def prepare_interview(
+        self,
+        vacancy_text: str,
+        generated_questions: Optional[str],
+        vacancy_id: Optional[int] = None
+    ) -> Tuple[str, Optional[str]]:
+        """
+        Возвращает шаблон промпта интервьюера и готовую первую реплику (None — ее нужно сгенерировать).
+        Если у вакансии есть подготовленные артефакты, запросов к LLM не выполняется.
+        """
+        artifacts = await self.get_artifacts(vacancy_id, vacancy_text)
+        if artifacts is not None and artifacts.matches_questions(generated_questions):
+            self.sessions_precompiled += 1
+            logging.info("[Вакансии] Собеседование начато с подготовленными артефактами вакансии.")
+            return artifacts.interviewer_prompt_prefix, artifacts.opening_question
+
+        self.sessions_live += 1
+        if artifacts is not None:
+            tech_summary = artifacts.tech_summary
+        else:
+            # Извлекаем только технические требования из вакансии для интервьюера
+            tech_summary = await summarize_vacancy_tech_requirements(vacancy_text)
+        return build_interviewer_template(tech_summary, None, generated_questions), None
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает счетчики подготовки артефактов для метрик."""
+        sessions = self.sessions_precompiled + self.sessions_live
+        return {
+            "enabled": settings.VACANCY_PRECOMPILE_ENABLED,
+            "artifacts_version": ARTIFACTS_VERSION,
+            "compiled": self.compiled,
+            "failed": self.failed,
+            "sessions_precompiled": self.sessions_precompiled,
+            "sessions_live": self.sessions_live,
+            "precompiled_share": round(self.sessions_precompiled / sessions, 4) if sessions else 0.0,
+        }
+
+
+# Единый компилятор вакансий для всего приложения
+vacancy_compiler = VacancyCompiler()
@@ -0,0 +1,275 @@
+"""
+Локальный векторный индекс для подбора вакансий и кандидатов.
+
+Тексты вакансий (`Vacancy.text`) и резюме (`Candidate.resume_text`) переводятся
+в векторы хешированной TF-IDF проекцией: термы хешируются в фиксированное
+число корзин, частоты сглаживаются логарифмом, а веса IDF пересчитываются
+по накопленной статистике документов при каждом запросе. Модель не нужна,
+все вычисления выполняются на CPU и офлайн.
+
+Векторы хранятся в бинарных файлах рядом с `interview_ai.db` и читаются
+через `numpy.memmap`, поэтому индекс не загружается в память целиком.
+Новые записи дописываются в конец файлов без перестроения индекса.
+Метаданные заменяются атомарно; если после сбоя число векторов в файлах
+не совпадает с метаданными, при загрузке файлы обрезаются до последней
+целой записи, а статистика документов пересчитывается по векторам.
+"""
+
+import asyncio
+import json
+import logging
+import math
+import os
+import threading
+import zlib
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import select
+
+from core.config import settings
+from core.database import AsyncSessionFactory
+from core.schemas import Vacancy, Candidate
+from services.lexical_prefilter import tokenize
+
+# Сколько векторов читать за раз при пересчете статистики документов
+REPAIR_CHUNK_ROWS = 4096
+
+
+def embed_text(text: str, dim: int) -> np.ndarray:
+    """Строит хешированный вектор частот термов (без IDF) для текста."""
+    vector = np.zeros(dim, dtype=np.float32)
+    for term, tf in Counter(tokenize(text)).items():
+        digest = zlib.crc32(term.encode("utf-8"))
+        bucket = digest % dim
+        # Знак из старшего бита снижает систематические искажения от коллизий
+        sign = 1.0 if (digest >> 31) & 1 == 0 else -1.0
+        vector[bucket] += sign * (1.0 + math.log(tf))
+    return vector
+
+
+class VectorStore:
+    """Дописываемое хранилище векторов на файлах с чтением через memmap."""
+
+    def __init__(self, name: str, directory: str, dim: int):
+        self.name = name
+        self.dim = dim
+        base = os.path.join(directory, f"interview_ai.{name}")
+        self.vectors_path = f"{base}.vectors.f32"
+        self.ids_path = f"{base}.ids.i64"
+        self.df_path = f"{base}.df.f32"
+        self.meta_path = f"{base}.meta.json"
+        self._lock = threading.Lock()
+        self._count = 0
+        self._df = np.zeros(dim, dtype=np.float32)
+        self._vectors: Optional[np.memmap] = None
+        self._ids: Optional[np.ndarray] = None
+        self._norms: Optional[np.ndarray] = None
+        self._load_meta()
+
+    # --- Служебные методы ---
+
+    def _load_meta(self) -> None:
+        if not os.path.exists(self.meta_path):
+            return
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("dim") != self.dim:
+                # Файлы удаляются, чтобы ensure_vector_indexes перестроил индекс по БД при старте,
+                # а новые векторы не дописывались к векторам старой размерности
+                logging.warning(f"[VectorIndex:{self.name}] Размерность индекса изменилась, индекс будет перестроен.")
+                self.reset()
+                return
+            count = int(meta.get("count", 0))
+            rows = self._file_rows()
+            df = np.fromfile(self.df_path, dtype=np.float32) if os.path.exists(self.df_path) else None
+            if not self._files_match(count) or df is None or df.shape != (self.dim,):
+                logging.warning(
+                    f"[VectorIndex:{self.name}] Файлы индекса не согласованы с метаданными "
+                    f"(записей в метаданных {count}, целых записей в файлах {rows}), восстанавливаю по файлам векторов."
+                )
+                self._repair(rows)
+                return
+            self._count = count
+            self._df = df
+        except Exception as e:
+            logging.error(f"[VectorIndex:{self.name}] Не удалось прочитать метаданные индекса, индекс будет перестроен: {e}")
+            self.reset()
+
+    @staticmethod
+    def _file_size(path: str) -> int:
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
+    def _file_rows(self) -> int:
+        """Число целых записей, которые есть и в файле векторов, и в файле идентификаторов."""
+        return min(self._file_size(self.vectors_path) // (self.dim * 4), self._file_size(self.ids_path) // 8)
+
+    def _files_match(self, count: int) -> bool:
+        """Файлы векторов и идентификаторов содержат ровно count записей."""
+        return (
+            self._file_size(self.vectors_path) == count * self.dim * 4
+            and self._file_size(self.ids_path) == count * 8
+        )
+
+    def _repair(self, rows: int) -> None:
+        """Обрезает файлы до rows записей и пересчитывает по ним статистику документов."""
+        for path, row_bytes in ((self.vectors_path, self.dim * 4), (self.ids_path, 8)):
+            with open(path, "ab") as f:
+                f.truncate(rows * row_bytes)
+        df = np.zeros(self.dim, dtype=np.float32)
+        if rows:
+            vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+            for start in range(0, rows, REPAIR_CHUNK_ROWS):
+                df += (vectors[start:start + REPAIR_CHUNK_ROWS] != 0).sum(axis=0, dtype=np.float32)
+            del vectors
+        self._count = rows
+        self._df = df
+        self._save_meta()
+
+    @staticmethod
+    def _replace_file(path: str, write: Callable[[str], None]) -> None:
+        """Записывает файл во временный и атомарно подменяет им исходный."""
+        tmp_path = f"{path}.tmp"
+        write(tmp_path)
+        os.replace(tmp_path, path)
+
+    def _save_meta(self) -> None:
+        def write_meta(path: str) -> None:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"dim": self.dim, "count": self._count}, f)
+
+        self._replace_file(self.df_path, self._df.tofile)
+        self._replace_file(self.meta_path, write_meta)
+
+    def _open_views(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Возвращает memmap-представления векторов и идентификаторов."""
+        if self._vectors is None or self._vectors.shape[0] != self._count:
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(self._count, self.dim))
+            self._ids = np.fromfile(self.ids_path, dtype=np.int64, count=self._count)
+        return self._vectors, self._ids
+
+    def _idf(self) -> np.ndarray:
+        return (np.log((1.0 + self._count) / (1.0 + self._df)) + 1.0).astype(np.float32)
+
+    # --- Публичный API ---
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    def exists(self) -> bool:
+        return os.path.exists(self.meta_path)
+
+    def reset(self) -> None:
+        """Удаляет все векторы индекса."""
+        with self._lock:
+            for path in (self.vectors_path, self.ids_path, self.df_path, self.meta_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._count = 0
+            self._df = np.zeros(self.dim, dtype=np.float32)
+            self._vectors = self._ids = self._norms = None
+
+    def append(self, ids: Sequence[int], texts: Sequence[str]) -> None:
+        """Дописывает векторы новых документов в конец индекса."""
+        if not ids:
+            return
+        matrix = np.stack([embed_text(text or "", self.dim) for text in texts])
+        with self._lock:
+            with open(self.vectors_path, "ab") as f:
+                f.write(matrix.tobytes())
+            with open(self.ids_path, "ab") as f:
+                f.write(np.asarray(ids, dtype=np.int64).tobytes())
+            self._df += (matrix != 0).sum(axis=0, dtype=np.float32)
+            self._count += len(ids)
+            self._norms = None
+            self._save_meta()
+
+    def query(self, text: str, top_k: int) -> List[Tuple[int, float]]:
+        """Возвращает до top_k пар (id, косинусная близость) по убыванию близости."""
+        with self._lock:
+            if self._count == 0:
+                return []
+            vectors, ids = self._open_views()
+            idf_sq = self._idf() ** 2
+            if self._norms is None:
+                # Нормы документов в пространстве TF-IDF: sqrt(sum_j (v_ij * idf_j)^2)
+                self._norms = np.sqrt(np.einsum("ij,ij,j->i", vectors, vectors, idf_sq))
+            norms = self._norms
+
+        query_vector = embed_text(text or "", self.dim)
+        query_norm = float(np.sqrt(np.dot(query_vector * query_vector, idf_sq)))
+        if query_norm == 0:
+            return []
+
+        scores = vectors @ (query_vector * idf_sq)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            scores = np.where(norms > 0, scores / (norms * query_norm), 0.0)
+
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(ids[i]), float(scores[i])) for i in top]
+
+
+# Индексы для вакансий и резюме кандидатов
+vacancy_index = VectorStore("vacancies", settings.VECTOR_INDEX_DIR, settings.VECTOR_INDEX_DIM)
+candidate_index = VectorStore("candidates", settings.VECTOR_INDEX_DIR, settings.VECTOR_INDEX_DIM)
+
+
+async def index_vacancy(vacancy_id: int, text: str) -> None:
+    """Добавляет вакансию в векторный индекс. Ошибки только логируются."""
+    try:
+        await asyncio.to_thread(vacancy_index.append, [vacancy_id], [text])
+    except Exception as e:
+        logging.error(f"[VectorIndex] Не удалось проиндексировать вакансию {vacancy_id}: {e}", exc_info=True)
+
+
+async def index_candidates(candidates: Sequence[Tuple[int, str]]) -> None:
+    """Добавляет резюме кандидатов в векторный индекс. Ошибки только логируются."""
+    if not candidates:
+        return
+    try:
+        ids, texts = zip(*candidates)
+        await asyncio.to_thread(candidate_index.append, list(ids), list(texts))
+    except Exception as e:
+        logging.error(f"[VectorIndex] Не удалось проиндексировать кандидатов: {e}", exc_info=True)
+
+
+async def rebuild_vector_indexes() -> Dict[str, int]:
+    """Полностью перестраивает оба индекса по данным из БД."""
+    async with AsyncSessionFactory() as session:
+        vacancies = (await session.execute(select(Vacancy.id, Vacancy.text).order_by(Vacancy.id))).all()
+        candidates = (await session.execute(select(Candidate.id, Candidate.resume_text).order_by(Candidate.id))).all()
+
+    def _rebuild():
+        vacancy_index.reset()
+        candidate_index.reset()
+        vacancy_index.append([row.id for row in vacancies], [row.text for row in vacancies])
+        candidate_index.append([row.id for row in candidates], [row.resume_text for row in candidates])
+
+    await asyncio.to_thread(_rebuild)
+    logging.info(f"[VectorIndex] Индексы перестроены: вакансий {len(vacancies)}, кандидатов {len(candidates)}.")
+    return {"vacancies": len(vacancies), "candidates": len(candidates)}
+
+
+async def ensure_vector_indexes() -> None:
+    """Строит индексы по БД, если файлы индексов отсутствуют (первый запуск)."""
+    if vacancy_index.exists() and candidate_index.exists():
+        return
+    try:
+        await rebuild_vector_indexes()
+    except Exception as e:
+        logging.error(f"[VectorIndex] Не удалось построить векторные индексы: {e}", exc_info=True)
+
+
+async def find_similar_vacancies(text: str, top_k: int = 10) -> List[Tuple[int, float]]:
+    """Ищет вакансии, наиболее близкие к тексту резюме."""
+    return await asyncio.to_thread(vacancy_index.query, text, top_k)
+
+
+async def find_similar_candidates(text: str, top_k: int = 10) -> List[Tuple[int, float]]:
+    """Ищет резюме кандидатов, наиболее близкие к тексту вакансии."""
+    return await asyncio.to_thread(candidate_index.query, text, top_k)
@@ -1,7 +1,9 @@
+import asyncio
 import logging
 import os
 import io
 import base64
+import threading
 import soundfile as sf
 import torch
 from vosk import Model
@@ -72,11 +74,14 @@ class SileroTTS:
             raise RuntimeError(f"Не удалось загрузить модель из файла '{model_path}': {e}")
         self.speakers = ['aidar', 'baya', 'kseniya', 'xenia', 'eugene', 'random']
         self.sample_rate = 48000
+        # Модель общая для всех сессий, а синтез идет в потоках — вызовы модели выполняются по одному
+        self._lock = threading.Lock()
 
     def synthesize(self, text: str, speaker: str = 'baya') -> bytes:
         if speaker not in self.speakers: raise ValueError(f"Неверный голос. Доступные голоса: {self.speakers}")
         if not text: raise ValueError("Текст для синтеза не может быть пустым.")
-        audio_tensor = self.model.apply_tts(text=text, speaker=speaker, sample_rate=self.sample_rate)
+        with self._lock:
+            audio_tensor = self.model.apply_tts(text=text, speaker=speaker, sample_rate=self.sample_rate)
         buffer = io.BytesIO()
         sf.write(buffer, audio_tensor.numpy(), self.sample_rate, format='WAV')
         buffer.seek(0)
@@ -85,7 +90,8 @@ class SileroTTS:
 async def text_to_speech(text: str, silero_tts_instance: "SileroTTS") -> str:
     if not silero_tts_instance: return ""
     try:
-        audio_bytes = silero_tts_instance.synthesize(text=text, speaker='baya')
+        # Синтез выполняется в отдельном потоке, чтобы не блокировать цикл событий (и генерацию следующих фраз)
+        audio_bytes = await asyncio.to_thread(silero_tts_instance.synthesize, text=text, speaker='baya')
         return base64.b64encode(audio_bytes).decode('utf-8')
     except Exception as e:
         logging.error(f"Ошибка синтеза речи: {e}")
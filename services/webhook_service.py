@@ -6,14 +6,17 @@
 """
 
 import logging
-import httpx
 import hmac
 import hashlib
 import json
 
 from core.config import settings
-from core.models import WebhookRankRequest, WebhookAnalysisRequest
-from services.ai_services import score_and_sort_resumes, analyst_chain
+from core.models import WebhookRankRequest, WebhookAnalysisRequest, InterviewAnalysisOutput
+from services.http_clients import http_clients
+from services.ai_services import analyst_chain, apredict_json
+from services.resume_sections import fit_resume_to_budget
+from services.scoring_service import score_and_sort_resumes
+from services.dedup import collect_duplicate_groups
 from prompts.interview_prompts import DEFAULT_JOB_DESCRIPTION
 
 async def send_webhook(
@@ -33,17 +36,17 @@ async def send_webhook(
             'X-Webhook-Signature-256': f"sha256={signature}"
         }
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, content=payload, headers=headers, timeout=30.0)
-            response.raise_for_status()
-            
+        # Общий клиент с пулом keep-alive соединений вместо нового соединения на каждую доставку
+        response = await http_clients.get("webhooks").post(url, content=payload, headers=headers)
+        response.raise_for_status()
+
         logging.info(f"Вебхук успешно отправлен на {url}. Статус: {response.status_code}")
         return True
     except Exception as e:
         logging.error(f"[WEBHOOK] КРИТИЧЕСКАЯ ОШИБКА: Не удалось отправить вебхук на {url}. Причина: {e}", exc_info=True)
         return False
 
-async def process_ranking_request(request: WebhookRankRequest):
+async def process_ranking_request(request: WebhookRankRequest) -> dict:
     """Фоновая задача для выполнения ранжирования резюме."""
     logging.info(f"[WEBHOOK] Запуск задачи ранжирования для {request.webhook_url}")
     try:
@@ -56,9 +59,10 @@ async def process_ranking_request(request: WebhookRankRequest):
         final_payload = {
             "status": "completed",
             "request_data": request.model_dump(exclude={"webhook_url"}), # Возвращаем исходные данные для контекста
-            "result": {"ranking": sorted_results}
+            "result": {"ranking": sorted_results, "duplicate_groups": collect_duplicate_groups(sorted_results, "id")}
         }
         await send_webhook(url=str(request.webhook_url), data=final_payload, secret=settings.WEBHOOK_SECRET_TOKEN)
+        return final_payload
 
     except Exception as e:
         logging.error(f"[WEBHOOK] Сбой задачи ранжирования для {request.webhook_url}. Причина: {e}", exc_info=True)
@@ -67,20 +71,25 @@ async def process_ranking_request(request: WebhookRankRequest):
             "error": str(e)
         }
         await send_webhook(url=str(request.webhook_url), data=error_payload, secret=settings.WEBHOOK_SECRET_TOKEN)
+        raise
 
-async def process_analysis_request(request: WebhookAnalysisRequest):
+async def process_analysis_request(request: WebhookAnalysisRequest) -> dict:
     """Фоновая задача для выполнения анализа интервью."""
     logging.info(f"[WEBHOOK] Запуск задачи анализа интервью для {request.webhook_url}")
     try:
         history_str = "\n".join([f"{log.sender}: {log.text}" for log in request.conversation_history])
         
-        analysis_str = await analyst_chain.apredict(
-            vacancy_text=(request.vacancy_text or DEFAULT_JOB_DESCRIPTION),
-            resume_text=(request.resume_text or "Резюме не предоставлено."),
-            dialogue_log=history_str
+        vacancy_text = request.vacancy_text or DEFAULT_JOB_DESCRIPTION
+        # Веса не передаются в этом сценарии, поэтому используем пустой JSON-объект
+        analysis_json = await apredict_json(
+            "analyst",
+            analyst_chain,
+            InterviewAnalysisOutput,
+            vacancy_text=vacancy_text,
+            resume_text=fit_resume_to_budget(request.resume_text or "Резюме не предоставлено.", vacancy_text, "analyst"),
+            dialogue_log=history_str,
+            weights_json="{}"
         )
-        
-        analysis_json = json.loads(analysis_str)
 
         final_payload = {
             "status": "completed",
@@ -88,6 +97,7 @@ async def process_analysis_request(request: WebhookAnalysisRequest):
             "result": analysis_json
         }
         await send_webhook(url=str(request.webhook_url), data=final_payload, secret=settings.WEBHOOK_SECRET_TOKEN)
+        return final_payload
 
     except Exception as e:
         logging.error(f"[WEBHOOK] Сбой задачи анализа для {request.webhook_url}. Причина: {e}", exc_info=True)
@@ -96,3 +106,4 @@ async def process_analysis_request(request: WebhookAnalysisRequest):
             "error": str(e)
         }
         await send_webhook(url=str(request.webhook_url), data=error_payload, secret=settings.WEBHOOK_SECRET_TOKEN)
+        raise
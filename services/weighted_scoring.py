@@ -0,0 +1,92 @@
+"""
+Расчет итоговой оценки резюме по весам критериев.
+
+LLM возвращает независимые от весов оценки по каждому критерию (`subscores`),
+а взвешенный итог считается на сервере. Поэтому при изменении весов
+кандидатов можно переранжировать без повторных обращений к LLM:
+оценки собираются в матрицу «кандидаты × критерии» и умножаются на вектор весов.
+"""
+
+import json
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def criteria_for_prompt(weights: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    """Возвращает описания критериев без весов — только они влияют на ответ LLM."""
+    criteria = {}
+    for criterion_id, value in (weights or {}).items():
+        description = value.get("description", "") if isinstance(value, dict) else ""
+        criteria[criterion_id] = description
+    return criteria
+
+
+def serialize_criteria(weights: Optional[Dict[str, Any]]) -> str:
+    """Сериализует критерии оценки для подстановки в промпт."""
+    criteria = criteria_for_prompt(weights)
+    return json.dumps(criteria, ensure_ascii=False, indent=2) if criteria else "{}"
+
+
+def weight_vector(weights: Optional[Dict[str, Any]]) -> Tuple[List[str], np.ndarray]:
+    """Возвращает идентификаторы критериев и вектор их весов."""
+    criterion_ids, values = [], []
+    for criterion_id, value in (weights or {}).items():
+        weight = value.get("weight", 0) if isinstance(value, dict) else value
+        try:
+            weight = float(weight)
+        except (TypeError, ValueError):
+            weight = 0.0
+        criterion_ids.append(criterion_id)
+        values.append(max(weight, 0.0))
+    return criterion_ids, np.asarray(values, dtype=np.float64)
+
+
+def subscore_matrix(subscores: Sequence[Optional[Dict[str, Any]]], criterion_ids: Sequence[str]) -> np.ndarray:
+    """Собирает матрицу оценок «кандидаты × критерии». Отсутствующие оценки — NaN."""
+    matrix = np.full((len(subscores), len(criterion_ids)), np.nan, dtype=np.float64)
+    for row, item in enumerate(subscores):
+        if not isinstance(item, dict):
+            continue
+        for col, criterion_id in enumerate(criterion_ids):
+            value = item.get(criterion_id)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                matrix[row, col] = min(max(float(value), 0.0), 100.0)
+    return matrix
+
+
+def weighted_totals(matrix: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """
+    Считает взвешенные итоги по строкам матрицы.
+
+    Веса нормируются по критериям, для которых у кандидата есть оценка.
+    Для строк без единой оценки (или с нулевыми весами) возвращается NaN.
+    """
+    present = ~np.isnan(matrix)
+    effective_weights = present * weights
+    weight_sums = effective_weights.sum(axis=1)
+    totals = (np.nan_to_num(matrix) * effective_weights).sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(weight_sums > 0, totals / weight_sums, np.nan)
+
+
+def compute_weighted_scores(
+    subscores: Sequence[Optional[Dict[str, Any]]],
+    weights: Optional[Dict[str, Any]]
+) -> List[Optional[int]]:
+    """Возвращает итоговые оценки (0-100) или None, если по подоценкам посчитать нельзя."""
+    criterion_ids, vector = weight_vector(weights)
+    if not criterion_ids or not subscores:
+        return [None] * len(subscores)
+    totals = weighted_totals(subscore_matrix(subscores, criterion_ids), vector)
+    return [None if np.isnan(total) else int(round(total)) for total in totals]
+
+
+def apply_weighted_score(result: Dict[str, Any], weights: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Заменяет оценку LLM взвешенным итогом по подоценкам, если они есть."""
+    if result.get("prefiltered") or not isinstance(result.get("subscores"), dict):
+        return result
+    score = compute_weighted_scores([result["subscores"]], weights)[0]
+    if score is not None:
+        result["score"] = score
+    return result
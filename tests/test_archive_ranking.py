@@ -0,0 +1,138 @@
+"""
+Ранжирование резюме из ZIP-архива: поток ответа читает архив после того,
+как обработчик вернул ответ, а оценки приходят по мере готовности.
+"""
+
+import asyncio
+import io
+import json
+import zipfile
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import services.archive_ingestion as archive_ingestion
+from api import ranking
+from core.config import settings
+
+RESUME = " ".join(f"Проект {i}: сервис на Python и FastAPI с PostgreSQL и очередью задач." for i in range(30))
+
+
+def _zip(files):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, text in files.items():
+            archive.writestr(name, text)
+    return buffer.getvalue()
+
+
+async def _parse_text(filename, content):
+    return content.decode("utf-8")
+
+
+@pytest.fixture
+def client(monkeypatch):
+    async def extract_vacancy_text(vacancy):
+        return "Python разработчик"
+
+    async def iter_scored_resumes(vacancy_text, resumes, weights=None, **kwargs):
+        for index, resume in enumerate(resumes):
+            yield index, {"score": 50 + index, "summary": resume["filename"], "keywords": []}
+
+    async def save_ranking_results(db, vacancy_text, generated_questions, weights, scored_resumes):
+        return [{**result, "id": i} for i, result in enumerate(scored_resumes, 1)]
+
+    monkeypatch.setattr(ranking, "_extract_vacancy_text", extract_vacancy_text)
+    monkeypatch.setattr(ranking, "save_ranking_results", save_ranking_results)
+    monkeypatch.setattr(archive_ingestion, "parse_document_bytes", _parse_text)
+    monkeypatch.setattr(archive_ingestion, "iter_scored_resumes", iter_scored_resumes)
+    monkeypatch.setattr(settings, "PREFILTER_ENABLED", False)
+
+    app = FastAPI()
+    app.include_router(ranking.router)
+    return TestClient(app)
+
+
+def _post_archive(client, content):
+    return client.post(
+        "/rank-resumes/archive",
+        data={"weights": "{}"},
+        files={
+            "vacancy": ("vacancy.txt", b"Python", "text/plain"),
+            "archive": ("resumes.zip", content, "application/zip"),
+        },
+    )
+
+
+def test_archive_is_streamed_after_upload_is_closed(client):
+    response = _post_archive(client, _zip({"a.txt": "Иван, Python, FastAPI", "b.txt": "Мария, Go, Kubernetes"}))
+
+    assert response.status_code == 200
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(e["filename"] for e in events if e["event"] == "extracted") == ["a.txt", "b.txt"]
+    assert events[-1]["event"] == "done"
+    assert sorted(r["filename"] for r in events[-1]["ranking"]) == ["a.txt", "b.txt"]
+
+
+def test_oversized_archive_is_rejected(client, monkeypatch):
+    monkeypatch.setattr(settings, "ARCHIVE_MAX_UPLOAD_MB", 0)
+
+    response = _post_archive(client, _zip({"a.txt": "Иван, Python"}))
+
+    assert response.status_code == 413
+
+
+def test_near_duplicates_across_waves_are_scored_once(monkeypatch):
+    calls = []
+
+    async def iter_scored_resumes(vacancy_text, resumes, weights=None, **kwargs):
+        calls.append([resume["filename"] for resume in resumes])
+        for index, resume in enumerate(resumes):
+            yield index, {"score": 70, "summary": "", "keywords": []}
+
+    async def parse_slowly(filename, content):
+        # Каждая запись попадает в свою волну
+        await asyncio.sleep(0.05 if filename == "a.txt" else 0.2)
+        return content.decode("utf-8")
+
+    monkeypatch.setattr(archive_ingestion, "parse_document_bytes", parse_slowly)
+    monkeypatch.setattr(archive_ingestion, "iter_scored_resumes", iter_scored_resumes)
+    monkeypatch.setattr(settings, "PREFILTER_ENABLED", False)
+    monkeypatch.setattr(settings, "DEDUP_ENABLED", True)
+    monkeypatch.setattr(settings, "PARSER_WORKERS", 1)
+
+    async def collect():
+        archive = io.BytesIO(_zip({"a.txt": RESUME, "b.txt": RESUME + " Git."}))
+        return [event async for event in archive_ingestion.stream_archive_ranking_events("Python", archive)]
+
+    events = asyncio.run(collect())
+    results = {e["result"]["filename"]: e["result"] for e in events if e["event"] == "result"}
+
+    assert calls == [["a.txt"]]
+    assert results["b.txt"]["duplicate_of"] == "a.txt"
+    assert results["b.txt"]["score"] == 70
+
+
+def test_slow_wave_does_not_block_later_waves(monkeypatch):
+    async def iter_scored_resumes(vacancy_text, resumes, weights=None, **kwargs):
+        for index, resume in enumerate(resumes):
+            await asyncio.sleep(0.5 if resume["filename"] == "a.txt" else 0)
+            yield index, {"score": 70, "summary": "", "keywords": []}
+
+    async def parse_slowly(filename, content):
+        await asyncio.sleep(0.05 if filename == "a.txt" else 0.2)
+        return content.decode("utf-8")
+
+    monkeypatch.setattr(archive_ingestion, "parse_document_bytes", parse_slowly)
+    monkeypatch.setattr(archive_ingestion, "iter_scored_resumes", iter_scored_resumes)
+    monkeypatch.setattr(settings, "PREFILTER_ENABLED", False)
+    monkeypatch.setattr(settings, "PARSER_WORKERS", 1)
+
+    async def collect():
+        archive = io.BytesIO(_zip({"a.txt": "Иван, Python, FastAPI", "b.txt": "Мария, Go, Kubernetes"}))
+        return [event async for event in archive_ingestion.stream_archive_ranking_events("Python", archive)]
+
+    events = asyncio.run(collect())
+
+    assert [e["result"]["filename"] for e in events if e["event"] == "result"] == ["b.txt", "a.txt"]
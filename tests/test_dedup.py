@@ -0,0 +1,34 @@
+import random
+
+import pytest
+
+from services.dedup import SimHashIndex, hamming_distance
+
+
+def _flip(signature, bits):
+    for bit in bits:
+        signature ^= 1 << bit
+    return signature
+
+
+@pytest.mark.parametrize("max_distance", [0, 3, 6, 10])
+def test_index_finds_every_signature_within_threshold(max_distance):
+    rng = random.Random(max_distance)
+    index = SimHashIndex(max_distance)
+    base = rng.getrandbits(64)
+    index.add("base", base)
+
+    for _ in range(200):
+        distance = rng.randint(0, max_distance)
+        signature = _flip(base, rng.sample(range(64), distance))
+        assert index.find(signature) == [("base", distance)]
+
+
+def test_index_ignores_signatures_beyond_threshold():
+    index = SimHashIndex(3)
+    base = 0x0123456789ABCDEF
+    index.add("base", base)
+
+    far = _flip(base, [0, 1, 2, 3])
+    assert hamming_distance(base, far) == 4
+    assert index.find(far) == []
@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+
+from core.config import settings
+from services.ollama_backends import OllamaBackendPool
+
+FIRST = "http://10.0.0.11:11434"
+SECOND = "http://10.0.0.12:11434"
+
+
+def test_acquire_fails_fast_when_no_backend_has_model(monkeypatch):
+    monkeypatch.setattr(settings, "OLLAMA_BACKENDS", [FIRST, SECOND])
+    monkeypatch.setattr(settings, "OLLAMA_MODEL_BACKENDS", {})
+    pool = OllamaBackendPool()
+    for backend in pool.backends_for("llama3"):
+        backend.models = {"mistral:latest"}
+
+    async def acquire():
+        async with pool.acquire("llama3"):
+            pass
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(asyncio.wait_for(acquire(), timeout=1))
+
+
+def test_acquire_skips_backends_without_model(monkeypatch):
+    monkeypatch.setattr(settings, "OLLAMA_BACKENDS", [FIRST, SECOND])
+    monkeypatch.setattr(settings, "OLLAMA_MODEL_BACKENDS", {})
+    pool = OllamaBackendPool()
+    first, second = pool.backends_for("llama3")
+    first.models = {"mistral:latest"}
+    second.models = {"llama3:latest"}
+
+    async def acquire():
+        async with pool.acquire("llama3") as backend:
+            return backend.url
+
+    assert asyncio.run(acquire()) == SECOND
+
+
+def test_models_without_backends_are_not_balanced(monkeypatch):
+    monkeypatch.setattr(settings, "OLLAMA_BACKENDS", [])
+    monkeypatch.setattr(settings, "OLLAMA_MODEL_BACKENDS", {"llama3": [FIRST]})
+    pool = OllamaBackendPool()
+
+    assert pool.enabled
+    assert [backend.url for backend in pool.backends_for("llama3")] == [FIRST]
+    assert pool.backends_for("mistral") == []
@@ -0,0 +1,23 @@
+from services.document_parsers import PAGE_BREAK
+from services.text_normalization import clean_text, strip_page_boilerplate
+
+
+def test_page_numbers_are_removed():
+    pages = ["Иван Петров\nPython разработчик\n1", "Опыт работы\nЯндекс\n- 2 -", "Образование\nМГУ\nстр. 3 из 3"]
+
+    cleaned = strip_page_boilerplate(pages)
+
+    assert cleaned == ["Иван Петров\nPython разработчик", "Опыт работы\nЯндекс", "Образование\nМГУ"]
+
+
+def test_year_at_page_edge_is_kept():
+    pages = [
+        "Иван Петров\nPython разработчик\n2019",
+        "2019 –\nЯндекс, backend-разработчик\n2021",
+    ]
+
+    text = clean_text(PAGE_BREAK.join(pages))
+
+    assert text.splitlines() == [
+        "Иван Петров", "Python разработчик", "2019", "2019 –", "Яндекс, backend-разработчик", "2021",
+    ]
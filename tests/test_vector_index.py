@@ -0,0 +1,30 @@
+from services.vector_index import VectorStore
+
+
+def test_dimension_change_resets_index(tmp_path):
+    store = VectorStore("test", str(tmp_path), 64)
+    store.append([1, 2], ["java spring hibernate", "go kubernetes docker"])
+
+    store = VectorStore("test", str(tmp_path), 128)
+    assert store.count == 0
+    assert not store.exists()
+
+    store.append([3], ["java spring"])
+    store = VectorStore("test", str(tmp_path), 128)
+    assert store.count == 1
+    assert [candidate_id for candidate_id, _ in store.query("java spring", 5)] == [3]
+
+
+def test_interrupted_append_is_repaired_on_load(tmp_path):
+    store = VectorStore("test", str(tmp_path), 64)
+    store.append([1, 2], ["java spring hibernate", "go kubernetes docker"])
+    with open(store.vectors_path, "ab") as f:
+        f.write(b"\0" * 100)
+
+    store = VectorStore("test", str(tmp_path), 64)
+    store.append([3], ["python fastapi"])
+    store = VectorStore("test", str(tmp_path), 64)
+
+    assert store.count == 3
+    assert store.query("go kubernetes", 1)[0][0] == 2
+    assert store.query("python fastapi", 1)[0][0] == 3
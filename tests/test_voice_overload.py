@@ -0,0 +1,77 @@
+"""
+Голосовые websocket-сессии при перегрузке LLM: клиент получает сообщение
+об ошибке с retry_after, а не обрыв соединения.
+"""
+
+import importlib
+import sys
+import types
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from services.llm_limits import AdaptiveLimiter, LLMOverloadedError, llm_slot
+
+
+def _ensure_module(name: str, **attrs) -> None:
+    """Подменяет модуль пустой заглушкой, если его зависимости (vosk, torch, noisereduce) не установлены."""
+    try:
+        importlib.import_module(name)
+    except ImportError:
+        module = types.ModuleType(name)
+        module.__dict__.update(attrs)
+        sys.modules[name] = module
+
+
+class _FakeRecognizer:
+    def __init__(self, *args, **kwargs):
+        pass
+
+
+_ensure_module("vosk", Model=object, KaldiRecognizer=_FakeRecognizer)
+_ensure_module("noisereduce", reduce_noise=lambda y, **kwargs: y)
+_ensure_module(
+    "services.voice_processing",
+    SAMPLE_RATE=16000,
+    silero_tts_instance=None,
+    get_vosk_model=lambda language_code="ru": None,
+    text_to_speech=lambda text: None,
+)
+
+
+@pytest.mark.parametrize(
+    "module_name, path",
+    [
+        ("api.interview", "/ws/live"),
+        ("api.stt_interview", "/ws/live_stt"),
+        ("audio_processing.api", "/ws/live_processed"),
+    ],
+)
+def test_overloaded_llm_sends_error_with_retry_after(monkeypatch, module_name, path):
+    module = importlib.import_module(module_name)
+
+    async def overloaded_acquire(self, bulk):
+        raise LLMOverloadedError(self.provider, "очередь запросов переполнена", 7)
+
+    async def prepare_interview(*args, **kwargs):
+        async with llm_slot("ollama"):
+            pass
+
+    monkeypatch.setattr(AdaptiveLimiter, "_acquire", overloaded_acquire)
+    monkeypatch.setattr(module.vacancy_compiler, "prepare_interview", prepare_interview)
+    if module_name == "api.interview":
+        monkeypatch.setattr(module, "get_vosk_model", lambda language_code="ru": object())
+        monkeypatch.setattr(module, "silero_tts_instance", object())
+        monkeypatch.setattr(module, "KaldiRecognizer", _FakeRecognizer)
+
+    app = FastAPI()
+    app.include_router(module.router)
+    with TestClient(app).websocket_connect(path) as websocket:
+        websocket.send_json({"type": "start_interview"})
+        message = websocket.receive_json()
+        while message.get("type") != "error":
+            message = websocket.receive_json()
+
+    assert message["retry_after"] == 7
+    assert "очередь запросов переполнена" in message["message"]